@@ -0,0 +1,164 @@
+"""Compare aggregation engines on a synthetic departures table.
+
+    python benchmarks/aggregate_engines.py --rows 50000000
+
+Generates the rows into a fresh SQLite database (vectorized with pyarrow), exports them with
+``ttr export`` semantics, then times ``ttr aggregate`` per engine:
+
+- sql (cold): full rollup rebuild plus query, i.e. the first run on an existing database
+- sql (warm): rollups already current, the steady state of ``ttr aggregate``
+- arrow / duckdb over the Parquet export, and over the SQLite file with ``--from-db``
+
+Every engine must return the same rows; the script fails loudly if they differ.
+Expect roughly 10 GB of disk and a few minutes of setup per 50M rows.
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+import pyarrow as pa  # noqa: E402
+import pyarrow.compute as pc  # noqa: E402
+
+from track_tram_reliability.aggregate import compute_line_metrics, compute_station_metrics  # noqa: E402
+from track_tram_reliability.analytics import compute_metrics_columnar  # noqa: E402
+from track_tram_reliability.db import dispose_engines, init_db  # noqa: E402
+from track_tram_reliability.export import export_departures  # noqa: E402
+from track_tram_reliability.rollup import refresh_rollups  # noqa: E402
+
+START = 1704063600  # 2024-01-01 00:00 Europe/Berlin
+# Roughly a city network's daily volume, so per-hour groups are realistically dense
+ROWS_PER_DAY = 250_000
+BATCH = 1_000_000
+
+
+def _pick(values, n):
+    idx = pc.cast(pc.floor(pc.multiply(pc.random(n), len(values))), pa.int64())
+    return pc.take(pa.array(values), idx)
+
+
+LINES = [("TRAM", str(n)) for n in range(12, 30)] + [("BUS", str(n)) for n in range(50, 200)]
+DESTINATIONS = [f"Dest {i}" for i in range(2 * len(LINES))]  # two directions per line
+
+
+def synthetic_batches(rows: int, span_days: int):
+    """Compact departures rows; dimension ids are list positions + 1."""
+    stations = [f"de:09162:{i}" for i in range(1500)]
+    delays = [-1] + [0] * 6 + [1] * 4 + [2] * 3 + [3, 3, 4, 5, 6, 8, 10, 15, 25, None]
+    done = 0
+    while done < rows:
+        n = min(BATCH, rows - done)
+        line = pc.cast(pc.floor(pc.multiply(pc.random(n), len(LINES))), pa.int64())
+        planned = pc.add(
+            pc.cast(pc.floor(pc.multiply(pc.random(n), span_days * 86400)), pa.int64()), START
+        )
+        delay = _pick(delays, n)
+        yield {
+            "station_id": _pick(stations, n),
+            "line_id": pc.add(line, 1),
+            "destination_id": pc.add(
+                pc.add(pc.multiply(line, 2), pc.cast(pc.less(pc.random(n), 0.5), pa.int64())), 1
+            ),
+            "planned_departure_time": planned,
+            "realtime_departure_time": pc.add(planned, pc.multiply(pc.fill_null(delay, 0), 60)),
+            "delay_in_minutes": delay,
+            "cancelled": pc.less(pc.random(n), 0.02),
+            "platform_id": pa.nulls(n, pa.int64()),
+            "realtime": pa.array([True] * n),
+            "fetched_at": pc.subtract(planned, 300),
+        }
+        done += n
+
+
+def build_database(db_path: Path, rows: int, span_days: int) -> str:
+    db_url = f"sqlite:///{db_path}"
+    init_db(db_url)
+    dispose_engines(db_url)
+    con = sqlite3.connect(db_path)
+    con.execute("PRAGMA journal_mode=WAL")
+    con.execute("PRAGMA synchronous=OFF")
+    con.execute("INSERT OR IGNORE INTO stations (station_id, name) VALUES ('bench', 'bench')")
+    con.executemany(
+        "INSERT INTO lines (id, transport_type, label) VALUES (?, ?, ?)",
+        [(i, t, lab) for i, (t, lab) in enumerate(LINES, 1)],
+    )
+    con.executemany("INSERT INTO destinations (id, name) VALUES (?, ?)", enumerate(DESTINATIONS, 1))
+    cols = None
+    for batch in synthetic_batches(rows, span_days):
+        cols = list(batch)
+        placeholders = ", ".join("?" * len(cols))
+        con.executemany(
+            f"INSERT OR IGNORE INTO departures ({', '.join(cols)}) VALUES ({placeholders})",
+            zip(*(batch[c].to_pylist() for c in cols)),
+        )
+        con.commit()
+    con.close()
+    return db_url
+
+
+def timed(label, fn, results):
+    t0 = time.perf_counter()
+    out = fn()
+    elapsed = time.perf_counter() - t0
+    results.append((label, elapsed, len(out) if isinstance(out, list) else out))
+    print(f"{label:<34} {elapsed:9.2f} s", flush=True)
+    return out
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--rows", type=int, default=50_000_000)
+    ap.add_argument("--days", type=int, default=None, help=f"Days spanned (default rows/{ROWS_PER_DAY:,})")
+    ap.add_argument("--workdir", type=Path, default=Path("data/bench"))
+    ap.add_argument("--scope", choices=("line", "station"), default="line")
+    ap.add_argument("--percentiles", default="50,90,95")
+    ap.add_argument("--engines", default="arrow,duckdb")
+    ap.add_argument("--from-db", action="store_true", help="Also run columnar engines on SQLite")
+    ap.add_argument("--keep", action="store_true", help="Keep the generated database and dataset")
+    args = ap.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    db_path, out_dir = args.workdir / "bench.db", args.workdir / "export"
+    for p in (db_path, Path(f"{db_path}-wal"), Path(f"{db_path}-shm")):
+        p.unlink(missing_ok=True)
+    shutil.rmtree(out_dir, ignore_errors=True)
+    pcts = [float(p) for p in args.percentiles.split(",") if p]
+    compute = compute_line_metrics if args.scope == "line" else compute_station_metrics
+    results = []
+
+    span_days = args.days or max(1, args.rows // ROWS_PER_DAY)
+    db_url = timed(
+        f"generate {args.rows:,} rows / {span_days} days",
+        lambda: build_database(db_path, args.rows, span_days),
+        results,
+    )
+    timed("export parquet", lambda: export_departures(db_url, out_dir, now=2e9).rows_exported, results)
+    timed("sql: rollup rebuild", lambda: refresh_rollups(db_url, rebuild=True), results)
+    expected = timed("sql (warm)", lambda: compute(db_url, percentiles=pcts), results)
+    for engine in args.engines.split(","):
+        sources = [("parquet", dict(source=out_dir))]
+        if args.from_db:
+            sources.append(("sqlite", dict(db_url=db_url)))
+        for name, source in sources:
+            got = timed(
+                f"{engine} ({name})",
+                lambda: compute_metrics_columnar(args.scope, engine, percentiles=pcts, **source),
+                results,
+            )
+            if got != expected:
+                raise SystemExit(f"{engine} ({name}) differs from the sql engine")
+    print(f"all engines agree on {len(expected):,} output rows")
+
+    dispose_engines(db_url)
+    if not args.keep:
+        shutil.rmtree(args.workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""Time `ttr` startup for commands that should not pay for the heavy imports.
+
+    python benchmarks/cli_startup.py --runs 10
+    python benchmarks/cli_startup.py --max-ms 250   # exit 1 above the budget (CI guard)
+
+Each run starts a fresh interpreter, like the ``ttr`` entry point. Reports the median wall
+time of ``--help``, a subcommand's ``--help`` and an argument error, plus the import time of
+``track_tram_reliability.cli`` alone (from ``-X importtime``, see ``ttr --profile-startup``).
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+SRC = Path(__file__).resolve().parents[1] / "src"
+sys.path.insert(0, str(SRC))
+
+from track_tram_reliability.cli import import_times  # noqa: E402
+
+CASES = {
+    "ttr --help": ["--help"],
+    "ttr aggregate --help": ["aggregate", "--help"],
+    "ttr aggregate --by nope": ["aggregate", "--by", "nope"],
+}
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--runs", type=int, default=10)
+    ap.add_argument("--max-ms", type=float, default=None, help="Fail if a median exceeds this")
+    args = ap.parse_args()
+
+    env = dict(os.environ, PYTHONPATH=str(SRC))
+    cmd = [sys.executable, "-c", "from track_tram_reliability.cli import app; app()"]
+    worst = 0.0
+    for name, argv in CASES.items():
+        times = []
+        for _ in range(args.runs):
+            t0 = time.perf_counter()
+            subprocess.run(cmd + argv, env=env, capture_output=True)
+            times.append((time.perf_counter() - t0) * 1000)
+        median = statistics.median(times)
+        worst = max(worst, median)
+        print(f"{name:<28}{median:8.1f} ms  (min {min(times):.1f})")
+
+    cli = next(cum for cum, _, mod in import_times() if mod.strip() == "track_tram_reliability.cli")
+    print(f"{'import cli':<28}{cli / 1000:8.1f} ms")
+    if args.max_ms is not None and worst > args.max_ms:
+        raise SystemExit(f"startup regression: {worst:.1f} ms > {args.max_ms:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
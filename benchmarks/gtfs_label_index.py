@@ -0,0 +1,138 @@
+"""Time `ttr build-label-index` on a synthetic GTFS feed of realistic size.
+
+    python benchmarks/gtfs_label_index.py --trips 200000 --stops-per-trip 25
+    python benchmarks/gtfs_label_index.py --scaling 500,1000,2000,4000,8000
+
+Defaults are roughly the size of the full MVG feed (about 5M stop_times rows). The feed is
+written to a zip under --workdir; the index is built for all products, as in the nightly
+rebuild. Reports wall time and peak RSS of the build.
+
+``--scaling`` builds feeds with a growing number of routes (same trips per route) and
+reports the time per route, which must stay flat: the build is linear in the feed size.
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import random
+import resource
+import sys
+import time
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from track_tram_reliability.gtfs_index import ROUTE_TYPE_TO_PRODUCT, build_label_index  # noqa: E402
+from track_tram_reliability.models import Station  # noqa: E402
+from track_tram_reliability.stations import table_path, write_cache  # noqa: E402
+
+
+def _write_table(zf: zipfile.ZipFile, name: str, header: str, rows) -> None:
+    with zf.open(name, "w") as raw, io.TextIOWrapper(raw, encoding="utf-8", newline="") as f:
+        f.write(header + "\n")
+        for row in rows:
+            f.write(",".join(row) + "\n")
+
+
+def build_feed(
+    path: Path,
+    cache_path: Path,
+    routes: int,
+    trips: int,
+    stops_per_trip: int,
+    stations: int,
+    variants: int = 2,
+) -> int:
+    """Write the feed and a matching stations cache; ``variants`` routes share each label."""
+    rnd = random.Random(42)
+    route_types = list(ROUTE_TYPE_TO_PRODUCT)
+    station_ids = [f"de:09162:{i}" for i in range(stations)]
+    # Two platforms per station, referencing the station as parent
+    stop_ids = [f"{sid}:1:{p}" for sid in station_ids for p in (1, 2)]
+    # Each route serves a fixed sequence of stops; its trips run along it
+    route_stops = [rnd.sample(stop_ids, stops_per_trip) for _ in range(routes)]
+    trip_routes = [rnd.randrange(routes) for _ in range(trips)]
+
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as zf:
+        _write_table(
+            zf, "routes.txt", "route_id,agency_id,route_short_name,route_long_name,route_type",
+            (
+                (f"r{i}", "mvg", str(i // variants), f"Route {i}", route_types[i // variants % len(route_types)])
+                for i in range(routes)
+            ),
+        )
+        _write_table(
+            zf, "trips.txt", "route_id,service_id,trip_id,trip_headsign,direction_id",
+            ((f"r{r}", "wd", f"t{i}", "Somewhere", str(i % 2)) for i, r in enumerate(trip_routes)),
+        )
+        _write_table(
+            zf, "stop_times.txt", "trip_id,arrival_time,departure_time,stop_id,stop_sequence",
+            (
+                (f"t{i}", "08:00:00", "08:00:00", stop, str(seq))
+                for i, r in enumerate(trip_routes)
+                for seq, stop in enumerate(route_stops[r])
+            ),
+        )
+        _write_table(
+            zf, "stops.txt", "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station",
+            ((sid, "Stop", "48.1", "11.5", "0", sid.rsplit(":", 2)[0]) for sid in stop_ids),
+        )
+    write_cache([Station(id=sid, name=sid) for sid in station_ids], cache_path)
+    return trips * stops_per_trip
+
+
+def scaling(args, feed: Path, cache: Path) -> None:
+    trips_per_route = max(1, args.trips // args.routes)
+    print(f"{'routes':>8}{'trips':>10}{'build s':>10}{'us/route':>10}")
+    for routes in (int(r) for r in args.scaling.split(",")):
+        trips = routes * trips_per_route
+        build_feed(feed, cache, routes, trips, args.stops_per_trip, args.stations, args.variants)
+        t0 = time.perf_counter()
+        build_label_index(feed, None, None, cache)
+        elapsed = time.perf_counter() - t0
+        print(f"{routes:>8}{trips:>10}{elapsed:>10.2f}{elapsed / routes * 1e6:>10.0f}")
+    if not args.keep:
+        feed.unlink()
+        cache.unlink()
+        table_path(cache).unlink()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--routes", type=int, default=500)
+    ap.add_argument("--trips", type=int, default=200_000)
+    ap.add_argument("--stops-per-trip", type=int, default=25)
+    ap.add_argument("--stations", type=int, default=6000)
+    ap.add_argument("--variants", type=int, default=2, help="Routes sharing one label")
+    ap.add_argument("--scaling", default=None, help="Comma-separated route counts to compare")
+    ap.add_argument("--workdir", type=Path, default=Path("data/bench"))
+    ap.add_argument("--keep", action="store_true", help="Keep the generated feed and stations cache")
+    args = ap.parse_args()
+
+    args.workdir.mkdir(parents=True, exist_ok=True)
+    feed, cache = args.workdir / "gtfs.zip", args.workdir / "gtfs_stations.json"
+    if args.scaling:
+        scaling(args, feed, cache)
+        return
+    t0 = time.perf_counter()
+    n = build_feed(feed, cache, args.routes, args.trips, args.stops_per_trip, args.stations, args.variants)
+    print(f"{'generate ' + format(n, ',') + ' stop_times rows':<40}{time.perf_counter() - t0:8.2f} s")
+
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.perf_counter()
+    index = build_label_index(feed, None, None, cache)
+    elapsed = time.perf_counter() - t0
+    rss_after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{'build_label_index (all products)':<40}{elapsed:8.2f} s")
+    print(f"{'peak RSS growth':<40}{(rss_after - rss_before) / 1024:8.1f} MB")
+    print(f"{sum(len(v) for v in index.mapping.values())} labels indexed")
+
+    if not args.keep:
+        feed.unlink()
+        cache.unlink()
+        table_path(cache).unlink()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""Compare departure parsing paths on MVG departures responses.
+
+    python benchmarks/parse_departures.py --stations 2000
+    python benchmarks/parse_departures.py --payload recorded/*.json
+
+``--payload`` takes recorded responses of the departures endpoint (the raw body, e.g. saved
+with ``curl 'https://www.mvg.de/api/bgw-pt/v3/departures?globalId=de:09162:6' > x.json``);
+without it, responses of the same shape are synthesized. Each response is parsed from its raw
+bytes, as in an ingest cycle:
+
+- models: ``json.loads`` + ``parse_departures`` (one validated pydantic Departure per item)
+- rows: the ingest path, decoder of ``departures`` (orjson if installed) + ``parse_departure_rows``
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from track_tram_reliability import departures  # noqa: E402
+
+
+def synth_response(rnd: random.Random, n: int) -> bytes:
+    base = 1_700_000_000_000
+    items = []
+    for i in range(n):
+        planned = base + i * 120_000
+        items.append(
+            {
+                "plannedDepartureTime": planned,
+                "realtime": rnd.random() < 0.9,
+                "delayInMinutes": rnd.choice([0, 0, 1, 2, 5]),
+                "realtimeDepartureTime": planned + rnd.choice([0, 60_000, 120_000]),
+                "transportType": rnd.choice(["TRAM", "BUS", "UBAHN"]),
+                "label": str(rnd.randrange(12, 200)),
+                "divaId": "02017",
+                "network": "swm",
+                "trainType": "",
+                "destination": "Petuelring",
+                "cancelled": rnd.random() < 0.02,
+                "sev": False,
+                "stopPositionNumber": 2,
+                "messages": [],
+                "bannerHash": "",
+                "occupancy": "LOW",
+                "stopPointGlobalId": "de:09162:6:2:2",
+                "platform": rnd.choice([None, 1, 2]),
+                "platformChanged": False,
+            }
+        )
+    return json.dumps(items).encode()
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--payload", nargs="*", type=Path, help="Recorded departures responses")
+    ap.add_argument("--stations", type=int, default=2000, help="Synthetic responses (one per station)")
+    ap.add_argument("--departures", type=int, default=40, help="Items per synthetic response")
+    args = ap.parse_args()
+
+    if args.payload:
+        bodies = [p.read_bytes() for p in args.payload]
+    else:
+        rnd = random.Random(42)
+        bodies = [synth_response(rnd, args.departures) for _ in range(args.stations)]
+    items = sum(len(json.loads(b)) for b in bodies)
+    print(f"{len(bodies)} responses, {items} departures, decoder: {departures._loads.__module__}")
+
+    t0 = time.perf_counter()
+    models = [departures.parse_departures("s", json.loads(b), 0) for b in bodies]
+    t_models = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    rows = [departures.parse_departure_rows("s", departures._loads(b), 0) for b in bodies]
+    t_rows = time.perf_counter() - t0
+
+    if [[r.to_model() for r in rs] for rs in rows] != models:
+        raise SystemExit("rows and models differ")
+    for name, t in (("models", t_models), ("rows", t_rows)):
+        print(f"{name:<8}{t:8.3f} s  {t / max(items, 1) * 1e6:6.2f} us/departure")
+    print(f"speedup {t_models / t_rows:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
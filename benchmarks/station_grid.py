@@ -0,0 +1,68 @@
+"""Time radius and nearest-station queries for every stop of a feed-sized data set.
+
+    python benchmarks/station_grid.py --stations 6000 --stops 30000 --radius-m 300
+
+Stations and stops are scattered uniformly over the MVG area (about 30 x 25 km). Reports the
+grid build time and the total time for one radius query and one nearest query per stop, and
+checks a sample of the radius results against the brute-force scan used before.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from track_tram_reliability.geo import PointGrid, haversine_m  # noqa: E402
+
+LAT, LON = (47.99, 48.26), (11.36, 11.72)
+
+
+def _point(rnd: random.Random):
+    return rnd.uniform(*LAT), rnd.uniform(*LON)
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--stations", type=int, default=6000)
+    ap.add_argument("--stops", type=int, default=30000)
+    ap.add_argument("--radius-m", type=float, default=300.0)
+    ap.add_argument("--brute-sample", type=int, default=200, help="Stops to check by brute force")
+    args = ap.parse_args()
+
+    rnd = random.Random(42)
+    stations = [(*_point(rnd), f"de:09162:{i}") for i in range(args.stations)]
+    stops = [_point(rnd) for _ in range(args.stops)]
+
+    t0 = time.perf_counter()
+    grid = PointGrid(stations)
+    print(f"{'build grid':<32}{time.perf_counter() - t0:8.3f} s")
+
+    t0 = time.perf_counter()
+    hits = sum(len(grid.within(lat, lon, args.radius_m)) for lat, lon in stops)
+    print(f"{'radius query, all stops':<32}{time.perf_counter() - t0:8.3f} s  ({hits} hits)")
+
+    t0 = time.perf_counter()
+    for lat, lon in stops:
+        grid.nearest(lat, lon)
+    print(f"{'nearest station, all stops':<32}{time.perf_counter() - t0:8.3f} s")
+
+    sample = stops[: args.brute_sample]
+    t0 = time.perf_counter()
+    for lat, lon in sample:
+        brute = sorted(
+            (d, sid)
+            for slat, slon, sid in stations
+            if (d := haversine_m(lat, lon, slat, slon)) <= args.radius_m
+        )
+        if sorted(grid.within(lat, lon, args.radius_m)) != brute:
+            raise SystemExit(f"grid and brute force differ at {lat}, {lon}")
+    per_stop = (time.perf_counter() - t0) / max(len(sample), 1)
+    print(f"{'brute force (extrapolated)':<32}{per_stop * len(stops):8.3f} s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,95 +1,248 @@
 from __future__ import annotations
 
-from typing import List
+import time
+from datetime import date, datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
 
-from sqlalchemy import select, func, case
+from sqlalchemy import select
 
-from .db import create_session_maker, DepartureRawOrm, epoch_to_date
+from .db import DepartureRawOrm, RollupLineHourlyOrm, RollupStationHourlyOrm, create_session_maker
+from .rollup import (
+    HOUR,
+    decode_hist,
+    hist_quantile,
+    hourly_rows,
+    in_time_range,
+    merge_hist,
+    refresh_rollups,
+)
+from .partitions import source_sessions
+from .timeutil import SERVICE_TZ, date_start, service_date
 
+LINE_KEYS = ("transport_type", "label", "destination")
+STATION_KEYS = ("station_id",)
 
-def compute_line_metrics(db_url: str, days: int = 1) -> List[dict]:
-    """Compute reliability metrics per (date, transport_type, label, destination).
 
-    Metrics:
-    - count_total: number of rows
-    - count_cancelled
-    - cancellation_rate
-    - avg_delay
+def percentile_key(q: float) -> str:
+    return f"p{q:g}_delay"
+
+
+def parse_time_bound(value: str, end: bool = False) -> int:
+    """Parse ``YYYY-MM-DD`` (local service date) or epoch seconds into an epoch bound.
+
+    With ``end=True`` a date is inclusive, i.e. the bound is the start of the following date.
     """
-    Session = create_session_maker(db_url)
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    d = date.fromisoformat(value)
+    return date_start(d + timedelta(days=1) if end else d)
+
+
+def days_since(days: int, now: Optional[float] = None) -> int:
+    """Start of the service date ``days - 1`` days before today (so ``days=1`` means today)."""
+    today = datetime.fromtimestamp(time.time() if now is None else now, tz=SERVICE_TZ).date()
+    return date_start(today - timedelta(days=days - 1))
+
+
+def local_hour(ts: int) -> int:
+    return datetime.fromtimestamp(ts, tz=SERVICE_TZ).hour
+
+
+def local_weekday(ts: int) -> int:
+    """Monday = 0 ... Sunday = 6 (local time)."""
+    return datetime.fromtimestamp(ts, tz=SERVICE_TZ).weekday()
+
+
+# Output bucket column -> function of an hour start. All are exact on hourly data.
+BREAKDOWNS = {"date": service_date, "hour": local_hour, "weekday": local_weekday}
+
+
+def new_bucket() -> dict:
+    return {"count_total": 0, "count_cancelled": 0, "delay_sum": 0, "delay_count": 0, "hist": {}}
+
+
+def _fold(rows: Iterable[dict], key_names: Sequence[str], by: str, percentiles) -> Dict[tuple, dict]:
+    """Fold hourly rows into per-(bucket, *keys) accumulators."""
+    bucket_of = BREAKDOWNS[by]
+    labels: Dict[int, object] = {}
+    acc: Dict[tuple, dict] = {}
+    for h in rows:
+        hour = h["hour_start"]
+        label = labels.get(hour)
+        if label is None:
+            label = labels[hour] = bucket_of(hour)
+        k = (label, *(h[name] for name in key_names))
+        a = acc.get(k)
+        if a is None:
+            a = acc[k] = new_bucket()
+        a["count_total"] += h["count_total"] or 0
+        a["count_cancelled"] += h["count_cancelled"] or 0
+        a["delay_sum"] += h["delay_sum"] or 0
+        a["delay_count"] += h["delay_count"] or 0
+        if percentiles:
+            hist = h["delay_hist"]
+            merge_hist(a["hist"], hist if isinstance(hist, dict) else decode_hist(hist))
+    return acc
+
+
+def metrics_rows(
+    acc: Dict[tuple, dict], key_names: Sequence[str], by: str, percentiles
+) -> List[dict]:
+    """Turn per-(bucket, *keys) accumulators into sorted output rows."""
     out: List[dict] = []
-    with Session() as session:
-        date_col = epoch_to_date(DepartureRawOrm.fetched_at)
-        stmt = (
-            select(
-                date_col.label("date"),
-                DepartureRawOrm.transport_type,
-                DepartureRawOrm.label,
-                DepartureRawOrm.destination,
-                func.count().label("count_total"),
-                func.sum(case((DepartureRawOrm.cancelled == True, 1), else_=0)).label(
-                    "count_cancelled"
-                ),
-                func.avg(DepartureRawOrm.delay_in_minutes).label("avg_delay"),
-            )
-            .group_by(
-                date_col,
-                DepartureRawOrm.transport_type,
-                DepartureRawOrm.label,
-                DepartureRawOrm.destination,
-            )
-            .order_by(date_col)
+    for k in sorted(acc, key=lambda k: tuple((0, "") if v is None else (1, v) for v in k)):
+        a = acc[k]
+        count_total = a["count_total"]
+        cancellation_rate = a["count_cancelled"] / count_total if count_total else 0.0
+        avg_delay = a["delay_sum"] / a["delay_count"] if a["delay_count"] else 0.0
+        row = {by: k[0], **dict(zip(key_names, k[1:]))}
+        row.update(
+            {
+                "count_total": int(count_total),
+                "count_cancelled": int(a["count_cancelled"]),
+                "cancellation_rate": float(cancellation_rate),
+                "avg_delay": float(avg_delay),
+            }
         )
-        rows = session.execute(stmt).all()
-        for r in rows:
-            date, transport_type, label, destination, count_total, count_cancelled, avg_delay = r
-            cancellation_rate = (count_cancelled or 0) / count_total if count_total else 0.0
-            out.append(
-                {
-                    "date": date,
-                    "transport_type": transport_type,
-                    "label": label,
-                    "destination": destination,
-                    "count_total": int(count_total or 0),
-                    "count_cancelled": int(count_cancelled or 0),
-                    "cancellation_rate": float(cancellation_rate),
-                    "avg_delay": float(avg_delay or 0.0),
-                }
-            )
+        for q in percentiles or ():
+            row[percentile_key(q)] = hist_quantile(a["hist"], q)
+        out.append(row)
     return out
 
 
-def compute_station_metrics(db_url: str) -> List[dict]:
-    """Compute reliability metrics per (date, station_id)."""
+def normalize_filters(
+    days: Optional[int],
+    since: Optional[int],
+    products: Optional[Set[str]],
+    labels: Optional[Set[str]],
+) -> Tuple[Optional[int], Optional[Set[str]], Optional[Set[str]]]:
+    """Fold ``days`` into ``since``, upper-case products (ALL = none) and widen labels."""
+    if days is not None:
+        since = max(since, days_since(days)) if since is not None else days_since(days)
+    if products:
+        products = {p.upper() for p in products}
+        if "ALL" in products:
+            products = None
+    if labels:
+        labels = set(labels) | {lab.upper() for lab in labels}
+    return since, products, labels
+
+
+def raw_criteria(
+    since: Optional[int],
+    until: Optional[int],
+    products: Optional[Set[str]],
+    labels: Optional[Set[str]],
+    stations: Optional[Set[str]],
+) -> list:
+    """WHERE criteria on departures_raw for normalized filters."""
+    R = DepartureRawOrm
+    filters = {"transport_type": products, "label": labels, "station_id": stations}
+    criteria = [getattr(R, name).in_(sorted(v)) for name, v in sorted(filters.items()) if v]
+    if since is not None or until is not None:
+        criteria.append(in_time_range(since, until))
+    return criteria
+
+
+def _compute_metrics(
+    db_url: str,
+    orm,
+    key_names: Sequence[str],
+    days: Optional[int],
+    percentiles: Optional[Sequence[float]],
+    since: Optional[int],
+    until: Optional[int],
+    products: Optional[Set[str]],
+    labels: Optional[Set[str]],
+    stations: Optional[Set[str]],
+    by: str = "date",
+) -> List[dict]:
+    """Answer from the hourly rollups when possible, else aggregate matching raw rows.
+
+    The rollups answer hour-aligned time ranges and filters on their own key columns. Anything
+    else (e.g. a station filter on line metrics) is pushed down to departures_raw as IN lists
+    plus planned-time range predicates, served by the (key, planned_departure_time) indexes.
+    """
+    since, products, labels = normalize_filters(days, since, products, labels)
+    filters = {"transport_type": products, "label": labels, "station_id": stations}
+    active = sorted(name for name, values in filters.items() if values)
+    aligned = all(b is None or b % HOUR == 0 for b in (since, until))
+    use_rollups = aligned and set(active) <= set(key_names)
+
+    refresh_rollups(db_url)
     Session = create_session_maker(db_url)
-    out: List[dict] = []
     with Session() as session:
-        date_col = epoch_to_date(DepartureRawOrm.fetched_at)
-        stmt = (
-            select(
-                date_col.label("date"),
-                DepartureRawOrm.station_id,
-                func.count().label("count_total"),
-                func.sum(case((DepartureRawOrm.cancelled == True, 1), else_=0)).label(
-                    "count_cancelled"
-                ),
-                func.avg(DepartureRawOrm.delay_in_minutes).label("avg_delay"),
+        if use_rollups:
+            stmt = select(
+                orm.hour_start,
+                *(getattr(orm, k) for k in key_names),
+                orm.count_total,
+                orm.count_cancelled,
+                orm.delay_sum,
+                orm.delay_count,
+                orm.delay_hist,
             )
-            .group_by(date_col, DepartureRawOrm.station_id)
-            .order_by(date_col)
-        )
-        rows = session.execute(stmt).all()
-        for r in rows:
-            date, station_id, count_total, count_cancelled, avg_delay = r
-            cancellation_rate = (count_cancelled or 0) / count_total if count_total else 0.0
-            out.append(
-                {
-                    "date": date,
-                    "station_id": station_id,
-                    "count_total": int(count_total or 0),
-                    "count_cancelled": int(count_cancelled or 0),
-                    "cancellation_rate": float(cancellation_rate),
-                    "avg_delay": float(avg_delay or 0.0),
-                }
-            )
-    return out
+            if since is not None:
+                stmt = stmt.where(orm.hour_start >= since)
+            if until is not None:
+                stmt = stmt.where(orm.hour_start < until)
+            for name in active:
+                stmt = stmt.where(getattr(orm, name).in_(sorted(filters[name])))
+            rows = [r._asdict() for r in session.execute(stmt)]
+        else:
+            criteria = raw_criteria(since, until, products, labels, stations)
+            keys = [getattr(DepartureRawOrm, k) for k in key_names]
+            rows = []
+            for _, src in source_sessions(db_url, session, since, until):
+                rows.extend(hourly_rows(src, DepartureRawOrm, keys, *criteria))
+    return metrics_rows(_fold(rows, key_names, by, percentiles), key_names, by, percentiles)
+
+
+def compute_line_metrics(
+    db_url: str,
+    days: Optional[int] = None,
+    percentiles: Optional[Sequence[float]] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    products: Optional[Set[str]] = None,
+    labels: Optional[Set[str]] = None,
+    stations: Optional[Set[str]] = None,
+    by: str = "date",
+) -> List[dict]:
+    """Compute reliability metrics per (date, transport_type, label, destination).
+
+    ``date`` is the Europe/Berlin date of the planned departure; ``by="hour"`` or ``"weekday"``
+    buckets by local hour of day (0-23) or weekday (Monday = 0) instead. ``days`` keeps the last
+    N dates (today included); ``since``/``until`` bound the planned departure time to
+    [since, until) in epoch seconds; ``products``, ``labels`` and ``stations`` restrict the rows.
+
+    Metrics:
+    - count_total: number of rows
+    - count_cancelled
+    - cancellation_rate
+    - avg_delay
+    - p<q>_delay for each requested percentile (e.g. p90_delay; None without delay data)
+    """
+    return _compute_metrics(
+        db_url, RollupLineHourlyOrm, LINE_KEYS, days, percentiles,
+        since, until, products, labels, stations, by,
+    )
+
+
+def compute_station_metrics(
+    db_url: str,
+    days: Optional[int] = None,
+    percentiles: Optional[Sequence[float]] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    products: Optional[Set[str]] = None,
+    labels: Optional[Set[str]] = None,
+    stations: Optional[Set[str]] = None,
+    by: str = "date",
+) -> List[dict]:
+    """Compute reliability metrics per (date, station_id); filters as in compute_line_metrics."""
+    return _compute_metrics(
+        db_url, RollupStationHourlyOrm, STATION_KEYS, days, percentiles,
+        since, until, products, labels, stations, by,
+    )
@@ -0,0 +1,260 @@
+from __future__ import annotations
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Set
+
+from sqlalchemy import select
+
+from .defaults import ANALYTICS_ENGINES
+from .aggregate import (
+    BREAKDOWNS,
+    LINE_KEYS,
+    STATION_KEYS,
+    metrics_rows,
+    new_bucket,
+    normalize_filters,
+    raw_criteria,
+)
+from .db import DepartureRawOrm, create_session_maker, init_db
+from .partitions import source_urls
+from .rollup import HOUR
+
+# "sql" is the rollup-backed path in aggregate.py; the others are columnar and vectorized
+SCOPE_KEYS = {"line": LINE_KEYS, "station": STATION_KEYS}
+# Rows per record batch read from the database or the Parquet dataset
+DEFAULT_BATCH_ROWS = 1 << 20
+
+SOURCE_COLUMNS = (
+    "station_id",
+    "transport_type",
+    "label",
+    "destination",
+    "planned_departure_time",
+    "fetched_at",
+    "delay_in_minutes",
+    "cancelled",
+)
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+    except ImportError as e:  # pragma: no cover - depends on environment
+        raise RuntimeError(
+            "Columnar engines require pyarrow: pip install 'track-tram-reliability[analytics]'"
+        ) from e
+    return pa, pc
+
+
+def _source_schema(pa):
+    return pa.schema(
+        [
+            ("station_id", pa.string()),
+            ("transport_type", pa.string()),
+            ("label", pa.string()),
+            ("destination", pa.string()),
+            ("planned_departure_time", pa.int64()),
+            ("fetched_at", pa.int64()),
+            ("delay_in_minutes", pa.int64()),
+            ("cancelled", pa.bool_()),
+        ]
+    )
+
+
+def db_reader(db_url: str, criteria: Sequence, batch_rows: int = DEFAULT_BATCH_ROWS):
+    """Stream matching departures_raw rows (of every partition file) as Arrow record batches."""
+    pa, _ = _require_pyarrow()
+    schema = _source_schema(pa)
+    R = DepartureRawOrm
+    stmt = (
+        select(*(getattr(R, c) for c in SOURCE_COLUMNS))
+        .where(*criteria)
+        .execution_options(yield_per=batch_rows)
+    )
+    urls = source_urls(db_url)
+
+    def batches():
+        for url in urls:
+            init_db(url)
+            with create_session_maker(url)() as session:
+                for rows in session.execute(stmt).partitions(batch_rows):
+                    columns = list(zip(*rows))
+                    yield pa.RecordBatch.from_arrays(
+                        [pa.array(col, type=f.type) for col, f in zip(columns, schema)], schema=schema
+                    )
+
+    return pa.RecordBatchReader.from_batches(schema, batches())
+
+
+def dataset_reader(
+    source: Path,
+    since: Optional[int],
+    until: Optional[int],
+    products: Optional[Set[str]],
+    labels: Optional[Set[str]],
+    stations: Optional[Set[str]],
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+):
+    """Scan a ``ttr export`` dataset with filters pushed into the Parquet scan."""
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    expr = None
+    for name, values in (("transport_type", products), ("label", labels), ("station_id", stations)):
+        if values:
+            cond = ds.field(name).isin(sorted(values))
+            expr = cond if expr is None else expr & cond
+    if since is not None or until is not None:
+        planned, fetched = ds.field("planned_departure_time"), ds.field("fetched_at")
+        by_planned, by_fetched = planned.is_valid(), ~planned.is_valid()
+        if since is not None:
+            by_planned, by_fetched = by_planned & (planned >= since), by_fetched & (fetched >= since)
+        if until is not None:
+            by_planned, by_fetched = by_planned & (planned < until), by_fetched & (fetched < until)
+        cond = by_planned | by_fetched
+        expr = cond if expr is None else expr & cond
+    dataset = ds.dataset(Path(source), format="parquet", partitioning="hive")
+    scanner = dataset.scanner(columns=list(SOURCE_COLUMNS), filter=expr, batch_size=batch_rows)
+    return scanner.to_reader()
+
+
+def _hourly_partial(batch, key_names: Sequence[str], with_delay: bool):
+    """Group one record batch by (hour_start, *keys[, delay]) with additive aggregates."""
+    pa, pc = _require_pyarrow()
+    ts = pc.coalesce(batch.column("planned_departure_time"), batch.column("fetched_at"))
+    columns = {"hour_start": pc.multiply(pc.divide(ts, HOUR), HOUR)}
+    for k in key_names:
+        col = batch.column(k)
+        columns[k] = col.cast(pa.string()) if pa.types.is_dictionary(col.type) else col
+    columns["delay"] = batch.column("delay_in_minutes").cast(pa.int64())
+    columns["cancelled"] = pc.fill_null(batch.column("cancelled"), False).cast(pa.int64())
+    table = pa.table(columns)
+    group = ["hour_start", *key_names] + (["delay"] if with_delay else [])
+    out = table.group_by(group).aggregate(
+        [([], "count_all"), ("cancelled", "sum"), ("delay", "sum"), ("delay", "count")]
+    )
+    return out.rename_columns(group + ["n", "n_cancelled", "delay_sum", "delay_n"])
+
+
+def _arrow_partials(reader, key_names: Sequence[str], with_delay: bool, threads: int):
+    """Aggregate batches on a thread pool (Arrow kernels release the GIL)."""
+    pa, _ = _require_pyarrow()
+    partials = []
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        pending = []
+        for batch in reader:
+            pending.append(pool.submit(_hourly_partial, batch, key_names, with_delay))
+            if len(pending) >= 2 * threads:
+                partials.append(pending.pop(0).result())
+        partials.extend(f.result() for f in pending)
+    if not partials:
+        return None
+    return pa.concat_tables(partials, promote_options="permissive")
+
+
+def _duckdb_partials(reader, key_names: Sequence[str], with_delay: bool, threads: int):
+    try:
+        import duckdb
+    except ImportError as e:  # pragma: no cover - depends on environment
+        raise RuntimeError(
+            "The duckdb engine requires duckdb: pip install 'track-tram-reliability[analytics]'"
+        ) from e
+    group = ", ".join(
+        ["(coalesce(planned_departure_time, fetched_at) // 3600) * 3600 AS hour_start", *key_names]
+        + (["delay_in_minutes AS delay"] if with_delay else [])
+    )
+    con = duckdb.connect()
+    try:
+        con.execute(f"SET threads TO {int(threads)}")
+        con.register("src", reader)
+        result = con.execute(
+            f"""
+            SELECT {group},
+                   count(*)::BIGINT AS n,
+                   sum(CASE WHEN cancelled THEN 1 ELSE 0 END)::BIGINT AS n_cancelled,
+                   sum(delay_in_minutes)::BIGINT AS delay_sum,
+                   count(delay_in_minutes)::BIGINT AS delay_n
+            FROM src
+            GROUP BY ALL
+            """
+        ).arrow()
+        # duckdb >= 1.4 returns a RecordBatchReader here, older versions a Table
+        table = result.read_all() if hasattr(result, "read_all") else result
+    finally:
+        con.close()
+    return table if table.num_rows else None
+
+
+def _fold_partials(partial, key_names: Sequence[str], by: str, percentiles) -> Dict[tuple, dict]:
+    """Map hour starts to output buckets (vectorized) and sum the partial aggregates."""
+    pa, pc = _require_pyarrow()
+    hours = partial.column("hour_start")
+    unique = pc.unique(hours)
+    labels = pa.array([BREAKDOWNS[by](h) for h in unique.to_pylist()])
+    table = partial.append_column(by, pc.take(labels, pc.index_in(hours, value_set=unique)))
+
+    group = [by, *key_names]
+    sums = table.group_by(group).aggregate(
+        [("n", "sum"), ("n_cancelled", "sum"), ("delay_sum", "sum"), ("delay_n", "sum")]
+    )
+    acc: Dict[tuple, dict] = {}
+    for r in sums.to_pylist():
+        a = acc[tuple(r[k] for k in group)] = new_bucket()
+        a["count_total"] = r["n_sum"] or 0
+        a["count_cancelled"] = r["n_cancelled_sum"] or 0
+        a["delay_sum"] = r["delay_sum_sum"] or 0
+        a["delay_count"] = r["delay_n_sum"] or 0
+    if percentiles:
+        hist = table.filter(pc.is_valid(table.column("delay")))
+        hist = hist.group_by(group + ["delay"]).aggregate([("delay_n", "sum")])
+        for r in hist.to_pylist():
+            acc[tuple(r[k] for k in group)]["hist"][r["delay"]] = r["delay_n_sum"]
+    return acc
+
+
+def compute_metrics_columnar(
+    scope: str,
+    engine: str = "arrow",
+    db_url: Optional[str] = None,
+    source: Optional[Path] = None,
+    by: str = "date",
+    days: Optional[int] = None,
+    percentiles: Optional[Sequence[float]] = None,
+    since: Optional[int] = None,
+    until: Optional[int] = None,
+    products: Optional[Set[str]] = None,
+    labels: Optional[Set[str]] = None,
+    stations: Optional[Set[str]] = None,
+    batch_rows: int = DEFAULT_BATCH_ROWS,
+    threads: Optional[int] = None,
+) -> List[dict]:
+    """Compute line/station metrics with a vectorized engine (``arrow`` or ``duckdb``).
+
+    Reads the ``ttr export`` Parquet dataset at ``source`` (filters pushed into the scan) or,
+    without ``source``, streams departures_raw from ``db_url``. Output rows and numbers are the
+    same as compute_line_metrics/compute_station_metrics: both paths reduce to additive hourly
+    aggregates that are folded into buckets by the same code.
+    """
+    if engine not in ("arrow", "duckdb"):
+        raise ValueError(f"unknown columnar engine {engine!r}")
+    key_names = SCOPE_KEYS[scope]
+    threads = threads or os.cpu_count() or 1
+    since, products, labels = normalize_filters(days, since, products, labels)
+    if source is not None:
+        reader = dataset_reader(source, since, until, products, labels, stations, batch_rows)
+    elif db_url is not None:
+        reader = db_reader(db_url, raw_criteria(since, until, products, labels, stations), batch_rows)
+    else:
+        raise ValueError("either db_url or source is required")
+
+    with_delay = bool(percentiles)
+    if engine == "arrow":
+        partial = _arrow_partials(reader, key_names, with_delay, threads)
+    else:
+        partial = _duckdb_partials(reader, key_names, with_delay, threads)
+    if partial is None:
+        return []
+    return metrics_rows(_fold_partials(partial, key_names, by, percentiles), key_names, by, percentiles)
@@ -1,35 +1,98 @@
 from __future__ import annotations
 
-import typer
+import os
+import subprocess
+import sys
 from pathlib import Path
+from typing import List, Tuple
+
+import typer
 
-from .stations import refresh_stations_cache, DEFAULT_CACHE
-from .departures import fetch_departures
-from .config import load_settings
-from .db import init_db
-from .ingest import ingest_departures_for_products, sync_stations_from_cache_to_db
-from .poller import run_poller
-from .aggregate import compute_line_metrics, compute_station_metrics
-from .gtfs_index import build_label_index as build_label_index_from_gtfs, write_label_index, load_label_index, GTFS_DEFAULT_URL
-from .print_label_stations import resolve_stations_for_labels
-from .gtfs_debug import debug_link_for_stop_name
+# Only dependency-free defaults at import time: each command imports what it needs, so
+# `ttr --help` and argument errors do not pay for SQLAlchemy, pydantic, requests, pyarrow...
+from .defaults import (
+    ANALYTICS_ENGINES,
+    BREAKDOWN_NAMES,
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_BUDGET_PER_MINUTE,
+    DEFAULT_CACHE,
+    DEFAULT_CHUNK_SIZE,
+    DEFAULT_EXPORT_DIR,
+    DEFAULT_FEED_DIR,
+    DEFAULT_LABEL_INDEX,
+    DEFAULT_MAX_INTERVAL_SECONDS,
+    DEFAULT_METRICS_HOST,
+    DEFAULT_MIGRATION_BATCH,
+    DEFAULT_MIN_INTERVAL_SECONDS,
+    DEFAULT_QUEUE_DEPTH,
+    DEFAULT_SETTLE_SECONDS,
+    FETCH_ENGINES,
+    GTFS_DEFAULT_URL,
+    INGEST_MODES,
+    PERIODS,
+    SCOPES,
+)
 
 app = typer.Typer(help="Track tram reliability: fetch stations and departures, store to DB.")
 
 
+def import_times(module: str = "track_tram_reliability.cli") -> List[Tuple[int, int, str]]:
+    """(cumulative us, self us, module) for every import of ``module`` in a fresh interpreter."""
+    env = dict(os.environ)
+    src = str(Path(__file__).resolve().parent.parent)
+    env["PYTHONPATH"] = os.pathsep.join([src, env["PYTHONPATH"]]) if env.get("PYTHONPATH") else src
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in proc.stderr.splitlines():
+        # "import time:      self [us] |     cumulative | imported package"
+        parts = line.removeprefix("import time:").split("|")
+        if len(parts) == 3 and parts[0].strip().isdigit():
+            rows.append((int(parts[1]), int(parts[0]), parts[2].rstrip()))
+    return rows
+
+
+def _profile_startup(value: bool) -> None:
+    if not value:
+        return
+    rows = import_times()
+    # Top-level imports (no indentation) add up to the interpreter's total import time
+    total = sum(cum for cum, _, name in rows if not name.startswith("  "))
+    typer.echo(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cum, own, name in sorted(rows, reverse=True)[:25]:
+        typer.echo(f"{cum / 1000:14.1f}{own / 1000:10.1f}  {name.strip()}")
+    typer.echo(f"Total import time: {total / 1000:.1f} ms")
+    raise typer.Exit()
+
+
+@app.callback()
+def main(
+    profile_startup: bool = typer.Option(
+        False, "--profile-startup", is_eager=True, callback=_profile_startup,
+        help="Print an import-time breakdown of starting the CLI and exit",
+    ),
+):
+    pass
+
+
 @app.command()
 def build_label_index(
     gtfs: str = typer.Option(GTFS_DEFAULT_URL, help="GTFS zip URL or local path"),
     products: str = typer.Option("TRAM", help="Products to include (comma) e.g., TRAM,BUS"),
     labels: str = typer.Option(None, help="Labels to include (comma), e.g., 27,28"),
-    out: Path = typer.Option(Path("data/label_index.json"), help="Output path for label index JSON"),
+    out: Path = typer.Option(DEFAULT_LABEL_INDEX, help="Output path for the label index (binary; JSON if it ends in .json)"),
     cache: Path = typer.Option(DEFAULT_CACHE, help="Stations cache path for mapping to MVG station ids"),
     distance_threshold_m: float = typer.Option(150.0, help="Max distance (meters) to match GTFS stop to MVG station"),
+    feed_dir: Path = typer.Option(DEFAULT_FEED_DIR, help="Local cache for downloaded GTFS feeds"),
+    refresh_feed: bool = typer.Option(False, help="Revalidate a cached feed with the server even if it is recent"),
 ):
     """Build label->station_ids index using MVG GTFS and stations cache."""
+    from .gtfs_index import build_label_index as build_label_index_from_gtfs, write_label_index
     prods = {p.strip().upper() for p in products.split(",") if p.strip()}
     labs = {l.strip().upper() for l in labels.split(",")} if labels else None
-    index = build_label_index_from_gtfs(gtfs, prods, labs, cache, distance_threshold_m)
+    index = build_label_index_from_gtfs(gtfs, prods, labs, cache, distance_threshold_m, feed_dir, refresh_feed)
     write_label_index(index, out)
     typer.echo(f"Wrote label index to {out} from {gtfs}")
 
@@ -37,6 +100,7 @@ def build_label_index(
 @app.command()
 def show_config(config_file: Path = typer.Option(None, help="Path to YAML config file")):
     """Print the effective configuration (YAML + env overrides)."""
+    from .config import load_settings
     settings = load_settings(config_file)
     import json as _json
     typer.echo(_json.dumps(settings.model_dump(), indent=2))
@@ -45,6 +109,8 @@ def show_config(config_file: Path = typer.Option(None, help="Path to YAML config
 @app.command()
 def initdb(config_file: Path = typer.Option(None, help="Path to YAML config file")):
     """Create database schema as per SQLAlchemy models."""
+    from .config import load_settings
+    from .db import init_db
     settings = load_settings(config_file)
     init_db(settings.db_url)
     typer.echo(f"Initialized database at {settings.db_url}")
@@ -53,6 +119,7 @@ def initdb(config_file: Path = typer.Option(None, help="Path to YAML config file
 @app.command()
 def load_stations(cache: Path = typer.Option(DEFAULT_CACHE, help="Cache file path for stations")):
     """Fetch stations from MVG and cache them locally."""
+    from .stations import refresh_stations_cache
     stations = refresh_stations_cache(cache)
     typer.echo(f"Fetched and cached {len(stations)} stations to {cache}")
 
@@ -60,6 +127,8 @@ def load_stations(cache: Path = typer.Option(DEFAULT_CACHE, help="Cache file pat
 @app.command()
 def sync_stations(config_file: Path = typer.Option(None, help="Path to YAML config file"), cache: Path = typer.Option(DEFAULT_CACHE, help="Cache file path for stations")):
     """Sync cached stations into DB (upsert)."""
+    from .config import load_settings
+    from .ingest import sync_stations_from_cache_to_db
     settings = load_settings(config_file)
     count = sync_stations_from_cache_to_db(settings.db_url, cache)
     typer.echo(f"Synced {count} stations to DB: {settings.db_url}")
@@ -68,6 +137,7 @@ def sync_stations(config_file: Path = typer.Option(None, help="Path to YAML conf
 @app.command()
 def get_departures(station_id: str, json_out: bool = typer.Option(False, help="Print JSON output")):
     """Fetch departures for a station and print a summary or JSON."""
+    from .departures import fetch_departures
     deps = fetch_departures(station_id)
     if json_out:
         import json as _json
@@ -80,6 +150,20 @@ def get_departures(station_id: str, json_out: bool = typer.Option(False, help="P
             )
 
 
+def _resolve_station_ids(use_label_index, label_set, product_set, label_index_path, station_ids):
+    """Expand labels -> station_ids via the label index (if requested) and merge explicit ids."""
+    from .label_index import LabelIndex, find_label_index
+    explicit = {s.strip() for s in station_ids.split(",")} if station_ids else None
+    if not (use_label_index and label_set):
+        return explicit
+    index = LabelIndex(find_label_index(label_index_path))
+    try:
+        resolved = index.stations_for(product_set or {"ALL"}, {lab.upper() for lab in label_set})
+    finally:
+        index.close()
+    return resolved | (explicit or set())
+
+
 @app.command()
 def ingest(
     products: str = typer.Option("ALL", help="Comma-separated products to include (UBAHN,SBAHN,BUS,TRAM,ALL)"),
@@ -87,8 +171,13 @@ def ingest(
     station_names: str = typer.Option(None, help="Optional comma-separated station names to include"),
     station_ids: str = typer.Option(None, help="Optional comma-separated station ids to include"),
     use_label_index: bool = typer.Option(False, help="Use GTFS-built label index to resolve station ids for labels"),
-    label_index_path: Path = typer.Option(Path("data/label_index.json"), help="Path to label index JSON"),
+    label_index_path: Path = typer.Option(DEFAULT_LABEL_INDEX, help="Path to label index (binary or JSON)"),
     max_workers: int = typer.Option(8, help="Concurrency for fetching departures"),
+    mode: str = typer.Option("first", help="Duplicate handling: 'first' keeps the first observation, 'latest' tracks the newest"),
+    history: bool = typer.Option(False, help="Record new/changed observations in departure_observations (needs --mode latest)"),
+    engine: str = typer.Option("threads", help="Fetch engine: 'threads' or 'async' (shared pooled HTTP client, needs httpx)"),
+    queue_depth: int = typer.Option(DEFAULT_QUEUE_DEPTH, help="Fetched station results buffered ahead of the DB writer"),
+    batch_size: int = typer.Option(DEFAULT_BATCH_SIZE, help="Departure rows per DB commit"),
     config_file: Path = typer.Option(None, help="Path to YAML config file"),
     cache: Path = typer.Option(DEFAULT_CACHE, help="Cache file path for stations"),
 ):
@@ -96,25 +185,23 @@ def ingest(
 
     Use --labels to restrict ingestion to specific lines (e.g., bus lines 53,164). Labels are matched case-insensitively.
     """
+    if mode not in INGEST_MODES:
+        raise typer.BadParameter("mode must be 'first' or 'latest'")
+    if engine not in FETCH_ENGINES:
+        raise typer.BadParameter("engine must be 'threads' or 'async'")
+    if history and mode != "latest":
+        raise typer.BadParameter("--history needs --mode latest (mode 'first' never records changes)")
+    from .config import load_settings
+    from .ingest import ingest_departures_for_products
     settings = load_settings(config_file)
     product_set = {p.strip().upper() for p in products.split(",") if p.strip()}
     label_set = {s.strip() for s in labels.split(",")} if labels else None
 
-    # If using label index, expand labels->station_ids and merge with provided ids
-    resolved_station_ids = None
-    if use_label_index and label_set:
-        index = load_label_index(label_index_path)
-        resolved_station_ids = set()
-        for prod in product_set or {"ALL"}:
-            prod_map = index.mapping.get(prod, {})
-            for lab in label_set:
-                resolved_station_ids.update(prod_map.get(lab.upper(), []))
-        if station_ids:
-            resolved_station_ids |= {s.strip() for s in station_ids.split(",")}
-    else:
-        resolved_station_ids = {s.strip() for s in station_ids.split(",")} if station_ids else None
+    resolved_station_ids = _resolve_station_ids(
+        use_label_index, label_set, product_set, label_index_path, station_ids
+    )
 
-    stations_processed, rows_inserted, rows_skipped = ingest_departures_for_products(
+    result = ingest_departures_for_products(
         settings.db_url,
         cache,
         product_set,
@@ -122,9 +209,15 @@ def ingest(
         {s.strip() for s in station_names.split(",")} if station_names else None,
         resolved_station_ids,
         max_workers,
+        mode=mode,
+        record_history=history,
+        engine=engine,
+        queue_depth=queue_depth,
+        batch_size=batch_size,
     )
     typer.echo(
-        f"Ingested from {stations_processed} stations | inserted={rows_inserted} skipped_duplicates={rows_skipped}"
+        f"Ingested from {result.stations_processed} stations | inserted={result.rows_inserted} "
+        f"updated={result.rows_updated} skipped_duplicates={result.rows_skipped}"
     )
 
 
@@ -135,39 +228,71 @@ def poll(
     station_names: str = typer.Option(None, help="Optional comma-separated station names to include"),
     station_ids: str = typer.Option(None, help="Optional comma-separated station ids to include"),
     use_label_index: bool = typer.Option(False, help="Use GTFS-built label index to resolve station ids for labels"),
-    label_index_path: Path = typer.Option(Path("data/label_index.json"), help="Path to label index JSON"),
+    label_index_path: Path = typer.Option(DEFAULT_LABEL_INDEX, help="Path to label index (binary or JSON)"),
     max_workers: int = typer.Option(8, help="Concurrency for fetching departures"),
+    mode: str = typer.Option("first", help="Duplicate handling: 'first' keeps the first observation, 'latest' tracks the newest"),
+    history: bool = typer.Option(False, help="Record new/changed observations in departure_observations (needs --mode latest)"),
+    engine: str = typer.Option("threads", help="Fetch engine: 'threads' or 'async' (shared pooled HTTP client, needs httpx)"),
+    queue_depth: int = typer.Option(DEFAULT_QUEUE_DEPTH, help="Fetched station results buffered ahead of the DB writer"),
+    batch_size: int = typer.Option(DEFAULT_BATCH_SIZE, help="Departure rows per DB commit"),
     config_file: Path = typer.Option(None, help="Path to YAML config file"),
     cache: Path = typer.Option(DEFAULT_CACHE, help="Cache file path for stations"),
     interval: int = typer.Option(None, help="Override polling interval seconds"),
+    adaptive: bool = typer.Option(False, help="Schedule each station just before its next departure instead of a fixed interval"),
+    min_interval: int = typer.Option(DEFAULT_MIN_INTERVAL_SECONDS, help="Adaptive: minimum seconds between polls of one station"),
+    max_interval: int = typer.Option(DEFAULT_MAX_INTERVAL_SECONDS, help="Adaptive: maximum seconds between polls of one station"),
+    budget_per_minute: int = typer.Option(DEFAULT_BUDGET_PER_MINUTE, help="Adaptive: global station requests per minute"),
+    metrics_port: int = typer.Option(None, help="Serve Prometheus metrics at http://HOST:PORT/metrics"),
+    metrics_host: str = typer.Option(DEFAULT_METRICS_HOST, help="Address the metrics endpoint binds to"),
+    metrics_log: Path = typer.Option(None, help="Append per-cycle timings and errors as JSON lines to this file"),
 ):
     """Continuously ingest at a fixed cadence with graceful shutdown."""
+    if mode not in INGEST_MODES:
+        raise typer.BadParameter("mode must be 'first' or 'latest'")
+    if engine not in FETCH_ENGINES:
+        raise typer.BadParameter("engine must be 'threads' or 'async'")
+    if history and mode != "latest":
+        raise typer.BadParameter("--history needs --mode latest (mode 'first' never records changes)")
+    if metrics_port is not None and not 0 <= metrics_port <= 65535:
+        raise typer.BadParameter("--metrics-port must be in 0..65535")
+    from .config import load_settings
+    from .label_index import find_label_index
+    from .poller import run_poller
     settings = load_settings(config_file)
     product_set = {p.strip().upper() for p in products.split(",") if p.strip()}
     poll_interval = interval or settings.polling_interval_seconds
     label_set = {s.strip() for s in labels.split(",")} if labels else None
 
-    # Resolve station ids via label index if requested
-    resolved_station_ids = None
-    if use_label_index and label_set:
-        index = load_label_index(label_index_path)
-        resolved_station_ids = set()
-        for prod in product_set or {"ALL"}:
-            prod_map = index.mapping.get(prod, {})
-            for lab in label_set:
-                resolved_station_ids.update(prod_map.get(lab.upper(), []))
-        if station_ids:
-            resolved_station_ids |= {s.strip() for s in station_ids.split(",")}
-    else:
-        resolved_station_ids = {s.strip() for s in station_ids.split(",")} if station_ids else None
+    # The label index stays mapped in the poller and is re-resolved whenever it is rebuilt
+    explicit_ids = {s.strip() for s in station_ids.split(",")} if station_ids else None
 
     typer.echo(
         f"Starting poller: db={settings.db_url}, interval={poll_interval}s, products={','.join(sorted(product_set) or ['ALL'])}, labels={','.join(label_set or [])}"
     )
-    # We reuse the ingest loop inside run_poller; pass through product_set only.
-    # For station/label scoping in poll mode, it's best to wrap run_poller to ingest with these parameters.
-    # To keep changes minimal, we recommend using one-shot ingest for heavy filters, or we can extend run_poller later.
-    run_poller(settings.db_url, poll_interval, product_set, str(cache))
+    # The full scope is resolved once at startup; each cycle only fetches the selected stations
+    run_poller(
+        settings.db_url,
+        poll_interval,
+        product_set,
+        str(cache),
+        labels=label_set,
+        station_names={s.strip() for s in station_names.split(",")} if station_names else None,
+        station_ids=explicit_ids,
+        max_workers=max_workers,
+        mode=mode,
+        record_history=history,
+        engine=engine,
+        queue_depth=queue_depth,
+        batch_size=batch_size,
+        adaptive=adaptive,
+        min_interval=min_interval,
+        max_interval=max_interval,
+        budget_per_minute=budget_per_minute,
+        label_index_path=find_label_index(label_index_path) if use_label_index and label_set else None,
+        metrics_port=metrics_port,
+        metrics_host=metrics_host,
+        metrics_log=metrics_log,
+    )
 
 
 @app.command()
@@ -175,15 +300,76 @@ def aggregate(
     scope: str = typer.Option("line", help="Aggregation scope: line or station"),
     config_file: Path = typer.Option(None, help="Path to YAML config file"),
     json_out: bool = typer.Option(True, help="Output JSON to stdout"),
+    days: int = typer.Option(None, help="Only the last N service dates, today included (default: all)"),
+    since: str = typer.Option(None, help="Start: YYYY-MM-DD service date (Europe/Berlin) or epoch seconds"),
+    until: str = typer.Option(None, help="End: YYYY-MM-DD (inclusive) or epoch seconds (exclusive)"),
+    products: str = typer.Option(None, help="Comma-separated products to include (e.g., TRAM,BUS)"),
+    labels: str = typer.Option(None, help="Comma-separated line labels to include (e.g., '27,28')"),
+    stations: str = typer.Option(None, help="Comma-separated station ids to include"),
+    rebuild: bool = typer.Option(
+        False, help="Recompute the hourly rollups from the stored departures first (pruned hours are kept)"
+    ),
+    percentiles: str = typer.Option(None, help="Delay percentiles to report (comma) e.g., 50,90,95"),
+    by: str = typer.Option("date", help="Bucket rows by: date, hour (of day) or weekday"),
+    engine: str = typer.Option("sql", help="Engine: sql (hourly rollups), arrow or duckdb (columnar)"),
+    source: Path = typer.Option(None, help="Parquet dataset from `ttr export` for arrow/duckdb (default: the database)"),
 ):
     """Compute simple reliability metrics and print as JSON."""
+    if days is not None and days < 1:
+        raise typer.BadParameter("--days must be >= 1")
+    if scope.lower() not in SCOPES:
+        raise typer.BadParameter("scope must be 'line' or 'station'")
+    if by not in BREAKDOWN_NAMES:
+        raise typer.BadParameter(f"--by must be one of: {', '.join(BREAKDOWN_NAMES)}")
+    if engine not in ANALYTICS_ENGINES:
+        raise typer.BadParameter(f"--engine must be one of: {', '.join(ANALYTICS_ENGINES)}")
+    if engine == "sql" and source is not None:
+        raise typer.BadParameter("--source requires --engine arrow or duckdb")
+    pcts = None
+    if percentiles:
+        try:
+            pcts = [float(p) for p in percentiles.split(",") if p.strip()]
+        except ValueError:
+            raise typer.BadParameter("--percentiles must be numbers, e.g. 50,90,95")
+        if any(not 0 < p <= 100 for p in pcts):
+            raise typer.BadParameter("--percentiles must be in (0, 100]")
+    from .aggregate import compute_line_metrics, compute_station_metrics, parse_time_bound
+    from .analytics import compute_metrics_columnar
+    from .config import load_settings
+    from .rollup import refresh_rollups
     settings = load_settings(config_file)
-    if scope.lower() == "line":
-        rows = compute_line_metrics(settings.db_url)
-    elif scope.lower() == "station":
-        rows = compute_station_metrics(settings.db_url)
+    try:
+        since_ts = parse_time_bound(since) if since else None
+        until_ts = parse_time_bound(until, end=True) if until else None
+    except ValueError:
+        raise typer.BadParameter("--since/--until must be YYYY-MM-DD or epoch seconds")
+
+    def _split(value):
+        if not value:
+            return None
+        return {v.strip() for v in value.split(",") if v.strip()} or None
+
+    filters = dict(
+        by=by,
+        days=days,
+        percentiles=pcts,
+        since=since_ts,
+        until=until_ts,
+        products=_split(products),
+        labels=_split(labels),
+        stations=_split(stations),
+    )
+    if engine != "sql":
+        rows = compute_metrics_columnar(
+            scope.lower(), engine, db_url=settings.db_url, source=source, **filters
+        )
     else:
-        raise typer.BadParameter("scope must be 'line' or 'station'")
+        if rebuild:
+            refresh_rollups(settings.db_url, rebuild=True)
+        if scope.lower() == "line":
+            rows = compute_line_metrics(settings.db_url, **filters)
+        else:
+            rows = compute_station_metrics(settings.db_url, **filters)
     if json_out:
         import json as _json
         typer.echo(_json.dumps(rows, ensure_ascii=False, indent=2))
@@ -192,16 +378,117 @@ def aggregate(
             typer.echo(str(r))
 
 
+@app.command()
+def export(
+    out: Path = typer.Option(DEFAULT_EXPORT_DIR, help="Output directory of the Parquet dataset"),
+    settle_hours: float = typer.Option(
+        DEFAULT_SETTLE_SECONDS / 3600, help="Only export departures planned at least this long ago"
+    ),
+    chunk_size: int = typer.Option(DEFAULT_CHUNK_SIZE, help="Rows read from the database per chunk"),
+    prune: bool = typer.Option(False, help="Delete exported rows from the database afterwards"),
+    config_file: Path = typer.Option(None, help="Path to YAML config file"),
+):
+    """Append settled departures to a date/product-partitioned Parquet dataset (incremental)."""
+    if chunk_size < 1:
+        raise typer.BadParameter("--chunk-size must be >= 1")
+    if settle_hours < 0:
+        raise typer.BadParameter("--settle-hours must be >= 0")
+    from .config import load_settings
+    from .export import export_departures
+    settings = load_settings(config_file)
+    result = export_departures(
+        settings.db_url,
+        out,
+        settle_seconds=int(settle_hours * 3600),
+        chunk_size=chunk_size,
+        prune=prune,
+    )
+    typer.echo(
+        f"Exported {result.rows_exported} rows into {result.files_written} files under {out} "
+        f"(planned before {result.exported_until}); pruned {result.rows_pruned}"
+    )
+
+
+@app.command("migrate-storage")
+def migrate_storage_cmd(
+    batch_size: int = typer.Option(DEFAULT_MIGRATION_BATCH, help="Legacy rows copied per committed batch"),
+    keep_legacy: bool = typer.Option(False, help="Keep the old table as departures_raw_legacy"),
+    config_file: Path = typer.Option(None, help="Path to YAML config file"),
+):
+    """Convert a database from the wide departures_raw table to compact storage (stop the poller first)."""
+    if batch_size < 1:
+        raise typer.BadParameter("--batch-size must be >= 1")
+    from .config import load_settings
+    from .migrate import migrate_storage
+    settings = load_settings(config_file)
+    result = migrate_storage(settings.db_url, batch_size=batch_size, keep_legacy=keep_legacy)
+    typer.echo(
+        f"Copied {result.rows_copied} departures ({result.rows_merged} merged duplicates) and "
+        f"{result.observations_copied} observations"
+        + ("; legacy table kept as departures_raw_legacy" if result.legacy_kept else "")
+    )
+
+
+@app.command()
+def partitions(
+    enable: str = typer.Option(None, help="Start partitioning departures by month or week (SQLite only)"),
+    config_file: Path = typer.Option(None, help="Path to YAML config file"),
+):
+    """Show (or enable) time partitioning of departures into per-period database files."""
+    if enable is not None and enable not in PERIODS:
+        raise typer.BadParameter(f"--enable must be one of {', '.join(PERIODS)}")
+    from .config import load_settings
+    from .partitions import enable_partitioning, list_partitions, partition_scheme
+    settings = load_settings(config_file)
+    if enable is not None:
+        try:
+            enable_partitioning(settings.db_url, enable)
+        except ValueError as e:
+            raise typer.BadParameter(str(e))
+    scheme = partition_scheme(settings.db_url)
+    if scheme is None:
+        typer.echo("Not partitioned")
+        return
+    typer.echo(f"Partitioned by {scheme.period} from {scheme.start}")
+    for part in list_partitions(settings.db_url, scheme):
+        typer.echo(f"{part.name}\t{part.lo}\t{part.hi}\t{part.db_url}")
+
+
+@app.command()
+def retention(
+    keep: int = typer.Option(..., help="Partitions to keep, the current period included"),
+    archive_dir: Path = typer.Option(None, help="Move old partition files here instead of deleting them"),
+    config_file: Path = typer.Option(None, help="Path to YAML config file"),
+):
+    """Drop or archive partitions older than the newest --keep periods (rollups are kept)."""
+    if keep < 1:
+        raise typer.BadParameter("--keep must be >= 1")
+    from .config import load_settings
+    from .partitions import apply_retention, partition_scheme
+    from .rollup import refresh_rollups
+    settings = load_settings(config_file)
+    if partition_scheme(settings.db_url) is None:
+        raise typer.BadParameter("the database is not partitioned (see `ttr partitions --enable`)")
+    refresh_rollups(settings.db_url)
+    result = apply_retention(settings.db_url, keep, archive_dir)
+    if archive_dir is not None:
+        typer.echo(f"Archived {len(result.archived)} partitions to {archive_dir}: {', '.join(result.archived)}")
+    else:
+        typer.echo(f"Dropped {len(result.dropped)} partitions: {', '.join(result.dropped)}")
+
+
 @app.command()
 def print_label_stations(
     labels: str = typer.Option(..., help="Labels to resolve (comma)"),
     products: str = typer.Option("TRAM", help="Products to include (comma) e.g., TRAM,BUS"),
-    label_index_path: Path = typer.Option(Path("data/label_index.json"), help="Path to label index JSON"),
+    label_index_path: Path = typer.Option(DEFAULT_LABEL_INDEX, help="Path to label index (binary or JSON)"),
 ):
     """Print station IDs resolved for given labels and products from label index."""
+    from .label_index import find_label_index
+    from .print_label_stations import resolve_stations_for_labels
     labs = {l.strip().upper() for l in labels.split(",") if l.strip()}
     prods = {p.strip().upper() for p in products.split(",") if p.strip()}
-    station_ids = resolve_stations_for_labels(label_index_path, prods, labs)
+    station_ids = resolve_stations_for_labels(find_label_index(label_index_path), prods, labs)
     for sid in station_ids:
         typer.echo(sid)
 
@@ -212,10 +499,13 @@ def debug_gtfs_link(
     gtfs: str = typer.Option(GTFS_DEFAULT_URL, help="GTFS zip URL or local path"),
     cache: Path = typer.Option(DEFAULT_CACHE, help="Stations cache path for mapping to MVG station ids"),
     radius_m: float = typer.Option(300.0, help="Radius (meters) to list nearest MVG stations"),
+    feed_dir: Path = typer.Option(DEFAULT_FEED_DIR, help="Local cache for downloaded GTFS feeds"),
+    refresh_feed: bool = typer.Option(False, help="Revalidate a cached feed with the server even if it is recent"),
 ):
     """Debug how a GTFS stop links to MVG stations: shows id matches and nearest stations."""
     import json as _json
-    report = debug_link_for_stop_name(stop_name, gtfs, cache, radius_m)
+    from .gtfs_debug import debug_link_for_stop_name
+    report = debug_link_for_stop_name(stop_name, gtfs, cache, radius_m, feed_dir, refresh_feed)
     typer.echo(_json.dumps(report, ensure_ascii=False, indent=2))
 
 
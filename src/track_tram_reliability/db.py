@@ -1,18 +1,28 @@
 from __future__ import annotations
 
+import threading
 from pathlib import Path
-from typing import Optional
+from typing import Dict, Optional, Set
 
 from sqlalchemy import (
     Boolean,
     Integer,
+    SmallInteger,
     Float,
     String,
+    Text,
     JSON,
     UniqueConstraint,
     create_engine,
+    event,
+    func,
+    inspect,
+    select,
+    text,
     ForeignKey,
+    Index,
 )
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, sessionmaker
 from datetime import datetime, timezone
 
@@ -35,32 +45,152 @@ class StationOrm(Base):
     last_seen_at: Mapped[Optional[int]] = mapped_column(Integer)
 
 
-class DepartureRawOrm(Base):
-    __tablename__ = "departures_raw"
+class LineOrm(Base):
+    """Line dimension: product + label. Missing values are stored as '' (see departures_raw)."""
+
+    __tablename__ = "lines"
 
     id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
-    station_id: Mapped[str] = mapped_column(String, ForeignKey("stations.station_id"), index=True)
-    transport_type: Mapped[Optional[str]] = mapped_column(String(16))
-    label: Mapped[Optional[str]] = mapped_column(String(32))
-    destination: Mapped[Optional[str]] = mapped_column(String)
+    transport_type: Mapped[str] = mapped_column(String(16))
+    label: Mapped[str] = mapped_column(String(32))
+
+    __table_args__ = (UniqueConstraint("transport_type", "label", name="uq_lines"),)
+
+
+class DestinationOrm(Base):
+    """Destination dimension ('' = no destination)."""
+
+    __tablename__ = "destinations"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String, unique=True)
+
+
+class PlatformOrm(Base):
+    __tablename__ = "platforms"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    name: Mapped[str] = mapped_column(String(32), unique=True)
+
+
+class DepartureOrm(Base):
+    """Compact departure storage: strings replaced by small surrogate keys into the dimensions.
+
+    Written by writer.bulk_upsert_departures; read through the departures_raw view.
+    """
+
+    __tablename__ = "departures"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    station_id: Mapped[str] = mapped_column(String, ForeignKey("stations.station_id"))
+    line_id: Mapped[int] = mapped_column(Integer, ForeignKey("lines.id"))
+    destination_id: Mapped[int] = mapped_column(Integer, ForeignKey("destinations.id"))
     planned_departure_time: Mapped[Optional[int]] = mapped_column(Integer, index=True)
     realtime_departure_time: Mapped[Optional[int]] = mapped_column(Integer)
-    delay_in_minutes: Mapped[Optional[int]] = mapped_column(Integer)
+    delay_in_minutes: Mapped[Optional[int]] = mapped_column(SmallInteger)
     cancelled: Mapped[bool] = mapped_column(Boolean, default=False)
-    platform: Mapped[Optional[str]] = mapped_column(String(32))
+    platform_id: Mapped[Optional[int]] = mapped_column(Integer, ForeignKey("platforms.id"))
     realtime: Mapped[bool] = mapped_column(Boolean, default=False)
     fetched_at: Mapped[int] = mapped_column(Integer, index=True)
 
     __table_args__ = (
         UniqueConstraint(
             "station_id",
-            "transport_type",
-            "label",
-            "destination",
+            "line_id",
+            "destination_id",
             "planned_departure_time",
-            name="uq_departure_identity",
+            name="uq_departures_identity",
         ),
+        # Filtered aggregations: key plus a planned-time range
+        Index("ix_departures_line_planned", "line_id", "planned_departure_time"),
+        Index("ix_departures_station_planned", "station_id", "planned_departure_time"),
+    )
+
+
+class DepartureRawOrm(Base):
+    """Read-only view over departures + dimensions with the original wide column shape."""
+
+    __tablename__ = "departures_raw"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True)
+    station_id: Mapped[str] = mapped_column(String)
+    transport_type: Mapped[Optional[str]] = mapped_column(String(16))
+    label: Mapped[Optional[str]] = mapped_column(String(32))
+    destination: Mapped[Optional[str]] = mapped_column(String)
+    planned_departure_time: Mapped[Optional[int]] = mapped_column(Integer)
+    realtime_departure_time: Mapped[Optional[int]] = mapped_column(Integer)
+    delay_in_minutes: Mapped[Optional[int]] = mapped_column(Integer)
+    cancelled: Mapped[bool] = mapped_column(Boolean, default=False)
+    platform: Mapped[Optional[str]] = mapped_column(String(32))
+    realtime: Mapped[bool] = mapped_column(Boolean, default=False)
+    fetched_at: Mapped[int] = mapped_column(Integer)
+
+    __table_args__ = {"info": {"view": True}}
+
+
+class DepartureObservationOrm(Base):
+    """Compact history of observed realtime states per departure (latest-observation mode)."""
+
+    __tablename__ = "departure_observations"
+
+    departure_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("departures.id"), primary_key=True
     )
+    fetched_at: Mapped[int] = mapped_column(Integer, primary_key=True)
+    realtime_departure_time: Mapped[Optional[int]] = mapped_column(Integer)
+    delay_in_minutes: Mapped[Optional[int]] = mapped_column(Integer)
+    cancelled: Mapped[bool] = mapped_column(Boolean, default=False)
+
+
+class RollupLineHourlyOrm(Base):
+    """Per-hour (planned departure time, UTC) line metrics maintained by rollup.refresh_rollups."""
+
+    __tablename__ = "rollup_line_hourly"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    hour_start: Mapped[int] = mapped_column(Integer, index=True)
+    transport_type: Mapped[Optional[str]] = mapped_column(String(16))
+    label: Mapped[Optional[str]] = mapped_column(String(32))
+    destination: Mapped[Optional[str]] = mapped_column(String)
+    count_total: Mapped[int] = mapped_column(Integer, default=0)
+    count_cancelled: Mapped[int] = mapped_column(Integer, default=0)
+    delay_sum: Mapped[int] = mapped_column(Integer, default=0)
+    delay_count: Mapped[int] = mapped_column(Integer, default=0)
+    delay_hist: Mapped[Optional[str]] = mapped_column(Text)  # JSON {delay_minutes: count}
+
+
+class RollupStationHourlyOrm(Base):
+    """Per-hour (planned departure time, UTC) station metrics maintained by rollup.refresh_rollups."""
+
+    __tablename__ = "rollup_station_hourly"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, autoincrement=True)
+    hour_start: Mapped[int] = mapped_column(Integer, index=True)
+    station_id: Mapped[str] = mapped_column(String)
+    count_total: Mapped[int] = mapped_column(Integer, default=0)
+    count_cancelled: Mapped[int] = mapped_column(Integer, default=0)
+    delay_sum: Mapped[int] = mapped_column(Integer, default=0)
+    delay_count: Mapped[int] = mapped_column(Integer, default=0)
+    delay_hist: Mapped[Optional[str]] = mapped_column(Text)  # JSON {delay_minutes: count}
+
+
+class RollupStateOrm(Base):
+    """Rollup watermarks: max departures.fetched_at per rollup name, max departures.id per source file."""
+
+    __tablename__ = "rollup_state"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    watermark: Mapped[Optional[int]] = mapped_column(Integer)
+
+
+class PartitionSchemeOrm(Base):
+    """Time partitioning of departures into per-period SQLite files (see partitions.py)."""
+
+    __tablename__ = "partition_scheme"
+
+    name: Mapped[str] = mapped_column(String, primary_key=True)
+    period: Mapped[str] = mapped_column(String(8))  # "month" or "week"
+    start: Mapped[int] = mapped_column(Integer)  # bucket times before this stay in the main file
 
 
 def _ensure_sqlite_path(db_url: str) -> None:
@@ -72,19 +202,142 @@ def _ensure_sqlite_path(db_url: str) -> None:
         parent.mkdir(parents=True, exist_ok=True)
 
 
-def create_engine_for_url(db_url: str):
-    _ensure_sqlite_path(db_url)
-    return create_engine(db_url, future=True)
+# Applied to every new SQLite connection: WAL lets readers (e.g. `ttr aggregate`) run while the
+# poller writes, busy_timeout waits for locks instead of failing with "database is locked".
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=30000",
+    "PRAGMA mmap_size=268435456",
+)
+
+# Process-wide registry: one engine (and connection pool) and one sessionmaker per DB URL
+_engines: Dict[str, Engine] = {}
+_session_makers: Dict[str, sessionmaker] = {}
+_initialized: Set[str] = set()
+_registry_lock = threading.RLock()
+
+
+def _apply_sqlite_pragmas(dbapi_conn, connection_record) -> None:
+    cursor = dbapi_conn.cursor()
+    try:
+        for pragma in SQLITE_PRAGMAS:
+            cursor.execute(pragma)
+    finally:
+        cursor.close()
+
+
+def create_engine_for_url(db_url: str) -> Engine:
+    """Return the shared engine for ``db_url``, creating it on first use."""
+    with _registry_lock:
+        engine = _engines.get(db_url)
+        if engine is None:
+            _ensure_sqlite_path(db_url)
+            engine = create_engine(db_url, future=True)
+            if engine.dialect.name == "sqlite":
+                event.listen(engine, "connect", _apply_sqlite_pragmas)
+            _engines[db_url] = engine
+        return engine
 
 
 def create_session_maker(db_url: str):
-    engine = create_engine_for_url(db_url)
-    return sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+    with _registry_lock:
+        maker = _session_makers.get(db_url)
+        if maker is None:
+            engine = create_engine_for_url(db_url)
+            maker = sessionmaker(bind=engine, autoflush=False, autocommit=False, future=True)
+            _session_makers[db_url] = maker
+        return maker
+
+
+def dialect_insert_for(dialect_name: str):
+    """The dialect's INSERT construct supporting ON CONFLICT, or None if there is none."""
+    if dialect_name == "sqlite":
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    elif dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert
+
+
+class LegacyStorageError(RuntimeError):
+    """The database still has the pre-normalization departures_raw table."""
+
+
+def departures_raw_select():
+    """SELECT behind the departures_raw view ('' in the dimensions reads back as NULL)."""
+    D, L, Dst, P = DepartureOrm, LineOrm, DestinationOrm, PlatformOrm
+    return (
+        select(
+            D.id,
+            D.station_id,
+            func.nullif(L.transport_type, "").label("transport_type"),
+            func.nullif(L.label, "").label("label"),
+            func.nullif(Dst.name, "").label("destination"),
+            D.planned_departure_time,
+            D.realtime_departure_time,
+            D.delay_in_minutes,
+            D.cancelled,
+            P.name.label("platform"),
+            D.realtime,
+            D.fetched_at,
+        )
+        .select_from(D)
+        .join(L, L.id == D.line_id)
+        .join(Dst, Dst.id == D.destination_id)
+        .outerjoin(P, P.id == D.platform_id)
+    )
+
+
+def _create_views(engine: Engine) -> None:
+    names = set(inspect(engine).get_view_names())
+    for table in Base.metadata.sorted_tables:
+        if table.info.get("view") and table.name not in names:
+            body = departures_raw_select().compile(engine, compile_kwargs={"literal_binds": True})
+            with engine.begin() as conn:
+                conn.execute(text(f"CREATE VIEW {table.name} AS {body}"))
+
+
+def create_schema(engine: Engine) -> None:
+    """Create missing tables, indexes and views (views are never created as tables)."""
+    tables = [t for t in Base.metadata.sorted_tables if not t.info.get("view")]
+    Base.metadata.create_all(engine, tables=tables)
+    # create_all skips indexes of tables that already exist; add any missing ones
+    for table in tables:
+        for index in table.indexes:
+            index.create(engine, checkfirst=True)
+    _create_views(engine)
 
 
 def init_db(db_url: str) -> None:
-    engine = create_engine_for_url(db_url)
-    Base.metadata.create_all(engine)
+    """Create the schema; runs once per URL and process.
+
+    Raises LegacyStorageError for databases that still need ``ttr migrate-storage``.
+    """
+    with _registry_lock:
+        if db_url in _initialized:
+            return
+        engine = create_engine_for_url(db_url)
+        if "departures_raw" in inspect(engine).get_table_names():
+            raise LegacyStorageError(
+                f"{db_url} uses the old departures_raw table layout; "
+                "run `ttr migrate-storage` to convert it"
+            )
+        create_schema(engine)
+        _initialized.add(db_url)
+
+
+def dispose_engines(db_url: Optional[str] = None) -> None:
+    """Close pooled connections and forget cached engines (all, or just ``db_url``)."""
+    with _registry_lock:
+        urls = [db_url] if db_url is not None else list(_engines)
+        for url in urls:
+            engine = _engines.pop(url, None)
+            if engine is not None:
+                engine.dispose()
+            _session_makers.pop(url, None)
+            _initialized.discard(url)
 
 
 # Aggregation helpers
@@ -0,0 +1,43 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+# Defaults and choices shown by the CLI. This module must stay free of third-party imports:
+# cli.py reads it at startup and imports the modules doing the work only inside each command
+# (see tests/test_startup.py). The owning modules re-export these names.
+
+# stations
+DEFAULT_CACHE = Path(__file__).resolve().parent.parent.parent / "data" / "stations.json"
+
+# ingest / fetchers / writer; ingest mode -> conflict handling for already stored departures
+INGEST_MODES = {
+    "first": "nothing",  # keep the first observation of each departure
+    "latest": "update",  # keep the latest (closest-to-departure) observation
+}
+FETCH_ENGINES = ("threads", "async")
+DEFAULT_QUEUE_DEPTH = 64  # station results buffered between fetchers and the DB writer
+DEFAULT_BATCH_SIZE = 2000
+
+# poller (adaptive scheduling)
+DEFAULT_MIN_INTERVAL_SECONDS = 60
+DEFAULT_MAX_INTERVAL_SECONDS = 1800
+DEFAULT_BUDGET_PER_MINUTE = 600
+DEFAULT_METRICS_HOST = "127.0.0.1"  # the Prometheus endpoint is local unless asked otherwise
+
+# aggregate / analytics
+BREAKDOWN_NAMES = ("date", "hour", "weekday")
+SCOPES = ("line", "station")
+ANALYTICS_ENGINES = ("sql", "arrow", "duckdb")
+
+# export / migrate / partitions
+DEFAULT_EXPORT_DIR = Path("data/export")
+# Departures planned more than this long ago are considered final (no more realtime updates)
+DEFAULT_SETTLE_SECONDS = 6 * 3600
+DEFAULT_CHUNK_SIZE = 50_000
+DEFAULT_MIGRATION_BATCH = 50_000
+PERIODS = ("month", "week")
+
+# GTFS
+GTFS_DEFAULT_URL = "https://www.mvg.de/static/gtfs/google_transit.zip"
+DEFAULT_LABEL_INDEX = Path("data/label_index.bin")
+DEFAULT_FEED_DIR = Path("data/gtfs")
@@ -1,13 +1,29 @@
 from __future__ import annotations
 
-from typing import List, Optional
-from datetime import datetime, timezone
+import json
+import time
+from typing import List, Optional, Tuple
 
-from .http import create_session
-from .models import Departure
+from .http import async_get, create_session
+from .models import Departure, DepartureRow
+
+try:  # optional faster decoder, see the "fast" extra
+    import orjson
+except ImportError:  # pragma: no cover - depends on environment
+    orjson = None
 
 DEPARTURES_URL = "https://www.mvg.de/api/bgw-pt/v3/departures"
 
+_loads = orjson.loads if orjson is not None else json.loads
+
+# Fields the API has spelled both ways: (snake_case, camelCase)
+_KEYS: Tuple[Tuple[str, str], ...] = (
+    ("planned_departure_time", "plannedDepartureTime"),
+    ("realtime_departure_time", "realtimeDepartureTime"),
+    ("delay_in_minutes", "delayInMinutes"),
+    ("transport_type", "transportType"),
+)
+
 
 def _normalize_epoch_seconds(value: Optional[int | float | str]) -> Optional[int]:
     if value is None:
@@ -23,6 +39,31 @@ def _normalize_epoch_seconds(value: Optional[int | float | str]) -> Optional[int
     return ivalue
 
 
+def _epoch(value) -> Optional[int]:
+    # The API sends integer milliseconds; anything else takes the general path
+    if type(value) is int:
+        return value // 1000 if value > 10_000_000_000 else value
+    return _normalize_epoch_seconds(value)
+
+
+def _schema(data: list) -> Tuple[str, ...]:
+    """Keys of the two-way fields as spelled in ``data`` (one spelling per payload).
+
+    The API omits null fields, so each field's spelling comes from the first item that has it.
+    """
+    keys = {}
+    for item in data:
+        for snake, camel in _KEYS:
+            if snake not in keys:
+                if snake in item:
+                    keys[snake] = snake
+                elif camel in item:
+                    keys[snake] = camel
+        if len(keys) == len(_KEYS):
+            break
+    return tuple(keys.get(snake, camel) for snake, camel in _KEYS)
+
+
 def fetch_departures(station_id: str) -> List[Departure]:
     """Fetch departures for a given MVG global station id.
 
@@ -36,37 +77,96 @@ def fetch_departures(station_id: str) -> List[Departure]:
     params = {"globalId": station_id}
     resp = sess.get(DEPARTURES_URL, params=params, timeout=20)
     resp.raise_for_status()
-    data = resp.json()
+    return parse_departures(station_id, resp.json())
+
+
+async def fetch_departures_async(
+    client, station_id: str, url: str = DEPARTURES_URL, timeout: float = 20.0
+) -> List[Departure]:
+    """Async variant of ``fetch_departures`` using a shared httpx.AsyncClient."""
+    rows = await fetch_departure_rows_async(client, station_id, url, timeout)
+    return [r.to_model() for r in rows]
+
+
+def fetch_departure_rows(station_id: str) -> List[DepartureRow]:
+    """``fetch_departures`` without model validation, for the ingest path."""
+    return parse_departures_payload(station_id, fetch_departures_payload(station_id)[1])
+
+
+async def fetch_departure_rows_async(
+    client, station_id: str, url: str = DEPARTURES_URL, timeout: float = 20.0
+) -> List[DepartureRow]:
+    _, body = await fetch_departures_payload_async(client, station_id, url, timeout)
+    return parse_departures_payload(station_id, body)
+
+
+def fetch_departures_payload(station_id: str) -> Tuple[int, bytes]:
+    """Status and raw body of a departures response; raises for a non-2xx final status."""
+    sess = create_session()
+    resp = sess.get(DEPARTURES_URL, params={"globalId": station_id}, timeout=20)
+    resp.raise_for_status()
+    return resp.status_code, resp.content
+
+
+async def fetch_departures_payload_async(
+    client, station_id: str, url: str = DEPARTURES_URL, timeout: float = 20.0
+) -> Tuple[int, bytes]:
+    resp = await async_get(client, url, params={"globalId": station_id}, timeout=timeout)
+    resp.raise_for_status()
+    return resp.status_code, resp.content
+
 
-    departures: List[Departure] = []
-    fetched_at = int(datetime.now(tz=timezone.utc).timestamp())
+def parse_departures_payload(station_id: str, body: bytes) -> List[DepartureRow]:
+    """Decode a raw response body (orjson if installed) and parse it into rows."""
+    return parse_departure_rows(station_id, _loads(body))
 
+
+def parse_departures(
+    station_id: str, data: list, fetched_at: Optional[int] = None
+) -> List[Departure]:
+    """Normalize a departures API payload into Departure models."""
+    return [r.to_model() for r in parse_departure_rows(station_id, data, fetched_at)]
+
+
+def parse_departure_rows(
+    station_id: str, data: list, fetched_at: Optional[int] = None
+) -> List[DepartureRow]:
+    """Normalize a departures API payload into DepartureRow tuples (no validation).
+
+    Key spellings are looked up once per payload (see _schema); timestamps in milliseconds or seconds
+    are accepted, and a missing delay is derived from planned and realtime departure.
+    """
+    if fetched_at is None:
+        fetched_at = int(time.time())
+    if not data:
+        return []
+    k_planned, k_realtime, k_delay, k_type = _schema(data)
+    rows: List[DepartureRow] = []
+    append = rows.append
     for item in data:
-        planned = _normalize_epoch_seconds(
-            item.get("planned_departure_time") or item.get("plannedDepartureTime")
-        )
-        realtime = _normalize_epoch_seconds(
-            item.get("realtime_departure_time") or item.get("realtimeDepartureTime")
+        get = item.get
+        planned = _epoch(get(k_planned))
+        realtime = _epoch(get(k_realtime))
+        delay = get(k_delay)
+        if delay is None:
+            if planned is not None and realtime is not None:
+                delay = int(round((realtime - planned) / 60))
+        elif type(delay) is not int:
+            delay = int(float(delay))
+        platform = get("platform")
+        append(
+            DepartureRow(
+                station_id,
+                planned,
+                realtime,
+                delay,
+                get(k_type),
+                get("label"),
+                get("destination"),
+                bool(get("cancelled", False)),
+                None if platform is None else str(platform),
+                bool(get("realtime", False)),
+                fetched_at,
+            )
         )
-        delay = item.get("delay_in_minutes") or item.get("delayInMinutes")
-        if delay is None and planned is not None and realtime is not None:
-            delay = int(round((realtime - planned) / 60))
-
-        raw_platform = item.get("platform")
-        platform_str = None if raw_platform is None else str(raw_platform)
-        dep = Departure(
-            station_id=station_id,
-            planned_departure_time=planned,
-            realtime_departure_time=realtime,
-            delay_in_minutes=delay,
-            transport_type=item.get("transport_type") or item.get("transportType"),
-            label=item.get("label"),
-            destination=item.get("destination"),
-            cancelled=bool(item.get("cancelled", False)),
-            platform=platform_str,
-            realtime=bool(item.get("realtime", False)),
-            fetched_at=fetched_at,
-        )
-        departures.append(dep)
-
-    return departures
+    return rows
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import threading
+import weakref
+from typing import Dict, Hashable, Iterable, List, Sequence, Tuple
+
+from sqlalchemy import event, insert, select, tuple_
+from sqlalchemy.orm import Session
+
+from .db import DestinationOrm, LineOrm, PlatformOrm, dialect_insert_for
+
+# Bound parameters per lookup/insert statement, well below every dialect's limit
+_CHUNK = 500
+
+# Dimension name -> (ORM class, value columns). Values are stored NOT NULL, None as ''.
+DIMENSIONS = {
+    "lines": (LineOrm, ("transport_type", "label")),
+    "destinations": (DestinationOrm, ("name",)),
+    "platforms": (PlatformOrm, ("name",)),
+}
+
+# Columns of a compact departures row, in table order
+COMPACT_COLUMNS: Tuple[str, ...] = (
+    "station_id",
+    "line_id",
+    "destination_id",
+    "planned_departure_time",
+    "realtime_departure_time",
+    "delay_in_minutes",
+    "cancelled",
+    "platform_id",
+    "realtime",
+    "fetched_at",
+)
+
+
+class DimensionCache:
+    """In-process value -> id maps for the dimension tables of one database.
+
+    Only ids from committed transactions are cached; ids created inside an open transaction
+    live in ``session.info`` until it commits, so a rollback cannot leave stale ids behind.
+    """
+
+    def __init__(self):
+        self.ids: Dict[str, Dict[Hashable, int]] = {name: {} for name in DIMENSIONS}
+        self.lock = threading.Lock()
+
+
+_caches: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def cache_for(session) -> DimensionCache:
+    engine = session.get_bind()
+    with _caches_lock:
+        cache = _caches.get(engine)
+        if cache is None:
+            cache = _caches[engine] = DimensionCache()
+        return cache
+
+
+def _pending(session) -> Dict[str, Dict[Hashable, int]]:
+    return session.info.setdefault("dim_pending", {name: {} for name in DIMENSIONS})
+
+
+@event.listens_for(Session, "after_commit")
+def _promote_pending(session) -> None:
+    pending = session.info.pop("dim_pending", None)
+    if pending:
+        cache = cache_for(session)
+        with cache.lock:
+            for name, ids in pending.items():
+                cache.ids[name].update(ids)
+
+
+@event.listens_for(Session, "after_rollback")
+def _drop_pending(session) -> None:
+    session.info.pop("dim_pending", None)
+
+
+def _store(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _lookup(session, orm, cols: Sequence[str], keys: List[tuple]) -> Dict[tuple, int]:
+    columns = [getattr(orm, c) for c in cols]
+    found: Dict[tuple, int] = {}
+    for start in range(0, len(keys), _CHUNK):
+        chunk = keys[start : start + _CHUNK]
+        cond = tuple_(*columns).in_(chunk) if len(cols) > 1 else columns[0].in_([k[0] for k in chunk])
+        for row in session.execute(select(orm.id, *columns).where(cond)):
+            found[tuple(row[1:])] = row[0]
+    return found
+
+
+def resolve(session, name: str, values: Iterable[tuple]) -> Dict[tuple, int]:
+    """Return ids for dimension value tuples (None already mapped to ''), creating missing rows."""
+    orm, cols = DIMENSIONS[name]
+    cache = cache_for(session)
+    pending = _pending(session)[name]
+    out: Dict[tuple, int] = {}
+    missing: List[tuple] = []
+    with cache.lock:
+        committed = cache.ids[name]
+        for key in set(values):
+            id_ = committed.get(key)
+            if id_ is None:
+                id_ = pending.get(key)
+            if id_ is None:
+                missing.append(key)
+            else:
+                out[key] = id_
+    if not missing:
+        return out
+
+    found = _lookup(session, orm, cols, missing)
+    new = [k for k in missing if k not in found]
+    if new:
+        dialect_insert = dialect_insert_for(session.get_bind().dialect.name)
+        rows = [dict(zip(cols, k)) for k in new]
+        for start in range(0, len(rows), _CHUNK):
+            chunk = rows[start : start + _CHUNK]
+            if dialect_insert is not None:
+                # Another writer may have added the same values meanwhile
+                session.execute(dialect_insert(orm.__table__).values(chunk).on_conflict_do_nothing())
+            else:
+                session.execute(insert(orm.__table__), chunk)
+        found.update(_lookup(session, orm, cols, new))
+    pending.update(found)
+    out.update(found)
+    return out
+
+
+def compact_rows(session, rows: Sequence[dict]) -> List[dict]:
+    """Map wide departure rows (writer.ROW_COLUMNS, optionally ``id``) to departures rows."""
+    lines = resolve(
+        session, "lines", ((_store(r["transport_type"]), _store(r["label"])) for r in rows)
+    )
+    destinations = resolve(session, "destinations", ((_store(r["destination"]),) for r in rows))
+    platforms = resolve(
+        session, "platforms", ((r["platform"],) for r in rows if r["platform"] is not None)
+    )
+    out: List[dict] = []
+    for r in rows:
+        platform = r["platform"]
+        row = {
+            "station_id": r["station_id"],
+            "line_id": lines[(_store(r["transport_type"]), _store(r["label"]))],
+            "destination_id": destinations[(_store(r["destination"]),)],
+            "planned_departure_time": r["planned_departure_time"],
+            "realtime_departure_time": r["realtime_departure_time"],
+            "delay_in_minutes": r["delay_in_minutes"],
+            "cancelled": r["cancelled"],
+            "platform_id": None if platform is None else platforms[(platform,)],
+            "realtime": r["realtime"],
+            "fetched_at": r["fetched_at"],
+        }
+        if "id" in r:
+            row["id"] = r["id"]
+        out.append(row)
+    return out
+
+
+def load_dimension(session, name: str) -> Dict[int, tuple]:
+    """id -> value tuple (with '' read back as None) for a whole dimension table."""
+    orm, cols = DIMENSIONS[name]
+    columns = [getattr(orm, c) for c in cols]
+    return {
+        row[0]: tuple(v if v != "" else None for v in row[1:])
+        for row in session.execute(select(orm.id, *columns))
+    }
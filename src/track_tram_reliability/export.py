@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import delete, func, select
+
+from .defaults import DEFAULT_CHUNK_SIZE, DEFAULT_EXPORT_DIR, DEFAULT_SETTLE_SECONDS
+from .db import (
+    DepartureObservationOrm,
+    DepartureOrm,
+    DepartureRawOrm,
+    create_session_maker,
+    init_db,
+)
+from .partitions import source_sessions
+from .rollup import HOUR, in_time_range, mark_pruned, refresh_rollups, rolled_up_id
+from .timeutil import service_date
+
+STATE_FILE = "_export_state.json"
+
+R = DepartureRawOrm
+
+# Columns stored in the files; date and transport_type live in the hive partition path
+FILE_COLUMNS = (
+    "id",
+    "station_id",
+    "label",
+    "destination",
+    "planned_departure_time",
+    "realtime_departure_time",
+    "delay_in_minutes",
+    "cancelled",
+    "platform",
+    "realtime",
+    "fetched_at",
+)
+
+
+class ExportResult(NamedTuple):
+    rows_exported: int
+    files_written: int
+    exported_until: Optional[int]
+    rows_pruned: int = 0
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as e:  # pragma: no cover - depends on environment
+        raise RuntimeError(
+            "Parquet export requires pyarrow: pip install 'track-tram-reliability[export]'"
+        ) from e
+    return pa, pq
+
+
+def export_schema(pa):
+    text = pa.dictionary(pa.int32(), pa.string())
+    return pa.schema(
+        [
+            ("id", pa.int64()),
+            ("station_id", text),
+            ("label", text),
+            ("destination", text),
+            ("planned_departure_time", pa.int64()),
+            ("realtime_departure_time", pa.int64()),
+            ("delay_in_minutes", pa.int32()),
+            ("cancelled", pa.bool_()),
+            ("platform", text),
+            ("realtime", pa.bool_()),
+            ("fetched_at", pa.int64()),
+        ]
+    )
+
+
+def read_state(out_dir: Path) -> dict:
+    path = Path(out_dir) / STATE_FILE
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def _write_state(out_dir: Path, state: dict) -> None:
+    path = Path(out_dir) / STATE_FILE
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(state, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+class _PartitionWriter:
+    """Buffers rows for one (date, transport_type) partition and appends row groups to a file.
+
+    Files are written under a ``_``-prefixed name (ignored by dataset readers) and only
+    renamed into place by ``publish`` once the whole export succeeded.
+    """
+
+    def __init__(self, pa, pq, schema, directory: Path, stem: str):
+        self.pa, self.pq, self.schema = pa, pq, schema
+        self.directory = directory
+        self.stem = stem
+        self.buffer: List[tuple] = []
+        self.writer = None
+        self.files: List[Path] = []
+
+    def flush(self) -> None:
+        if not self.buffer:
+            return
+        if self.writer is None:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            path = self.directory / f"_{self.stem}-{len(self.files)}.parquet"
+            self.writer = self.pq.ParquetWriter(path, self.schema, compression="zstd")
+            self.files.append(path)
+        columns = list(zip(*self.buffer))
+        arrays = [
+            self.pa.array(col, type=field.type) for col, field in zip(columns, self.schema)
+        ]
+        self.writer.write_table(self.pa.Table.from_arrays(arrays, schema=self.schema))
+        self.buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+    def discard(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+        for path in self.files:
+            path.unlink(missing_ok=True)
+
+    def publish(self) -> None:
+        for path in self.files:
+            os.replace(path, path.with_name(path.name[1:]))
+
+
+def export_departures(
+    db_url: str,
+    out_dir: Path = DEFAULT_EXPORT_DIR,
+    settle_seconds: int = DEFAULT_SETTLE_SECONDS,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    prune: bool = False,
+    now: Optional[float] = None,
+) -> ExportResult:
+    """Append settled departures to a hive-partitioned Parquet dataset.
+
+    Layout: ``out_dir/date=YYYY-MM-DD/transport_type=TRAM/part-<until>-<n>.parquet`` where date
+    is the Europe/Berlin date of the planned departure. Only departures planned before
+    ``now - settle_seconds`` (rounded down to the hour) are exported, so rows still receiving
+    realtime updates are left for a later run; the exported bound is kept in ``_export_state.json``
+    and the next run resumes from it. Rows are streamed in ``chunk_size`` batches and string
+    columns are dictionary-encoded.
+
+    With ``prune`` the exported rows (and their observation history) are deleted from the
+    database afterwards. The hourly rollups are refreshed first and only rows they cover are
+    deleted, so the rollups keep the aggregates of pruned hours (frozen, see rollup.mark_pruned).
+    """
+    pa, pq = _require_pyarrow()
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    schema = export_schema(pa)
+
+    state = read_state(out_dir)
+    lo: Optional[int] = state.get("exported_until")
+    hi = (int(time.time() if now is None else now) - settle_seconds) // HOUR * HOUR
+    if lo is not None and lo >= hi:
+        return ExportResult(0, 0, lo)
+
+    init_db(db_url)
+    Session = create_session_maker(db_url)
+    bucket = func.coalesce(R.planned_departure_time, R.fetched_at)
+    stmt = (
+        select(bucket, R.transport_type, *(getattr(R, c) for c in FILE_COLUMNS))
+        .where(in_time_range(lo, hi))
+        .order_by(R.planned_departure_time, R.id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+    writers: Dict[Tuple[str, str], _PartitionWriter] = {}
+    exported = 0
+    # Highest exported id per source database (ids are per file when partitioned)
+    max_ids: Dict[str, int] = {}
+    try:
+        with Session() as session:
+            for url, src in source_sessions(db_url, session, lo, hi):
+                for rows in src.execute(stmt).partitions(chunk_size):
+                    for ts, transport_type, *values in rows:
+                        key = (service_date(ts), transport_type or "UNKNOWN")
+                        w = writers.get(key)
+                        if w is None:
+                            directory = out_dir / f"date={key[0]}" / f"transport_type={key[1]}"
+                            w = writers[key] = _PartitionWriter(pa, pq, schema, directory, f"part-{hi}")
+                        w.buffer.append(tuple(values))
+                        max_ids[url] = max(max_ids.get(url, 0), values[0])
+                    exported += len(rows)
+                    # Rows arrive in planned-time order (sources too): earlier dates are complete
+                    current = service_date(rows[-1][0])
+                    for (d, _), w in writers.items():
+                        if d < current:
+                            w.close()
+                        elif len(w.buffer) >= chunk_size:
+                            w.flush()
+        for w in writers.values():
+            w.close()
+    except BaseException:
+        for w in writers.values():
+            w.discard()
+        raise
+
+    for w in writers.values():
+        w.publish()
+    _write_state(out_dir, {"exported_until": hi})
+
+    pruned = 0
+    if prune and exported:
+        refresh_rollups(db_url)
+        D = DepartureOrm
+        with Session() as session:
+            mark_pruned(session, hi)
+            session.commit()
+            for url, src in source_sessions(db_url, session, lo, hi):
+                covered = rolled_up_id(session, url)
+                if url not in max_ids or covered is None:
+                    continue
+                # Never delete rows that arrived after the export read them or the rollups saw them
+                exported_rows = (in_time_range(lo, hi, D), D.id <= min(max_ids[url], covered))
+                ids = select(D.id).where(*exported_rows)
+                src.execute(
+                    delete(DepartureObservationOrm).where(DepartureObservationOrm.departure_id.in_(ids))
+                )
+                pruned += src.execute(delete(D).where(*exported_rows)).rowcount or 0
+                src.commit()
+    return ExportResult(exported, sum(len(w.files) for w in writers.values()), hi, pruned)
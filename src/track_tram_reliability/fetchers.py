@@ -0,0 +1,186 @@
+from __future__ import annotations
+
+import asyncio
+import queue
+import threading
+import time
+from typing import Iterable, Iterator, List, NamedTuple, Optional
+
+from .defaults import DEFAULT_QUEUE_DEPTH, FETCH_ENGINES
+from .departures import (
+    DEPARTURES_URL,
+    fetch_departures_payload,
+    fetch_departures_payload_async,
+    parse_departures_payload,
+)
+from .http import create_async_client
+from .models import DepartureRow
+
+_DONE = object()
+
+
+class FetchResult(NamedTuple):
+    """Outcome of one station request.
+
+    ``status`` is the final HTTP status (None for transport errors); ``fetch_seconds`` covers the
+    request including retries and rate limiting, ``parse_seconds`` decoding and parsing.
+    """
+
+    station_id: str
+    departures: List[DepartureRow]
+    error: Optional[BaseException] = None
+    status: Optional[int] = None
+    fetch_seconds: float = 0.0
+    parse_seconds: float = 0.0
+
+
+def _error_status(error: BaseException) -> Optional[int]:
+    # requests.HTTPError and httpx.HTTPStatusError both carry the response
+    return getattr(getattr(error, "response", None), "status_code", None)
+
+
+def _parse_result(station_id: str, status: int, body: bytes, fetch_seconds: float) -> FetchResult:
+    t0 = time.perf_counter()
+    try:
+        rows = parse_departures_payload(station_id, body)
+    except Exception as e:
+        return FetchResult(station_id, [], e, status, fetch_seconds, time.perf_counter() - t0)
+    return FetchResult(station_id, rows, None, status, fetch_seconds, time.perf_counter() - t0)
+
+
+def _drain(out: "queue.Queue", producers: int, stop: threading.Event) -> Iterator[FetchResult]:
+    """Yield results until every producer has signalled completion.
+
+    If the consumer stops early (exception or close), tell producers to stop and unblock them.
+    """
+    remaining = producers
+    try:
+        while remaining:
+            item = out.get()
+            if item is _DONE:
+                remaining -= 1
+                continue
+            yield item
+    finally:
+        stop.set()
+        while remaining:
+            try:
+                if out.get(timeout=0.1) is _DONE:
+                    remaining -= 1
+            except queue.Empty:
+                continue
+
+
+class _StationIds:
+    """Thread-safe iterator over station ids shared by producers."""
+
+    def __init__(self, station_ids: Iterable[str]):
+        self._it = iter(station_ids)
+        self._lock = threading.Lock()
+
+    def next(self) -> Optional[str]:
+        with self._lock:
+            return next(self._it, None)
+
+
+class ThreadedFetcher:
+    """Fetch stations on worker threads; each request uses its own requests session."""
+
+    def __init__(self, max_workers: int = 8):
+        self.max_workers = max_workers
+
+    def fetch_many(
+        self, station_ids: Iterable[str], queue_depth: int = DEFAULT_QUEUE_DEPTH
+    ) -> Iterator[FetchResult]:
+        """Yield results as they complete; workers block once ``queue_depth`` results are pending."""
+        ids = _StationIds(station_ids)
+        out: "queue.Queue" = queue.Queue(maxsize=max(1, queue_depth))
+        stop = threading.Event()
+
+        def _worker():
+            try:
+                while not stop.is_set():
+                    sid = ids.next()
+                    if sid is None:
+                        break
+                    t0 = time.perf_counter()
+                    try:
+                        status, body = fetch_departures_payload(sid)
+                    except Exception as e:
+                        res = FetchResult(sid, [], e, _error_status(e), time.perf_counter() - t0)
+                    else:
+                        res = _parse_result(sid, status, body, time.perf_counter() - t0)
+                    out.put(res)
+            finally:
+                out.put(_DONE)
+
+        workers = [threading.Thread(target=_worker, daemon=True) for _ in range(max(1, self.max_workers))]
+        for w in workers:
+            w.start()
+        yield from _drain(out, len(workers), stop)
+
+
+class AsyncFetcher:
+    """Fetch stations with asyncio over one shared keep-alive connection pool.
+
+    Args:
+        concurrency: Maximum requests in flight (also the pool size).
+        timeout: Per-request timeout in seconds.
+        url: Departures endpoint, overridable for tests against a local stub server.
+    """
+
+    def __init__(self, concurrency: int = 32, timeout: float = 20.0, url: str = DEPARTURES_URL):
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.url = url
+
+    def fetch_many(
+        self, station_ids: Iterable[str], queue_depth: int = DEFAULT_QUEUE_DEPTH
+    ) -> Iterator[FetchResult]:
+        """Run the event loop on a background thread and yield results as they complete."""
+        ids = _StationIds(station_ids)
+        out: "queue.Queue" = queue.Queue(maxsize=max(1, queue_depth))
+        stop = threading.Event()
+        failures: List[BaseException] = []
+
+        def _run():
+            try:
+                asyncio.run(self._produce(ids, out, stop))
+            except BaseException as e:  # e.g. httpx missing; re-raised in the consumer
+                failures.append(e)
+            finally:
+                out.put(_DONE)
+
+        threading.Thread(target=_run, daemon=True).start()
+        yield from _drain(out, 1, stop)
+        if failures:
+            raise failures[0]
+
+    async def _produce(self, ids: _StationIds, out: "queue.Queue", stop: threading.Event) -> None:
+        async with create_async_client(max_connections=self.concurrency, timeout=self.timeout) as client:
+
+            async def _worker():
+                while not stop.is_set():
+                    sid = ids.next()
+                    if sid is None:
+                        return
+                    t0 = time.perf_counter()
+                    try:
+                        status, body = await fetch_departures_payload_async(client, sid, self.url, self.timeout)
+                    except Exception as e:
+                        res = FetchResult(sid, [], e, _error_status(e), time.perf_counter() - t0)
+                    else:
+                        res = _parse_result(sid, status, body, time.perf_counter() - t0)
+                    # Blocking put runs off-loop so a full queue applies backpressure
+                    await asyncio.to_thread(out.put, res)
+
+            await asyncio.gather(*(_worker() for _ in range(max(1, self.concurrency))))
+
+
+def make_fetcher(engine: str = "threads", max_workers: int = 8):
+    """Return the fetcher for ``engine``; ``max_workers`` bounds concurrency for both engines."""
+    if engine == "threads":
+        return ThreadedFetcher(max_workers)
+    if engine == "async":
+        return AsyncFetcher(concurrency=max_workers)
+    raise ValueError(f"engine must be one of {FETCH_ENGINES}, got {engine!r}")
@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+import math
+from typing import Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+EARTH_RADIUS_M = 6371000.0
+# Length of one degree of latitude (and of longitude at the equator)
+M_PER_DEG = math.pi * EARTH_RADIUS_M / 180.0
+DEFAULT_CELL_M = 250.0
+
+T = TypeVar("T")
+
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1 = math.radians(lat1)
+    phi2 = math.radians(lat2)
+    dphi = math.radians(lat2 - lat1)
+    dlambda = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.atan2(math.sqrt(a), math.sqrt(1 - a))
+
+
+class PointGrid(Generic[T]):
+    """Fixed-size lat/lon grid over points for radius and nearest-neighbour queries.
+
+    Cells are ``cell_m`` metres high and, at the mean latitude of the points, as wide. A query
+    only visits the cells overlapping the bounding box of its circle and checks exact haversine
+    distances there, so its cost depends on the local density, not on the number of points.
+    """
+
+    def __init__(self, points: Iterable[Tuple[float, float, T]], cell_m: float = DEFAULT_CELL_M):
+        pts = [(float(lat), float(lon), item) for lat, lon, item in points]
+        self._cells: Dict[Tuple[int, int], List[Tuple[float, float, T]]] = {}
+        self._size = len(pts)
+        self._dlat = cell_m / M_PER_DEG
+        mean_lat = sum(p[0] for p in pts) / len(pts) if pts else 0.0
+        self._dlon = cell_m / (M_PER_DEG * max(math.cos(math.radians(mean_lat)), 0.01))
+        for p in pts:
+            self._cells.setdefault(self._cell(p[0], p[1]), []).append(p)
+        if pts:
+            self._lat_range = (min(p[0] for p in pts), max(p[0] for p in pts))
+            self._lon_range = (min(p[1] for p in pts), max(p[1] for p in pts))
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return math.floor(lat / self._dlat), math.floor(lon / self._dlon)
+
+    def within(self, lat: float, lon: float, radius_m: float) -> List[Tuple[float, T]]:
+        """(distance_m, item) for all points within ``radius_m``, nearest first."""
+        if not self._size or radius_m < 0:
+            return []
+        dlat = radius_m / M_PER_DEG
+        # Longitude span of the circle is widest at its pole-ward edge
+        edge = min(abs(lat) + dlat, 89.9)
+        dlon = radius_m / (M_PER_DEG * math.cos(math.radians(edge)))
+        r0, c0 = self._cell(lat - dlat, lon - dlon)
+        r1, c1 = self._cell(lat + dlat, lon + dlon)
+        out: List[Tuple[float, T]] = []
+        cells = self._cells
+        # Cheap planar pre-check, scaled so it never rejects a point inside the circle
+        ky, kx = M_PER_DEG, M_PER_DEG * math.cos(math.radians(edge))
+        bound = (radius_m * 1.01) ** 2
+        for r in range(r0, r1 + 1):
+            for c in range(c0, c1 + 1):
+                for plat, plon, item in cells.get((r, c), ()):
+                    dy, dx = (plat - lat) * ky, (plon - lon) * kx
+                    if dx * dx + dy * dy > bound:
+                        continue
+                    d = haversine_m(lat, lon, plat, plon)
+                    if d <= radius_m:
+                        out.append((d, item))
+        out.sort(key=lambda x: x[0])
+        return out
+
+    def nearest(
+        self, lat: float, lon: float, k: int = 1, max_distance_m: Optional[float] = None
+    ) -> List[Tuple[float, T]]:
+        """The ``k`` nearest (distance_m, item), optionally limited to ``max_distance_m``."""
+        if not self._size or k < 1:
+            return []
+        # Any point is at most this far away: distance to the far corner of the bounding box
+        reach = max(
+            haversine_m(lat, lon, plat, plon)
+            for plat in self._lat_range
+            for plon in self._lon_range
+        ) * 1.01 + 1.0
+        limit = reach if max_distance_m is None else min(max_distance_m, reach)
+        radius = self._dlat * M_PER_DEG
+        while True:
+            radius = min(radius, limit)
+            found = self.within(lat, lon, radius)
+            if len(found) >= k or radius >= limit:
+                return found[:k]
+            radius *= 2
@@ -5,24 +5,15 @@ import csv
 import math
 from dataclasses import dataclass
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Dict, List
 
 from .http import create_session
 from .stations import read_cache, DEFAULT_CACHE
+from .geo import PointGrid
+from .gtfs_feed import DEFAULT_FEED_DIR
 from .gtfs_index import _open_zip_from_source, _read_csv_from_zip  # type: ignore
 
 
-def _haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
-    from math import radians, sin, cos, atan2, sqrt
-
-    dphi = radians(lat2 - lat1)
-    dlambda = radians(lon2 - lon1)
-    a = sin(dphi / 2) ** 2 + cos(radians(lat1)) * cos(radians(lat2)) * sin(dlambda / 2) ** 2
-    c = 2 * atan2(sqrt(a), sqrt(1 - a))
-    return R * c
-
-
 @dataclass
 class GtfsStop:
     stop_id: str
@@ -33,8 +24,10 @@ class GtfsStop:
     parent_station: str | None
 
 
-def load_gtfs_stops(gtfs_source: str | Path) -> List[GtfsStop]:
-    with _open_zip_from_source(gtfs_source) as zf:
+def load_gtfs_stops(
+    gtfs_source: str | Path, feed_dir: Path = DEFAULT_FEED_DIR, refresh: bool = False
+) -> List[GtfsStop]:
+    with _open_zip_from_source(gtfs_source, feed_dir, refresh) as zf:
         stops_rows = _read_csv_from_zip(zf, "stops.txt")
     out: List[GtfsStop] = []
     for r in stops_rows:
@@ -65,15 +58,17 @@ def debug_link_for_stop_name(
     gtfs_source: str | Path,
     stations_cache: Path | None = None,
     radius_m: float = 300.0,
+    feed_dir: Path = DEFAULT_FEED_DIR,
+    refresh: bool = False,
 ) -> Dict:
-    stops = load_gtfs_stops(gtfs_source)
+    stops = load_gtfs_stops(gtfs_source, feed_dir, refresh)
     stations = read_cache(stations_cache or DEFAULT_CACHE)
     station_ids = {s.id for s in stations}
-    station_points: List[Tuple[str, float, float, str]] = []
-    for s in stations:
-        if s.latitude is None or s.longitude is None:
-            continue
-        station_points.append((s.id, s.latitude, s.longitude, s.name or ""))
+    grid = PointGrid(
+        (s.latitude, s.longitude, (s.id, s.name or ""))
+        for s in stations
+        if s.latitude is not None and s.longitude is not None
+    )
 
     q = stop_query.strip().lower()
     matches = [s for s in stops if q in s.stop_name.lower()]
@@ -83,12 +78,7 @@ def debug_link_for_stop_name(
         direct_id_match = st.stop_id in station_ids
         parent_id_match = st.parent_station in station_ids if st.parent_station else False
         # Nearest MVG stations by distance
-        nearest = []
-        for mv_id, mv_lat, mv_lon, mv_name in station_points:
-            d = _haversine_m(st.lat, st.lon, mv_lat, mv_lon)
-            if d <= radius_m:
-                nearest.append((d, mv_id, mv_name))
-        nearest.sort(key=lambda x: x[0])
+        nearest = grid.within(st.lat, st.lon, radius_m)
         results.append(
             {
                 "gtfs_stop_id": st.stop_id,
@@ -98,7 +88,7 @@ def debug_link_for_stop_name(
                 "parent_id_in_cache": parent_id_match,
                 "nearest_mvg_within_radius": [
                     {"distance_m": round(d, 1), "station_id": sid, "station_name": name}
-                    for d, sid, name in nearest[:10]
+                    for d, (sid, name) in nearest[:10]
                 ],
             }
         )
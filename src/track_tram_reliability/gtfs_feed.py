@@ -0,0 +1,119 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import NamedTuple, Optional
+
+import requests
+
+from .defaults import DEFAULT_FEED_DIR
+from .http import create_session
+
+# Within this age a cached feed is used without asking the server at all
+DEFAULT_FEED_MAX_AGE = 6 * 3600
+# Feed versions kept per URL (older files are deleted after a new one is stored)
+KEEP_VERSIONS = 3
+_CHUNK = 1 << 20
+
+
+class FeedInfo(NamedTuple):
+    path: Path
+    sha256: str
+    # "downloaded", "not-modified" (304), "cached" (fresh, no request) or "stale" (server unreachable)
+    status: str
+
+
+def _url_dir(cache_dir: Path, url: str) -> Path:
+    return Path(cache_dir) / hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+
+
+def read_meta(cache_dir: Path, url: str) -> dict:
+    path = _url_dir(cache_dir, url) / "meta.json"
+    return json.loads(path.read_text(encoding="utf-8")) if path.exists() else {}
+
+
+def _write_meta(directory: Path, meta: dict) -> None:
+    tmp = directory / "meta.json.tmp"
+    tmp.write_text(json.dumps(meta, indent=2), encoding="utf-8")
+    os.replace(tmp, directory / "meta.json")
+
+
+def _prune_versions(directory: Path, meta: dict) -> None:
+    versions = meta.get("versions", [])
+    for sha in versions[KEEP_VERSIONS:]:
+        (directory / f"{sha}.zip").unlink(missing_ok=True)
+    meta["versions"] = versions[:KEEP_VERSIONS]
+
+
+def fetch_feed(
+    url: str,
+    cache_dir: Path = DEFAULT_FEED_DIR,
+    max_age: float = DEFAULT_FEED_MAX_AGE,
+    refresh: bool = False,
+    session: Optional[requests.Session] = None,
+) -> FeedInfo:
+    """Return a local copy of the GTFS zip at ``url``, downloading only when it changed.
+
+    Feeds are stored as ``<cache_dir>/<url hash>/<sha256>.zip`` with the validators in
+    ``meta.json``. A copy younger than ``max_age`` seconds is used as is (``refresh`` forces a
+    check); otherwise a conditional GET (If-None-Match / If-Modified-Since) revalidates it and a
+    304 costs no transfer. New content is streamed to disk while hashing, never held in memory.
+    If the server cannot be reached, an existing copy is used.
+    """
+    directory = _url_dir(cache_dir, url)
+    meta = read_meta(cache_dir, url)
+    current = directory / f"{meta['sha256']}.zip" if meta.get("sha256") else None
+    if current is not None and not current.exists():
+        current, meta = None, {}
+    now = time.time()
+    if current is not None and not refresh and now - meta.get("checked_at", 0) < max_age:
+        return FeedInfo(current, meta["sha256"], "cached")
+
+    headers = {"Accept": "application/zip, */*"}
+    if current is not None:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+    sess = session or create_session()
+    try:
+        resp = sess.get(url, headers=headers, timeout=60, stream=True)
+    except requests.RequestException:
+        if current is None:
+            raise
+        return FeedInfo(current, meta["sha256"], "stale")
+
+    with resp:
+        if resp.status_code == 304 and current is not None:
+            meta["checked_at"] = now
+            _write_meta(directory, meta)
+            return FeedInfo(current, meta["sha256"], "not-modified")
+        resp.raise_for_status()
+        directory.mkdir(parents=True, exist_ok=True)
+        tmp = directory / f"download-{os.getpid()}.part"
+        digest = hashlib.sha256()
+        try:
+            with tmp.open("wb") as f:
+                for chunk in resp.iter_content(_CHUNK):
+                    digest.update(chunk)
+                    f.write(chunk)
+            sha = digest.hexdigest()
+            os.replace(tmp, directory / f"{sha}.zip")
+        finally:
+            tmp.unlink(missing_ok=True)
+
+    versions = [sha] + [v for v in meta.get("versions", []) if v != sha]
+    meta = {
+        "url": url,
+        "sha256": sha,
+        "etag": resp.headers.get("ETag"),
+        "last_modified": resp.headers.get("Last-Modified"),
+        "checked_at": now,
+        "versions": versions,
+    }
+    _prune_versions(directory, meta)
+    _write_meta(directory, meta)
+    return FeedInfo(directory / f"{sha}.zip", sha, "downloaded")
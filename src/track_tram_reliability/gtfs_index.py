@@ -3,18 +3,19 @@ from __future__ import annotations
 import csv
 import io
 import json
-import math
 import zipfile
 from dataclasses import dataclass
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, Iterable, List, Optional, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Set, Tuple
 
-from .http import create_session
+from .defaults import DEFAULT_LABEL_INDEX, GTFS_DEFAULT_URL
+from .geo import PointGrid
+from .gtfs_feed import DEFAULT_FEED_DIR, fetch_feed
+from .label_index import write_binary_label_index
 from .stations import read_cache, DEFAULT_CACHE
 from .models import Station
 
-GTFS_DEFAULT_URL = "https://www.mvg.de/static/gtfs/google_transit.zip"
-
 ROUTE_TYPE_TO_PRODUCT = {
     "0": "TRAM",
     "1": "UBAHN",
@@ -24,15 +25,17 @@ ROUTE_TYPE_TO_PRODUCT = {
 }
 
 
-def _haversine_meters(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
-    R = 6371000.0
-    phi1 = math.radians(lat1)
-    phi2 = math.radians(lat2)
-    dphi = math.radians(lat2 - lat1)
-    dlambda = math.radians(lon2 - lon1)
-    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlambda / 2) ** 2
-    c = 2 * math.atan2(math.sqrt(a), math.sqrt(1 - a))
-    return R * c
+def _base3(x: str) -> str:
+    parts = x.split(":")
+    return ":".join(parts[:3]) if len(parts) >= 3 else x
+
+
+def _nearest_station(grid: PointGrid, lat: str, lon: str, max_distance_m: float) -> Optional[Set[str]]:
+    try:
+        found = grid.nearest(float(lat), float(lon), 1, max_distance_m)
+    except ValueError:
+        return None
+    return {found[0][1]} if found else None
 
 
 @dataclass
@@ -50,47 +53,50 @@ class GtfsIndex:
         return GtfsIndex(mapping=obj.get("mapping", {}), source=obj.get("source", ""))
 
 
-def _read_csv_from_zip(zf: zipfile.ZipFile, name: str) -> List[Dict[str, str]]:
-    with zf.open(name) as f:
-        data = f.read()
-    # Use utf-8-sig to strip BOM if present
-    sio = io.StringIO(data.decode("utf-8-sig"))
-    reader = csv.DictReader(sio)
-    rows = []
-    for row in reader:
-        # Normalize keys to strip BOM and whitespace
-        norm = {str(k).lstrip("\ufeff").strip(): v for k, v in row.items()}
-        rows.append(norm)
-    return rows
-
+def _iter_csv_columns(zf: zipfile.ZipFile, name: str, columns: Sequence[str]) -> Iterator[Tuple[str, ...]]:
+    """Stream the given columns of a GTFS table as tuples ('' for missing columns/cells).
 
-def _resp_bytes(resp) -> bytes:
-    if hasattr(resp, "content"):
-        return resp.content  # requests.Response
-    if hasattr(resp, "_body"):
-        return resp._body  # our shim
-    # Last resort: try .read()
-    if hasattr(resp, "read"):
-        return resp.read()
-    raise TypeError("Unknown response object; cannot extract bytes")
+    The zip member is decompressed and decoded incrementally, so memory stays bounded
+    regardless of the table size (stop_times.txt has millions of rows).
+    """
+    with zf.open(name) as raw:
+        # utf-8-sig strips a BOM if present
+        reader = csv.reader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+        # Normalize header names (stray BOM, whitespace)
+        header = [h.lstrip("\ufeff").strip() for h in next(reader, [])]
+        idx = [header.index(c) if c in header else -1 for c in columns]
+        width = max(idx) + 1
+        if len(columns) > 1 and min(idx) >= 0:
+            getter = itemgetter(*idx)
+            for row in reader:
+                if len(row) >= width:
+                    yield getter(row)
+                elif row:
+                    yield tuple(row[i] if i < len(row) else "" for i in idx)
+            return
+        for row in reader:
+            if row:
+                yield tuple(row[i] if 0 <= i < len(row) else "" for i in idx)
 
 
-def _download_bytes(url: str) -> bytes:
-    sess = create_session()
-    resp = sess.get(url, timeout=60)
-    resp.raise_for_status()
-    return _resp_bytes(resp)
+def _read_csv_from_zip(zf: zipfile.ZipFile, name: str) -> List[Dict[str, str]]:
+    """Read a small GTFS table as dicts; large tables go through ``_iter_csv_columns``."""
+    with zf.open(name) as raw:
+        reader = csv.DictReader(io.TextIOWrapper(raw, encoding="utf-8-sig", newline=""))
+        # Normalize keys to strip BOM and whitespace
+        reader.fieldnames = [str(k).lstrip("\ufeff").strip() for k in reader.fieldnames or []]
+        return list(reader)
 
 
-def _open_zip_from_source(source: str | Path) -> zipfile.ZipFile:
+def _open_zip_from_source(
+    source: str | Path, feed_dir: Path = DEFAULT_FEED_DIR, refresh: bool = False
+) -> zipfile.ZipFile:
+    """Open a local GTFS zip, or the cached copy of a feed URL (see gtfs_feed.fetch_feed)."""
     p = Path(str(source))
     if p.exists():
         return zipfile.ZipFile(p)
     # Otherwise treat as URL
-    sess = create_session()
-    resp = sess.get(str(source), timeout=60)
-    resp.raise_for_status()
-    return zipfile.ZipFile(io.BytesIO(_resp_bytes(resp)))
+    return zipfile.ZipFile(fetch_feed(str(source), feed_dir, refresh=refresh).path)
 
 
 def build_label_index(
@@ -99,117 +105,103 @@ def build_label_index(
     labels: Optional[Set[str]] = None,
     stations_cache: Path | None = None,
     distance_threshold_m: float = 150.0,
+    feed_dir: Path = DEFAULT_FEED_DIR,
+    refresh: bool = False,
 ) -> GtfsIndex:
     """Build a mapping from (product, label) -> list of MVG station_ids using GTFS + stations cache.
 
     - products: set like {"TRAM", "BUS"}. If None, include all.
     - labels: route_short_name values to include (normalize to upper()). If None, include all.
+    - feed_dir/refresh: local feed cache for URL sources (see gtfs_feed.fetch_feed).
+
+    Stops map to stations by the first three id parts of their parent station (or their own id).
+    Stops without such a match take the nearest station within ``distance_threshold_m``
+    (0 disables this fallback).
     """
     products = {p.upper() for p in products} if products else None
     labels = {str(l).strip().upper() for l in labels} if labels else None
 
-    with _open_zip_from_source(gtfs_source) as zf:
-        routes = _read_csv_from_zip(zf, "routes.txt")
-        trips = _read_csv_from_zip(zf, "trips.txt")
-        stop_times = _read_csv_from_zip(zf, "stop_times.txt")
-        stops = _read_csv_from_zip(zf, "stops.txt")
-
-    # Filter routes by products & labels
-    route_ids: Set[str] = set()
-    route_product: Dict[str, str] = {}
-    for r in routes:
-        r_type = ROUTE_TYPE_TO_PRODUCT.get(r.get("route_type", ""))
-        r_label = (r.get("route_short_name") or "").strip().upper()
-        if products and (r_type not in products):
-            continue
-        if labels and (r_label not in labels):
-            continue
-        rid = r.get("route_id")
-        if not rid:
-            continue
-        route_ids.add(rid)
-        if r_type:
-            route_product[rid] = r_type
-
-    # Trips for those routes
-    route_trips: Dict[str, Set[str]] = {}
-    for t in trips:
-        rid = t.get("route_id")
-        if rid not in route_ids:
-            continue
-        trip_id = t.get("trip_id")
-        if not trip_id:
-            continue
-        route_trips.setdefault(rid, set()).add(trip_id)
-
-    # Stops used by those trips
-    trip_stops: Dict[str, Set[str]] = {}
-    for st in stop_times:
-        trip_id = st.get("trip_id")
-        stop_id = st.get("stop_id")
-        if trip_id and stop_id:
-            trip_stops.setdefault(trip_id, set()).add(stop_id)
-
-    route_stops: Dict[str, Set[str]] = {}
-    for rid, tids in route_trips.items():
-        all_stops = set()
-        for tid in tids:
-            all_stops |= trip_stops.get(tid, set())
-        route_stops[rid] = all_stops
-
-    # Build mapping product -> label -> station_ids by matching first 3 colon-separated parts (base3)
-    stations_cache = stations_cache or DEFAULT_CACHE
-    stations = read_cache(stations_cache)
-
-    def base3(x: str) -> str:
-        parts = x.split(":")
-        return ":".join(parts[:3]) if len(parts) >= 3 else x
-
     # Map base3 -> set of full station_ids in cache
+    stations = read_cache(stations_cache or DEFAULT_CACHE)
     station_base3_map: Dict[str, Set[str]] = {}
     for s in stations:
-        key = base3(s.id)
-        station_base3_map.setdefault(key, set()).add(s.id)
-
-    mapping: Dict[str, Dict[str, List[str]]] = {}
-
-    # Build stop lookup including parent_station mapping
-    stop_lookup: Dict[str, Dict[str, str]] = {s.get("stop_id"): s for s in stops if s.get("stop_id")}
-
-    for rid, sids in route_stops.items():
-        prod = route_product.get(rid)
-        # Fetch label
-        r = next((x for x in routes if x.get("route_id") == rid), None)
-        if r is None:
-            continue
-        label = (r.get("route_short_name") or "").strip().upper()
-        if not label or not prod:
-            continue
-        base3_keys: Set[str] = set()
-        for sid in sids:
-            sinfo = stop_lookup.get(sid)
-            if not sinfo:
+        station_base3_map.setdefault(_base3(s.id), set()).add(s.id)
+    grid: Optional[PointGrid] = None
+    if distance_threshold_m > 0:
+        grid = PointGrid(
+            (s.latitude, s.longitude, s.id)
+            for s in stations
+            if s.latitude is not None and s.longitude is not None
+        )
+
+    with _open_zip_from_source(gtfs_source, feed_dir, refresh) as zf:
+        # Selected routes -> (product, label); routes without either never make it into the index
+        route_key: Dict[str, Tuple[str, str]] = {}
+        for rid, r_type, r_label in _iter_csv_columns(
+            zf, "routes.txt", ("route_id", "route_type", "route_short_name")
+        ):
+            prod = ROUTE_TYPE_TO_PRODUCT.get(r_type)
+            label = r_label.strip().upper()
+            if not rid or not prod or not label:
                 continue
-            parent = (sinfo.get("parent_station") or "").strip()
-            use_id = parent if parent else sid
-            base3_keys.add(base3(use_id))
-        # Expand base3 keys into actual station_ids present in the cache
+            if (products and prod not in products) or (labels and label not in labels):
+                continue
+            route_key[rid] = (prod, label)
+
+        # Trips of those routes only; stops are collected per (product, label), not per trip
+        trip_key: Dict[str, Tuple[str, str]] = {}
+        key_stops: Dict[Tuple[str, str], Set[str]] = {}
+        for rid, trip_id in _iter_csv_columns(zf, "trips.txt", ("route_id", "trip_id")):
+            key = route_key.get(rid)
+            if key is not None and trip_id:
+                trip_key[trip_id] = key
+                key_stops.setdefault(key, set())
+
+        # Rows of one trip are contiguous in stop_times.txt, so the lookup is done once per trip
+        last_trip = None
+        stops: Optional[Set[str]] = None
+        for trip_id, stop_id in _iter_csv_columns(zf, "stop_times.txt", ("trip_id", "stop_id")):
+            if trip_id != last_trip:
+                last_trip = trip_id
+                key = trip_key.get(trip_id)
+                stops = key_stops[key] if key is not None else None
+            if stops is not None and stop_id:
+                stops.add(stop_id)
+
+        # Stop -> station ids, for stops of the selected routes only
+        used: Set[str] = set().union(*key_stops.values())
+        stop_stations: Dict[str, Set[str]] = {}
+        for sid, parent, lat, lon in _iter_csv_columns(
+            zf, "stops.txt", ("stop_id", "parent_station", "stop_lat", "stop_lon")
+        ):
+            if sid not in used:
+                continue
+            ids = station_base3_map.get(_base3(parent.strip() or sid))
+            if ids is None and grid:
+                ids = _nearest_station(grid, lat, lon, distance_threshold_m)
+            if ids:
+                stop_stations[sid] = ids
+
+    # Union per product and under ALL, then sort each list once
+    acc: Dict[str, Dict[str, Set[str]]] = {}
+    for (prod, label), sids in key_stops.items():
         selected_ids: Set[str] = set()
-        for k in base3_keys:
-            selected_ids |= station_base3_map.get(k, set())
-        # Store under specific product (if available) and under ALL, unioning across routes
-        # Specific product
-        if prod:
-            curr = set(mapping.setdefault(prod, {}).get(label, []))
-            mapping[prod][label] = sorted(curr | set(selected_ids))
-        # ALL bucket
-        curr_all = set(mapping.setdefault("ALL", {}).get(label, []))
-        mapping["ALL"][label] = sorted(curr_all | set(selected_ids))
+        for sid in sids:
+            selected_ids |= stop_stations.get(sid, set())
+        acc.setdefault(prod, {}).setdefault(label, set()).update(selected_ids)
+        acc.setdefault("ALL", {}).setdefault(label, set()).update(selected_ids)
+    mapping = {
+        prod: {label: sorted(ids) for label, ids in by_label.items()} for prod, by_label in acc.items()
+    }
 
     return GtfsIndex(mapping=mapping, source=str(gtfs_source))
 
 
 def write_label_index(index: GtfsIndex, out_path: Path) -> None:
+    """Write the binary label index (see label_index), or JSON for a ``.json`` path."""
+    if Path(out_path).suffix != ".json":
+        write_binary_label_index(index.mapping, out_path, index.source)
+        return
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text(index.to_json(), encoding="utf-8")
 
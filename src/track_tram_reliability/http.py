@@ -1,17 +1,83 @@
 from __future__ import annotations
 
+import asyncio
+import email.utils
+import time
+
 import requests
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 
 from . import __version__
+from .ratelimit import THROTTLE_STATUSES, get_limiter, limiter_for_url
+
+# Retry policy shared by the requests session and the async client
+DEFAULT_TOTAL_RETRIES = 3
+DEFAULT_BACKOFF_FACTOR = 0.5
+DEFAULT_STATUS_FORCELIST: tuple[int, ...] = (429, 500, 502, 503, 504)
+DEFAULT_BACKOFF_MAX = 120.0
+
+
+def default_headers(user_agent: str | None = None) -> dict:
+    return {
+        "User-Agent": user_agent
+        or f"TrackTramReliability/{__version__} (+https://example.com/track-tram-reliability)",
+        "Accept": "application/json",
+    }
+
+
+class _ObservedRetry(Retry):
+    """Retry that runs each attempt through the host's rate limiter, like ``async_get``.
+
+    A retried attempt hands its slot back with its outcome and the next attempt takes a new token
+    after the backoff. The outcome of the last attempt (exhausted retries included: ``increment``
+    raises before reporting it) is left to RateLimitedAdapter, so every response counts once.
+    """
+
+    _limiter = None  # set on the Retry returned by increment (Retry.new does not copy it)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None):
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if _pool is not None:
+            status = response.status if response is not None else None
+            retry_after = None
+            if response is not None and status in THROTTLE_STATUSES:
+                retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+            retry._limiter = get_limiter(str(_pool.host).lower())
+            retry._limiter.release(status, retry_after=retry_after)
+        return retry
+
+    def sleep(self, response=None):
+        super().sleep(response)
+        if self._limiter is not None:
+            self._limiter.acquire()
+
+
+class RateLimitedAdapter(HTTPAdapter):
+    """HTTPAdapter that takes a token/slot from the host's shared limiter for each request."""
+
+    def send(self, request, **kwargs):
+        limiter = limiter_for_url(request.url)
+        limiter.acquire()
+        t0 = time.monotonic()
+        status = None
+        retry_after = None
+        try:
+            resp = super().send(request, **kwargs)
+            status = resp.status_code
+            if status in THROTTLE_STATUSES:
+                retry_after = _retry_after_seconds(resp.headers.get("Retry-After"))
+            return resp
+        finally:
+            limiter.release(status, time.monotonic() - t0, retry_after)
 
 
 def create_session(
     user_agent: str | None = None,
-    total_retries: int = 3,
-    backoff_factor: float = 0.5,
-    status_forcelist: tuple[int, ...] = (429, 500, 502, 503, 504),
+    total_retries: int = DEFAULT_TOTAL_RETRIES,
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+    status_forcelist: tuple[int, ...] = DEFAULT_STATUS_FORCELIST,
+    rate_limited: bool = True,
 ) -> requests.Session:
     """Create a configured requests session with retry and a User-Agent.
 
@@ -20,12 +86,13 @@ def create_session(
         total_retries: Total retry attempts for transient errors.
         backoff_factor: Exponential backoff factor in seconds.
         status_forcelist: HTTP status codes to trigger retries.
+        rate_limited: Route requests through the shared per-host adaptive rate limiter.
 
     Returns:
         Configured requests Session.
     """
     session = requests.Session()
-    retry = Retry(
+    retry = (_ObservedRetry if rate_limited else Retry)(
         total=total_retries,
         read=total_retries,
         connect=total_retries,
@@ -35,16 +102,95 @@ def create_session(
         raise_on_status=False,
         respect_retry_after_header=True,
     )
-    adapter = HTTPAdapter(max_retries=retry)
+    adapter = (RateLimitedAdapter if rate_limited else HTTPAdapter)(max_retries=retry)
     session.mount("https://", adapter)
     session.mount("http://", adapter)
 
-    session.headers.update(
-        {
-            "User-Agent": user_agent
-            or f"TrackTramReliability/{__version__} (+https://example.com/track-tram-reliability)",
-            "Accept": "application/json",
-        }
-    )
+    session.headers.update(default_headers(user_agent))
 
     return session
+
+
+def create_async_client(
+    user_agent: str | None = None,
+    max_connections: int = 32,
+    timeout: float = 20.0,
+):
+    """Create a shared httpx.AsyncClient with one keep-alive connection pool.
+
+    Requires the optional ``httpx`` dependency (``pip install track-tram-reliability[async]``).
+    """
+    try:
+        import httpx
+    except ImportError as e:  # pragma: no cover - depends on environment
+        raise RuntimeError(
+            "The async fetch engine requires httpx: pip install 'track-tram-reliability[async]'"
+        ) from e
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    return httpx.AsyncClient(headers=default_headers(user_agent), limits=limits, timeout=timeout)
+
+
+def _backoff_seconds(attempt: int, backoff_factor: float) -> float:
+    # Same schedule as urllib3's Retry: no sleep before the first retry, then factor * 2**(n-1)
+    if attempt <= 1:
+        return 0.0
+    return min(DEFAULT_BACKOFF_MAX, backoff_factor * (2 ** (attempt - 1)))
+
+
+def _retry_after_seconds(value: str | None) -> float | None:
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, when.timestamp() - time.time())
+
+
+async def async_get(
+    client,
+    url: str,
+    params: dict | None = None,
+    timeout: float | None = None,
+    total_retries: int = DEFAULT_TOTAL_RETRIES,
+    backoff_factor: float = DEFAULT_BACKOFF_FACTOR,
+    status_forcelist: tuple[int, ...] = DEFAULT_STATUS_FORCELIST,
+    rate_limited: bool = True,
+):
+    """GET with the same retry policy as ``create_session`` (status, connect and read errors).
+
+    Honours Retry-After on 429/503 responses. Returns the final httpx.Response; like
+    ``raise_on_status=False`` the caller decides what to do with a non-2xx final status.
+    Each attempt goes through the host's shared adaptive rate limiter unless disabled.
+    """
+    import httpx
+
+    limiter = limiter_for_url(url) if rate_limited else None
+    attempt = 0
+    while True:
+        if limiter is not None:
+            await limiter.acquire_async()
+        t0 = time.monotonic()
+        try:
+            resp = await client.get(url, params=params, timeout=timeout)
+        except httpx.TransportError:  # connect/read errors and timeouts
+            if limiter is not None:
+                limiter.release(None, time.monotonic() - t0)
+            attempt += 1
+            if attempt > total_retries:
+                raise
+            await asyncio.sleep(_backoff_seconds(attempt, backoff_factor))
+            continue
+        delay = None
+        if resp.status_code in THROTTLE_STATUSES:
+            delay = _retry_after_seconds(resp.headers.get("Retry-After"))
+        if limiter is not None:
+            limiter.release(resp.status_code, time.monotonic() - t0, delay)
+        if resp.status_code not in status_forcelist or attempt >= total_retries:
+            return resp
+        attempt += 1
+        await asyncio.sleep(delay if delay is not None else _backoff_seconds(attempt, backoff_factor))
@@ -1,23 +1,37 @@
 from __future__ import annotations
 
-from typing import Iterable, List, Optional, Set, Tuple
-from sqlalchemy.exc import IntegrityError
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Iterable, List, NamedTuple, Optional, Set, Tuple, Union
 
-from .stations import read_cache, DEFAULT_CACHE
+from .defaults import INGEST_MODES
+from .stations import DEFAULT_CACHE, StationTable, load_station_table
 from .models import Station, Departure
-from .departures import fetch_departures
-from .db import create_session_maker, StationOrm, DepartureRawOrm, init_db
+from .fetchers import DEFAULT_QUEUE_DEPTH, FetchResult, make_fetcher
+from .metrics import CycleStats
+from .db import create_session_maker, init_db
+from .partitions import partition_router
+from .writer import DEFAULT_BATCH_SIZE, BatchWriter, bulk_upsert_departures, bulk_upsert_stations, check_history_mode
 
 ALLOWED_PRODUCTS: Set[str] = {"UBAHN", "SBAHN", "BUS", "TRAM"}
 
 
+class IngestResult(NamedTuple):
+    stations_processed: int
+    rows_inserted: int
+    rows_skipped: int
+    rows_updated: int = 0
+
+
 def _norm_label(val: Optional[str]) -> Optional[str]:
     if val is None:
         return None
     return str(val).strip().upper()
 
 
+def normalize_labels(labels: Optional[Iterable[str]]) -> Optional[Set[str]]:
+    """Normalize a label filter once (stripped, upper-case); None means no filter."""
+    return {_norm_label(x) for x in labels} if labels else None
+
+
 def _norm_name(val: Optional[str]) -> Optional[str]:
     if val is None:
         return None
@@ -25,69 +39,56 @@ def _norm_name(val: Optional[str]) -> Optional[str]:
 
 
 def filter_stations_by_products(stations: Iterable[Station], products: Optional[Set[str]]) -> List[Station]:
-    if not products or "ALL" in products:
-        return list(stations)
-    products = {p.upper() for p in products}
-    out: List[Station] = []
-    for s in stations:
-        if not s.products:
-            continue
-        s_prods = {p.upper() for p in s.products}
-        if s_prods & products:
-            out.append(s)
+    return select_stations(stations, products)
+
+
+def select_stations(
+    stations: Iterable[Station],
+    products: Optional[Set[str]] = None,
+    station_names: Optional[Set[str]] = None,
+    station_ids: Optional[Set[str]] = None,
+) -> List[Station]:
+    """Apply product, station name and station id filters to loaded models.
+
+    Same rules as StationTable.select, which serves the cached path. An empty (not None)
+    ``station_ids`` set, e.g. a label index lookup without hits, selects nothing.
+    """
+    out = list(stations)
+    if products and "ALL" not in products:
+        wanted = {p.upper() for p in products}
+        out = [s for s in out if s.products and any(p.upper() in wanted for p in s.products)]
+    if station_names:
+        name_set = {_norm_name(x) for x in station_names}
+        out = [s for s in out if s.name is not None and _norm_name(s.name) in name_set]
+    if station_ids is not None:
+        id_set = {x.strip() for x in station_ids}
+        out = [s for s in out if s.id in id_set]
     return out
 
 
 def sync_stations_from_cache_to_db(db_url: str, cache_path=DEFAULT_CACHE) -> int:
     """Upsert stations from cache into DB. Returns number of stations processed."""
-    stations = read_cache(cache_path)
+    return sync_stations_to_db(db_url, load_station_table(cache_path))
+
+
+def sync_stations_to_db(db_url: str, stations: Union[List[Station], StationTable]) -> int:
+    """Upsert already loaded stations into DB with one bulk statement per chunk."""
     init_db(db_url)  # ensure schema exists
     Session = create_session_maker(db_url)
-    count = 0
     with Session() as session:
-        for s in stations:
-            orm = session.get(StationOrm, s.id)
-            if orm is None:
-                orm = StationOrm(station_id=s.id)
-                session.add(orm)
-            orm.name = s.name
-            orm.place = s.place
-            orm.latitude = s.latitude
-            orm.longitude = s.longitude
-            orm.diva_id = s.diva_id
-            orm.tariff_zones = s.tariff_zones
-            orm.products = s.products  # JSON column supports list
-            count += 1
+        bulk_upsert_stations(session, stations)
         session.commit()
-    return count
+    return len(stations)
 
 
 def insert_departures(session, departures: List[Departure]) -> Tuple[int, int]:
-    """Insert departures; returns (inserted_count, skipped_duplicates)."""
-    inserted = 0
-    skipped = 0
-    for d in departures:
-        rec = DepartureRawOrm(
-            station_id=d.station_id,
-            transport_type=d.transport_type,
-            label=d.label,
-            destination=d.destination,
-            planned_departure_time=d.planned_departure_time,
-            realtime_departure_time=d.realtime_departure_time,
-            delay_in_minutes=d.delay_in_minutes,
-            cancelled=d.cancelled,
-            platform=d.platform,
-            realtime=d.realtime,
-            fetched_at=d.fetched_at,
-        )
-        session.add(rec)
-        try:
-            session.flush()
-            inserted += 1
-        except IntegrityError:
-            session.rollback()
-            skipped += 1
-    return inserted, skipped
+    """Insert departures; returns (inserted_count, skipped_duplicates).
+
+    Duplicates (by uq_departure_identity) keep the stored row. See ``writer.bulk_upsert_departures``
+    for the update mode and exact per-outcome counts.
+    """
+    counts = bulk_upsert_departures(session, departures)
+    return counts.inserted, counts.skipped
 
 
 def ingest_departures_for_products(
@@ -98,7 +99,12 @@ def ingest_departures_for_products(
     station_names: Optional[Set[str]] = None,
     station_ids: Optional[Set[str]] = None,
     max_workers: int = 8,
-) -> Tuple[int, int, int]:
+    mode: str = "first",
+    record_history: bool = False,
+    engine: str = "threads",
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+) -> IngestResult:
     """Ingest departures for all stations filtered by products, optionally filter by labels.
 
     Args:
@@ -107,56 +113,88 @@ def ingest_departures_for_products(
         products: Transport product types to include (e.g., {"BUS", "TRAM"}) or {"ALL"}
         labels: Optional set of normalized line labels to include (e.g., {"53", "164", "X30", "T17"}).
                 Note: labels are compared case-insensitively after stripping; numbers are matched as strings.
+        mode: "first" keeps the first stored observation of a departure, "latest" overwrites it with
+              newer realtime values, cancellation flag and platform.
+        record_history: Append new/changed observations to the departure_observations table
+                (needs mode "latest").
+        engine: "threads" (thread pool, one requests session per call) or "async" (asyncio with a
+                single pooled httpx client); max_workers bounds in-flight requests for both.
+        queue_depth: Fetched station results buffered ahead of the writer before fetching pauses.
+        batch_size: Rows per DB commit; results are written as they arrive rather than at the end.
 
     Returns:
-        (stations_processed, rows_inserted, rows_skipped)
+        IngestResult(stations_processed, rows_inserted, rows_skipped, rows_updated)
+    """
+    if mode not in INGEST_MODES:
+        raise ValueError(f"mode must be one of {sorted(INGEST_MODES)}, got {mode!r}")
+    check_history_mode(INGEST_MODES[mode], record_history)
+    table = load_station_table(cache_path)
+    rows = table.select(products, station_names, station_ids)
+
+    # Ensure schema and stations exist in DB
+    sync_stations_to_db(db_url, table)
+
+    return ingest_station_ids(
+        db_url,
+        [table.ids[i] for i in rows],
+        labels,
+        max_workers,
+        mode=mode,
+        record_history=record_history,
+        engine=engine,
+        queue_depth=queue_depth,
+        batch_size=batch_size,
+    )
+
+
+def ingest_station_ids(
+    db_url: str,
+    station_ids: Iterable[str],
+    labels: Optional[Set[str]] = None,
+    max_workers: int = 8,
+    mode: str = "first",
+    record_history: bool = False,
+    engine: str = "threads",
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    on_result: Optional[Callable[[FetchResult], None]] = None,
+    stats: Optional[CycleStats] = None,
+) -> IngestResult:
+    """Fetch and write departures for already selected stations (schema and stations must exist).
+
+    ``on_result`` is called for every fetched station (label-filtered departures, or the error)
+    after its rows are handed to the writer. ``stats`` records request outcomes and the ``write``
+    stage. Other arguments as in ingest_departures_for_products.
     """
-    stations = read_cache(cache_path)
-    filtered = filter_stations_by_products(stations, products)
-
-    # Apply station filters if provided
-    if station_names:
-        name_set = {_norm_name(x) for x in station_names}
-        filtered = [s for s in filtered if _norm_name(s.name) in name_set]
-    if station_ids:
-        id_set = {x.strip() for x in station_ids}
-        filtered = [s for s in filtered if s.id in id_set]
-
-    init_db(db_url)
     Session = create_session_maker(db_url)
+    norm_labels = normalize_labels(labels)
 
-    # Ensure stations exist in DB
-    sync_stations_from_cache_to_db(db_url, cache_path)
-
+    # Fetch concurrently and stream results through a bounded queue into a batching writer,
+    # overlapping network and DB time with constant memory
+    fetcher = make_fetcher(engine, max_workers)
     stations_processed = 0
-    rows_inserted = 0
-    rows_skipped = 0
-
-    norm_labels = {_norm_label(x) for x in labels} if labels else None
-
-    # Fetch departures concurrently to speed up ingestion
-    def _fetch_for_station(station_id: str):
-        deps = fetch_departures(station_id)
-        if norm_labels is not None:
-            deps = [d for d in deps if _norm_label(d.label) in norm_labels]
-        return station_id, deps
-
-    with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        futures = [executor.submit(_fetch_for_station, s.id) for s in filtered]
-        results = []
-        for fut in as_completed(futures):
-            try:
-                results.append(fut.result())
-            except Exception:
-                # Skip failures; continue others
-                continue
-
-    with Session() as session:
-        for station_id, deps in results:
-            ins, skip = insert_departures(session, deps)
-            rows_inserted += ins
-            rows_skipped += skip
-            stations_processed += 1
-        session.commit()
-
-    return stations_processed, rows_inserted, rows_skipped
+    route = partition_router(db_url)
+    writer = BatchWriter(Session, INGEST_MODES[mode], record_history, batch_size, route)
+    try:
+        with writer:
+            for res in fetcher.fetch_many(station_ids, queue_depth=queue_depth):
+                if stats is not None:
+                    stats.record_fetch(res)
+                if res.error is not None:
+                    # Skip failures; continue others (counted in ``stats``)
+                    if on_result is not None:
+                        on_result(res)
+                    continue
+                deps = res.departures
+                if norm_labels is not None:
+                    deps = [d for d in deps if _norm_label(d.label) in norm_labels]
+                writer.add(deps)
+                stations_processed += 1
+                if on_result is not None:
+                    on_result(res._replace(departures=deps))
+    finally:
+        if stats is not None:
+            stats.add_stage("write", writer.seconds)
+
+    counts = writer.counts
+    return IngestResult(stations_processed, counts.inserted, counts.skipped, counts.updated)
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import mmap
+import os
+import struct
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+# Binary label index, little-endian, all integers u32:
+#   header     magic, version, digest (first 16 bytes of sha256 over everything after the
+#              header), source length, string count, string blob length, key/ref/station/rev counts
+#   source     UTF-8 feed source the index was built from
+#   offsets    string_count + 1 offsets into the blob; strings are unique and sorted by UTF-8
+#              bytes, so a string id orders like the string itself
+#   blob       concatenated UTF-8 strings (station ids, products, labels)
+#   keys       (product id, label id, start, end) sorted by (product, label); [start, end) is
+#              a slice of refs
+#   refs       station string ids, sorted per key
+#   stations   (station id, start, end) sorted by station; [start, end) is a slice of rev
+#   rev        key indexes serving the station
+# The same mapping always encodes to the same bytes.
+MAGIC = b"TTRLIDX\x00"
+VERSION = 1
+_HEADER = struct.Struct("<8sI16s7I")
+_KEY = struct.Struct("<4I")
+_STATION = struct.Struct("<3I")
+
+Mapping = Dict[str, Dict[str, List[str]]]
+
+
+def encode_label_index(mapping: Mapping, source: str = "") -> bytes:
+    """Encode product -> label -> station ids into the binary format (deterministic)."""
+    strings = sorted(
+        {s for prod, by_label in mapping.items() for lab, ids in by_label.items() for s in (prod, lab, *ids)},
+        key=lambda s: s.encode("utf-8"),
+    )
+    sid = {s: i for i, s in enumerate(strings)}
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = [0]
+    for b in encoded:
+        offsets.append(offsets[-1] + len(b))
+
+    keys: List[Tuple[int, int, List[int]]] = sorted(
+        (sid[prod], sid[lab], sorted({sid[s] for s in ids}))
+        for prod, by_label in mapping.items()
+        for lab, ids in by_label.items()
+    )
+    refs: List[int] = []
+    key_rows = []
+    reverse: Dict[int, List[int]] = {}
+    for k, (p, lab, ids) in enumerate(keys):
+        key_rows.append(_KEY.pack(p, lab, len(refs), len(refs) + len(ids)))
+        refs.extend(ids)
+        for s in ids:
+            reverse.setdefault(s, []).append(k)
+    rev: List[int] = []
+    station_rows = []
+    for s in sorted(reverse):
+        station_rows.append(_STATION.pack(s, len(rev), len(rev) + len(reverse[s])))
+        rev.extend(reverse[s])
+
+    src = source.encode("utf-8")
+    body = b"".join(
+        [
+            src,
+            struct.pack(f"<{len(offsets)}I", *offsets),
+            b"".join(encoded),
+            b"".join(key_rows),
+            struct.pack(f"<{len(refs)}I", *refs),
+            b"".join(station_rows),
+            struct.pack(f"<{len(rev)}I", *rev),
+        ]
+    )
+    header = _HEADER.pack(
+        MAGIC, VERSION, hashlib.sha256(body).digest()[:16], len(src), len(strings),
+        offsets[-1], len(keys), len(refs), len(station_rows), len(rev),
+    )
+    return header + body
+
+
+def write_binary_label_index(mapping: Mapping, out_path: Path, source: str = "") -> None:
+    """Write atomically: readers that still map the old file keep a consistent view."""
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = out_path.with_name(out_path.name + ".tmp")
+    tmp.write_bytes(encode_label_index(mapping, source))
+    os.replace(tmp, out_path)
+
+
+def find_label_index(path: Path) -> Path:
+    """``path``, or its ``.json`` sibling if only that exists (the repo ships the JSON index)."""
+    path = Path(path)
+    fallback = path.with_suffix(".json")
+    if not path.exists() and path.suffix != ".json" and fallback.exists():
+        return fallback
+    return path
+
+
+class LabelIndex:
+    """Read-only view of a label index file, resolved without building the mapping.
+
+    Binary files are memory-mapped; a JSON index (see gtfs_index.write_label_index) is encoded
+    in memory on load. ``reload_if_changed`` picks up a rebuilt file; a rebuild with identical
+    content is not a change.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self._buf = None
+        self._stat: Optional[Tuple[int, int, int]] = None
+        self.digest = b""
+        self._load()
+
+    def _load(self) -> None:
+        st = os.stat(self.path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) == MAGIC:
+                buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                f.seek(0)
+                obj = json.loads(f.read().decode("utf-8"))
+                buf = encode_label_index(obj.get("mapping", {}), obj.get("source", ""))
+        magic, version, digest, *counts = _HEADER.unpack_from(buf, 0)
+        if version != VERSION:
+            raise ValueError(f"{self.path}: unsupported label index version {version}")
+        self.close()
+        self._buf = buf
+        self._stat = (st.st_ino, st.st_mtime_ns, st.st_size)
+        self.digest = digest
+        src_len, self._n_strings, blob_len, self._n_keys, n_refs, self._n_stations, _ = counts
+        pos = _HEADER.size
+        self.source = bytes(buf[pos : pos + src_len]).decode("utf-8")
+        pos += src_len
+        self._offsets = pos
+        self._blob = pos + 4 * (self._n_strings + 1)
+        self._keys = self._blob + blob_len
+        self._refs = self._keys + _KEY.size * self._n_keys
+        self._stations = self._refs + 4 * n_refs
+        self._rev = self._stations + _STATION.size * self._n_stations
+
+    def close(self) -> None:
+        if isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._buf = None
+
+    def reload_if_changed(self) -> bool:
+        """Re-open the file if it was rebuilt with different content. Returns True if so."""
+        st = os.stat(self.path)
+        if (st.st_ino, st.st_mtime_ns, st.st_size) == self._stat:
+            return False
+        digest = self.digest
+        self._load()
+        return self.digest != digest
+
+    def _string(self, i: int) -> str:
+        lo, hi = struct.unpack_from("<2I", self._buf, self._offsets + 4 * i)
+        return bytes(self._buf[self._blob + lo : self._blob + hi]).decode("utf-8")
+
+    def _string_id(self, s: str) -> Optional[int]:
+        target = s.encode("utf-8")
+        lo, hi = 0, self._n_strings
+        while lo < hi:
+            mid = (lo + hi) // 2
+            a, b = struct.unpack_from("<2I", self._buf, self._offsets + 4 * mid)
+            probe = self._buf[self._blob + a : self._blob + b]
+            if probe == target:
+                return mid
+            if probe < target:
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def _find_key(self, product: int, label: int) -> Optional[Tuple[int, int]]:
+        lo, hi = 0, self._n_keys
+        while lo < hi:
+            mid = (lo + hi) // 2
+            p, lab, start, end = _KEY.unpack_from(self._buf, self._keys + _KEY.size * mid)
+            if (p, lab) == (product, label):
+                return start, end
+            if (p, lab) < (product, label):
+                lo = mid + 1
+            else:
+                hi = mid
+        return None
+
+    def stations_for(self, products: Optional[Iterable[str]], labels: Iterable[str]) -> Set[str]:
+        """Union of station ids over (product, label) pairs; products None means the ALL bucket."""
+        out: Set[str] = set()
+        label_ids = [i for i in (self._string_id(lab) for lab in labels) if i is not None]
+        for prod in products or ("ALL",):
+            p = self._string_id(prod)
+            if p is None:
+                continue
+            for lab in label_ids:
+                span = self._find_key(p, lab)
+                if span is not None:
+                    refs = struct.unpack_from(f"<{span[1] - span[0]}I", self._buf, self._refs + 4 * span[0])
+                    out.update(self._string(i) for i in refs)
+        return out
+
+    def lines_for_station(self, station_id: str) -> List[Tuple[str, str]]:
+        """(product, label) pairs serving a station, without the ALL bucket."""
+        s = self._string_id(station_id)
+        if s is None:
+            return []
+        lo, hi = 0, self._n_stations
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if _STATION.unpack_from(self._buf, self._stations + _STATION.size * mid)[0] < s:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == self._n_stations:
+            return []
+        station, start, end = _STATION.unpack_from(self._buf, self._stations + _STATION.size * lo)
+        if station != s:
+            return []
+        out = []
+        for k in struct.unpack_from(f"<{end - start}I", self._buf, self._rev + 4 * start):
+            p, lab, _, _ = _KEY.unpack_from(self._buf, self._keys + _KEY.size * k)
+            prod = self._string(p)
+            if prod != "ALL":
+                out.append((prod, self._string(lab)))
+        return out
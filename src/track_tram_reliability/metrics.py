@@ -0,0 +1,282 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterator, List, Optional, Sequence, TextIO, Tuple
+
+from .fetchers import FetchResult
+from .ratelimit import limiter_snapshots
+
+# Upper bounds (seconds) of the fetch latency and cycle duration histograms
+LATENCY_BUCKETS: Tuple[float, ...] = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 60.0)
+CYCLE_BUCKETS: Tuple[float, ...] = (1.0, 5.0, 15.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+Labels = Tuple[Tuple[str, str], ...]
+
+
+def _error_reason(res: FetchResult) -> str:
+    if res.status is not None and res.status >= 400:
+        return f"http_{res.status}"
+    return type(res.error).__name__
+
+
+def _quantile(values: Sequence[float], q: float) -> float:
+    """Nearest-rank quantile of sorted ``values``."""
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+class CycleStats:
+    """Timings and outcomes of one poll cycle.
+
+    Stages timed on the poller thread: ``cache`` (stations cache and label index check, reload
+    and station selection), ``sync`` (station upsert after a cache change), ``ingest`` (fetch +
+    write, wall time) and ``write`` (DB flushes inside ``ingest``). ``fetch`` and ``parse`` add up the per-station time
+    of all fetch workers, so with N workers they can exceed ``ingest``. A slow cycle with a large
+    ``write`` share waits on the database (e.g. SQLite locking); with a small one it waits on the
+    network, unless ``parse`` is close to ``ingest`` times the worker count.
+    """
+
+    def __init__(self, now: Optional[float] = None):
+        self.started_at = time.time() if now is None else now
+        self._t0 = time.perf_counter()
+        self.seconds = 0.0
+        self.stages: Dict[str, float] = {}
+        self.latencies: List[float] = []
+        self.statuses: Dict[str, int] = {}
+        self.station_errors: Dict[str, str] = {}
+        self.stations = 0
+        self.rows: Dict[str, int] = {}
+        self.failed: Optional[str] = None
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_stage(name, time.perf_counter() - t0)
+
+    def add_stage(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def record_fetch(self, res: FetchResult) -> None:
+        """Count one station result (called on the consumer thread, see ingest_station_ids)."""
+        self.latencies.append(res.fetch_seconds)
+        self.add_stage("fetch", res.fetch_seconds)
+        self.add_stage("parse", res.parse_seconds)
+        status = "transport" if res.status is None else str(res.status)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        if res.error is not None:
+            self.station_errors[res.station_id] = _error_reason(res)
+
+    def finish(self, result=None, error: Optional[BaseException] = None) -> None:
+        """Close the cycle with its IngestResult, or the exception that aborted it."""
+        self.seconds = time.perf_counter() - self._t0
+        if result is not None:
+            self.stations = result.stations_processed
+            self.rows = {
+                "inserted": result.rows_inserted,
+                "updated": result.rows_updated,
+                "skipped": result.rows_skipped,
+            }
+        if error is not None:
+            self.failed = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        lat = sorted(self.latencies)
+        reasons: Dict[str, int] = {}
+        for reason in self.station_errors.values():
+            reasons[reason] = reasons.get(reason, 0) + 1
+        return {
+            "ts": round(self.started_at, 3),
+            "seconds": round(self.seconds, 4),
+            "stations": self.stations,
+            "requests": len(lat),
+            "rows": self.rows,
+            "stages": {k: round(v, 4) for k, v in sorted(self.stages.items())},
+            "fetch_latency": {
+                "p50": round(_quantile(lat, 0.5), 4),
+                "p95": round(_quantile(lat, 0.95), 4),
+                "max": round(lat[-1], 4),
+            }
+            if lat
+            else None,
+            "http_status": dict(sorted(self.statuses.items())),
+            "errors": dict(sorted(reasons.items())),
+            "failed_stations": sorted(self.station_errors),
+            "error": self.failed,
+        }
+
+
+class _Histogram:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class PollerMetrics:
+    """Cumulative poller metrics, rendered in the Prometheus text format.
+
+    ``record_cycle`` folds a finished CycleStats in under a lock, so ``render`` can be served from
+    another thread (see serve_metrics). Per-station error counters are labelled by station id and
+    reason; only failing stations appear.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.cycles = 0
+        self.failed_cycles = 0
+        self.stations_in_scope = 0
+        self.last_cycle: Optional[dict] = None
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        self._gauges: Dict[str, Dict[Labels, float]] = {}
+        self.cycle_seconds = _Histogram(CYCLE_BUCKETS)
+        self.fetch_latency = _Histogram(LATENCY_BUCKETS)
+
+    def _inc(self, name: str, labels: Labels, value: float = 1.0) -> None:
+        series = self._counters.setdefault(name, {})
+        series[labels] = series.get(labels, 0.0) + value
+
+    def _set(self, name: str, labels: Labels, value: float) -> None:
+        self._gauges.setdefault(name, {})[labels] = value
+
+    def set_scope(self, stations: int) -> None:
+        with self._lock:
+            self.stations_in_scope = stations
+
+    def record_cycle(self, stats: CycleStats, log: Optional[TextIO] = None) -> dict:
+        """Add a finished cycle and append its summary to ``log`` as a JSON line, if given.
+
+        Returns the summary (see CycleStats.to_dict).
+        """
+        summary = stats.to_dict()
+        with self._lock:
+            self.cycles += 1
+            if stats.failed is not None:
+                self.failed_cycles += 1
+            self.cycle_seconds.observe(stats.seconds)
+            self._gauges.pop("last_stage_seconds", None)
+            for v in stats.latencies:
+                self.fetch_latency.observe(v)
+            for stage, seconds in stats.stages.items():
+                self._inc("stage_seconds_total", (("stage", stage),), seconds)
+                self._set("last_stage_seconds", (("stage", stage),), seconds)
+            for status, n in stats.statuses.items():
+                self._inc("http_responses_total", (("status", status),), n)
+            for sid, reason in stats.station_errors.items():
+                self._inc("station_errors_total", (("reason", reason), ("station", sid)))
+            for outcome, n in stats.rows.items():
+                self._inc("departures_total", (("outcome", outcome),), n)
+            self._inc("stations_polled_total", (), stats.stations)
+            self.last_cycle = summary
+        if log is not None:
+            write_cycle_log(log, summary)
+        return summary
+
+    def render(self) -> str:
+        """Prometheus text exposition (version 0.0.4) of all metrics, plus rate limiter state."""
+        out: List[str] = []
+
+        def family(name: str, kind: str, help_text: str) -> None:
+            out.append(f"# HELP ttr_{name} {help_text}")
+            out.append(f"# TYPE ttr_{name} {kind}")
+
+        def sample(name: str, labels: Labels, value: float) -> None:
+            label_text = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            out.append(f"ttr_{name}{{{label_text}}} {_number(value)}" if labels else f"ttr_{name} {_number(value)}")
+
+        def histogram(name: str, hist: _Histogram, help_text: str) -> None:
+            family(name, "histogram", help_text)
+            cumulative = 0
+            for bound, n in zip(hist.buckets, hist.counts):
+                cumulative += n
+                sample(f"{name}_bucket", (("le", _number(bound)),), cumulative)
+            sample(f"{name}_bucket", (("le", "+Inf"),), hist.count)
+            sample(f"{name}_sum", (), hist.sum)
+            sample(f"{name}_count", (), hist.count)
+
+        with self._lock:
+            family("poll_cycles_total", "counter", "Poll cycles run")
+            sample("poll_cycles_total", (), self.cycles)
+            family("poll_cycles_failed_total", "counter", "Poll cycles aborted by an error")
+            sample("poll_cycles_failed_total", (), self.failed_cycles)
+            family("stations_in_scope", "gauge", "Stations selected for polling")
+            sample("stations_in_scope", (), self.stations_in_scope)
+            histogram("poll_cycle_seconds", self.cycle_seconds, "Wall time of a poll cycle")
+            histogram("fetch_latency_seconds", self.fetch_latency, "Departures request latency per station")
+            for name, kind, help_text in (
+                ("stage_seconds_total", "counter", "Time spent per cycle stage (fetch/parse summed over workers)"),
+                ("last_stage_seconds", "gauge", "Stage times of the last cycle"),
+                ("http_responses_total", "counter", "Final departures response status per station request"),
+                ("station_errors_total", "counter", "Failed station fetches by reason"),
+                ("departures_total", "counter", "Departure rows written by outcome"),
+                ("stations_polled_total", "counter", "Stations fetched and written successfully"),
+            ):
+                series = (self._counters if kind == "counter" else self._gauges).get(name, {})
+                family(name, kind, help_text)
+                for labels, value in sorted(series.items()):
+                    sample(name, labels, value)
+        limiters = limiter_snapshots()
+        for key, kind, help_text in (
+            ("rate", "gauge", "Adaptive rate limit (requests/s) per host"),
+            ("concurrency", "gauge", "Adaptive concurrency limit per host"),
+            ("in_flight", "gauge", "Requests in flight per host"),
+            ("throttled", "counter", "Throttling responses (429/503) per host"),
+        ):
+            name = f"ratelimit_{key}_total" if kind == "counter" else f"ratelimit_{key}"
+            family(name, kind, help_text)
+            for host, snap in sorted(limiters.items()):
+                sample(name, (("host", host),), snap[key])
+        return "\n".join(out) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def write_cycle_log(stream: TextIO, summary: dict) -> None:
+    """Append one cycle summary as a JSON line."""
+    stream.write(json.dumps(summary, separators=(",", ":")) + "\n")
+    stream.flush()
+
+
+def serve_metrics(metrics: PollerMetrics, port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``GET /metrics`` on a daemon thread; call ``shutdown()`` on the result to stop."""
+
+    class _Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = metrics.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", CONTENT_TYPE)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
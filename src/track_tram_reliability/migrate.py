@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from typing import NamedTuple
+
+from sqlalchemy import Boolean, Integer, String, column, func, inspect, insert, select, table, text
+
+from .defaults import DEFAULT_MIGRATION_BATCH
+from .db import (
+    DepartureObservationOrm,
+    DepartureOrm,
+    create_engine_for_url,
+    create_schema,
+    create_session_maker,
+    dialect_insert_for,
+    dispose_engines,
+    init_db,
+)
+from .dims import compact_rows
+
+LEGACY_TABLE = "departures_raw"
+# Legacy tables are renamed out of the way first, so a failed migration can simply be rerun
+LEGACY_DEPARTURES = "departures_raw_legacy"
+LEGACY_OBSERVATIONS = "departure_observations_legacy"
+
+_legacy = table(
+    LEGACY_DEPARTURES,
+    column("id", Integer),
+    column("station_id", String),
+    column("transport_type", String),
+    column("label", String),
+    column("destination", String),
+    column("planned_departure_time", Integer),
+    column("realtime_departure_time", Integer),
+    column("delay_in_minutes", Integer),
+    column("cancelled", Boolean),
+    column("platform", String),
+    column("realtime", Boolean),
+    column("fetched_at", Integer),
+)
+_legacy_observations = table(
+    LEGACY_OBSERVATIONS,
+    *(column(c.name, c.type) for c in DepartureObservationOrm.__table__.columns),
+)
+
+
+class MigrationResult(NamedTuple):
+    rows_copied: int
+    rows_merged: int  # legacy rows that collapsed into an existing departure (NULL label etc.)
+    observations_copied: int
+    legacy_kept: bool
+
+
+def _rename_legacy_tables(engine) -> None:
+    tables = set(inspect(engine).get_table_names())
+    with engine.begin() as conn:
+        conn.execute(text(f"ALTER TABLE {LEGACY_TABLE} RENAME TO {LEGACY_DEPARTURES}"))
+        if "departure_observations" in tables:
+            conn.execute(text(f"ALTER TABLE departure_observations RENAME TO {LEGACY_OBSERVATIONS}"))
+            if engine.dialect.name == "postgresql":
+                # The primary key index keeps its name and would clash with the new table's
+                conn.execute(text(
+                    f"ALTER INDEX departure_observations_pkey RENAME TO {LEGACY_OBSERVATIONS}_pkey"
+                ))
+
+
+def migrate_storage(
+    db_url: str, batch_size: int = DEFAULT_MIGRATION_BATCH, keep_legacy: bool = False
+) -> MigrationResult:
+    """Convert a database with the wide departures_raw table to the compact layout.
+
+    Departures keep their ids, so observation history and exported ``id`` columns stay valid.
+    Rows are copied in ``batch_size`` batches, each committed on its own; an interrupted
+    migration resumes after the last copied id. Stop the poller while this runs.
+    """
+    engine = create_engine_for_url(db_url)
+    tables = set(inspect(engine).get_table_names())
+    if LEGACY_TABLE in tables:
+        if LEGACY_DEPARTURES in tables:
+            raise RuntimeError(f"both {LEGACY_TABLE} and {LEGACY_DEPARTURES} exist; resolve manually")
+        _rename_legacy_tables(engine)
+    elif LEGACY_DEPARTURES not in tables:
+        init_db(db_url)
+        return MigrationResult(0, 0, 0, False)
+    create_schema(engine)
+
+    Session = create_session_maker(db_url)
+    dialect_insert = dialect_insert_for(engine.dialect.name)
+    D = DepartureOrm
+    read = 0
+    with Session() as session:
+        before = session.execute(select(func.count(D.id))).scalar()
+        last_id = session.execute(select(func.max(D.id))).scalar() or 0
+        # Legacy rows with a NULL label/destination can collapse into one departure now
+        stmt = insert(D.__table__)
+        if dialect_insert is not None:
+            stmt = dialect_insert(D.__table__).on_conflict_do_nothing()
+        while True:
+            query = select(_legacy).where(_legacy.c.id > last_id).order_by(_legacy.c.id).limit(batch_size)
+            batch = [r._asdict() for r in session.execute(query)]
+            if not batch:
+                break
+            session.execute(stmt, compact_rows(session, batch))
+            session.commit()
+            read += len(batch)
+            last_id = batch[-1]["id"]
+        copied = session.execute(select(func.count(D.id))).scalar() - before
+
+        observations = 0
+        if LEGACY_OBSERVATIONS in set(inspect(engine).get_table_names()):
+            O, L = DepartureObservationOrm, _legacy_observations
+            cols = [c.name for c in O.__table__.columns]
+            # History of merged-away departures has nothing left to point to
+            source = select(*(L.c[c] for c in cols)).where(L.c.departure_id.in_(select(D.id)))
+            observations = session.execute(insert(O).from_select(cols, source)).rowcount
+            session.execute(text(f"DROP TABLE {LEGACY_OBSERVATIONS}"))
+            session.commit()
+
+        if engine.dialect.name == "postgresql":
+            # Copied ids bypassed the sequence
+            session.execute(text(
+                "SELECT setval(pg_get_serial_sequence('departures', 'id'), "
+                "COALESCE((SELECT max(id) FROM departures), 1))"
+            ))
+        if not keep_legacy:
+            session.execute(text(f"DROP TABLE {LEGACY_DEPARTURES}"))
+        session.commit()
+
+    dispose_engines(db_url)
+    init_db(db_url)
+    return MigrationResult(copied, read - copied, observations, keep_legacy)
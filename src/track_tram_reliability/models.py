@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, NamedTuple, Optional
 from pydantic import BaseModel
 
 
@@ -27,3 +27,22 @@ class Departure(BaseModel):
     platform: Optional[str]
     realtime: bool = False
     fetched_at: int  # unix epoch (UTC)
+
+
+class DepartureRow(NamedTuple):
+    """Unvalidated departure with the fields of ``Departure``, used on the ingest hot path."""
+
+    station_id: str
+    planned_departure_time: Optional[int]
+    realtime_departure_time: Optional[int]
+    delay_in_minutes: Optional[int]
+    transport_type: Optional[str]
+    label: Optional[str]
+    destination: Optional[str]
+    cancelled: bool
+    platform: Optional[str]
+    realtime: bool
+    fetched_at: int
+
+    def to_model(self) -> Departure:
+        return Departure(**self._asdict())
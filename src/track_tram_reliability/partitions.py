@@ -0,0 +1,232 @@
+from __future__ import annotations
+
+import shutil
+import time
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, NamedTuple, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+
+from .defaults import PERIODS
+from .db import DepartureOrm, PartitionSchemeOrm, create_session_maker, dispose_engines, init_db
+from .models import Departure
+from .timeutil import SERVICE_TZ, date_start
+
+# Departures are partitioned by bucket time (planned departure, else fetch time) into one
+# SQLite file per local calendar month or ISO week next to the main database file, e.g.
+# data/reliability.2024-05.db. Each partition file is a complete database of its own (schema,
+# dimensions, departures_raw view); stations, rollups and the scheme stay in the main file.
+SCHEME_NAME = "departures"
+
+
+class PartitionScheme(NamedTuple):
+    period: str
+    start: int  # bucket times before this stay in the main database
+
+
+class Partition(NamedTuple):
+    name: str
+    lo: int
+    hi: int
+    db_url: str
+
+
+class RetentionResult(NamedTuple):
+    dropped: List[str]
+    archived: List[str]
+
+
+def _period_start(period: str, d: date) -> date:
+    return d.replace(day=1) if period == "month" else d - timedelta(days=d.weekday())
+
+
+def _next_start(period: str, start: date) -> date:
+    if period == "month":
+        return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return start + timedelta(days=7)
+
+
+def _previous_start(period: str, start: date) -> date:
+    return _period_start(period, start - timedelta(days=1))
+
+
+def _name(period: str, start: date) -> str:
+    if period == "month":
+        return start.strftime("%Y-%m")
+    year, week, _ = start.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+def _parse_name(period: str, name: str) -> Optional[date]:
+    try:
+        if period == "month":
+            start = datetime.strptime(name, "%Y-%m").date()
+        else:
+            year, _, week = name.partition("-W")
+            start = date.fromisocalendar(int(year), int(week), 1)
+    except ValueError:
+        return None
+    return start if _name(period, start) == name else None
+
+
+def _db_path(db_url: str) -> Path:
+    if not db_url.startswith("sqlite:///") or ":memory:" in db_url:
+        raise ValueError(f"partitioning needs a file-based SQLite database, got {db_url}")
+    return Path(db_url[len("sqlite:///") :])
+
+
+def partition_url(db_url: str, name: str) -> str:
+    path = _db_path(db_url)
+    return f"sqlite:///{path.with_name(f'{path.stem}.{name}{path.suffix}')}"
+
+
+def _partition(db_url: str, period: str, start: date) -> Partition:
+    name = _name(period, start)
+    return Partition(
+        name, date_start(start), date_start(_next_start(period, start)), partition_url(db_url, name)
+    )
+
+
+def partition_scheme(db_url: str) -> Optional[PartitionScheme]:
+    init_db(db_url)
+    with create_session_maker(db_url)() as session:
+        row = session.get(PartitionSchemeOrm, SCHEME_NAME)
+        return None if row is None else PartitionScheme(row.period, row.start)
+
+
+def enable_partitioning(db_url: str, period: str, now: Optional[float] = None) -> PartitionScheme:
+    """Route departures into per-``period`` files from now on.
+
+    Rows already stored stay in the main file. If it has any, the current period stays there
+    as well and partitioning starts with the next one, so a departure is never split between
+    two files.
+    """
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {PERIODS}, got {period!r}")
+    _db_path(db_url)
+    init_db(db_url)
+    with create_session_maker(db_url)() as session:
+        row = session.get(PartitionSchemeOrm, SCHEME_NAME)
+        if row is not None:
+            if row.period != period:
+                raise ValueError(f"{db_url} is already partitioned by {row.period}")
+            return PartitionScheme(row.period, row.start)
+        today = datetime.fromtimestamp(time.time() if now is None else now, tz=SERVICE_TZ).date()
+        start = _period_start(period, today)
+        if session.execute(select(DepartureOrm.id).limit(1)).first() is not None:
+            start = _next_start(period, start)
+        row = PartitionSchemeOrm(name=SCHEME_NAME, period=period, start=date_start(start))
+        session.add(row)
+        session.commit()
+        return PartitionScheme(row.period, row.start)
+
+
+def partition_for(db_url: str, scheme: PartitionScheme, ts: int) -> Optional[Partition]:
+    """Partition for a bucket time; None for times that belong to the main file."""
+    if ts < scheme.start:
+        return None
+    d = datetime.fromtimestamp(ts, tz=SERVICE_TZ).date()
+    return _partition(db_url, scheme.period, _period_start(scheme.period, d))
+
+
+def list_partitions(db_url: str, scheme: Optional[PartitionScheme] = None) -> List[Partition]:
+    """Partition files present on disk, oldest first (empty if not partitioned)."""
+    scheme = scheme or partition_scheme(db_url)
+    if scheme is None:
+        return []
+    path = _db_path(db_url)
+    out: List[Partition] = []
+    for f in path.parent.glob(f"{path.stem}.*{path.suffix}"):
+        start = _parse_name(scheme.period, f.name[len(path.stem) + 1 : len(f.name) - len(path.suffix)])
+        if start is not None:
+            out.append(_partition(db_url, scheme.period, start))
+    return sorted(out, key=lambda p: p.lo)
+
+
+def source_urls(db_url: str, lo: Optional[int] = None, hi: Optional[int] = None) -> List[str]:
+    """Databases that may hold departures with bucket time in [lo, hi): main file first."""
+    urls = [db_url]
+    for part in list_partitions(db_url):
+        if (lo is None or part.hi > lo) and (hi is None or part.lo < hi):
+            urls.append(part.db_url)
+    return urls
+
+
+def source_sessions(
+    db_url: str, session, lo: Optional[int] = None, hi: Optional[int] = None
+) -> Iterator[Tuple[str, object]]:
+    """Yield (db_url, session) per source database, reusing ``session`` for the main file.
+
+    Sources hold disjoint time ranges in ascending order, so per-source results never overlap.
+    """
+    for url in source_urls(db_url, lo, hi):
+        if url == db_url:
+            yield url, session
+            continue
+        init_db(url)
+        with create_session_maker(url)() as src:
+            yield url, src
+
+
+def partition_router(db_url: str) -> Callable[[Sequence[Departure]], List[Tuple[object, List[Departure]]]]:
+    """Group departures by target database for writer.BatchWriter: [(sessionmaker, departures)]."""
+
+    def route(departures: Sequence[Departure]) -> List[Tuple[object, List[Departure]]]:
+        scheme = partition_scheme(db_url)
+        if scheme is None:
+            return [(create_session_maker(db_url), list(departures))]
+        groups: Dict[str, List[Departure]] = {}
+        for d in departures:
+            ts = d.planned_departure_time if d.planned_departure_time is not None else d.fetched_at
+            part = partition_for(db_url, scheme, ts)
+            groups.setdefault(db_url if part is None else part.db_url, []).append(d)
+        out = []
+        for url, deps in groups.items():
+            init_db(url)
+            out.append((create_session_maker(url), deps))
+        return out
+
+    return route
+
+
+def apply_retention(
+    db_url: str, keep: int, archive_dir: Optional[Path] = None, now: Optional[float] = None
+) -> RetentionResult:
+    """Drop partitions older than the newest ``keep`` periods (the current one included).
+
+    Each partition is a file, so dropping is an unlink (or a move into ``archive_dir``)
+    regardless of its size. Refresh the rollups first so the dropped hours keep their
+    aggregates; they are frozen (rollup.mark_pruned), so a rebuild keeps them too. Archived files
+    can still be read with any SQLite client.
+    """
+    from .rollup import mark_pruned  # rollup imports this module
+    if keep < 1:
+        raise ValueError("keep must be >= 1")
+    scheme = partition_scheme(db_url)
+    if scheme is None:
+        raise ValueError(f"{db_url} is not partitioned")
+    today = datetime.fromtimestamp(time.time() if now is None else now, tz=SERVICE_TZ).date()
+    cutoff = _period_start(scheme.period, today)
+    for _ in range(keep - 1):
+        cutoff = _previous_start(scheme.period, cutoff)
+
+    result = RetentionResult([], [])
+    expired = [p for p in list_partitions(db_url, scheme) if p.hi <= date_start(cutoff)]
+    if expired:
+        with create_session_maker(db_url)() as session:
+            mark_pruned(session, expired[-1].hi)
+            session.commit()
+    for part in expired:
+        dispose_engines(part.db_url)
+        path = _db_path(part.db_url)
+        for f in (path, path.with_name(path.name + "-wal"), path.with_name(path.name + "-shm")):
+            if not f.exists():
+                continue
+            if archive_dir is not None:
+                Path(archive_dir).mkdir(parents=True, exist_ok=True)
+                shutil.move(str(f), str(Path(archive_dir) / f.name))
+            else:
+                f.unlink()
+        (result.archived if archive_dir is not None else result.dropped).append(part.name)
+    return result
@@ -1,13 +1,29 @@
 from __future__ import annotations
 
+import heapq
 import signal
 import time
 from dataclasses import dataclass
-from typing import Optional, Set
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, TextIO, Tuple
 
+from .defaults import (
+    DEFAULT_BUDGET_PER_MINUTE,
+    DEFAULT_MAX_INTERVAL_SECONDS,
+    DEFAULT_METRICS_HOST,
+    DEFAULT_MIN_INTERVAL_SECONDS,
+)
 from .config import load_settings
-from .ingest import ingest_departures_for_products
-from .stations import DEFAULT_CACHE
+from .fetchers import DEFAULT_QUEUE_DEPTH, FetchResult
+from .ingest import ingest_station_ids, normalize_labels, sync_stations_to_db
+from .label_index import LabelIndex
+from .metrics import CycleStats, PollerMetrics, serve_metrics
+from .models import Departure
+from .stations import DEFAULT_CACHE, StationRegistry
+from .writer import DEFAULT_BATCH_SIZE
+
+# Re-poll this long before the earliest upcoming departure leaves
+DEPARTURE_LEAD_SECONDS = 60
 
 
 @dataclass
@@ -18,12 +34,130 @@ class PollerConfig:
     cache_path: str
 
 
+class StationScheduler:
+    """Priority queue of stations keyed by next-due time.
+
+    After each fetch a station is rescheduled just before the earliest upcoming departure in the
+    returned window (minus ``lead_seconds``), clamped to [min_interval, max_interval]. Stations
+    with nothing upcoming wait ``max_interval``; failed fetches are retried after ``min_interval``.
+    """
+
+    def __init__(
+        self,
+        station_ids: Iterable[str],
+        min_interval: float = DEFAULT_MIN_INTERVAL_SECONDS,
+        max_interval: float = DEFAULT_MAX_INTERVAL_SECONDS,
+        lead_seconds: float = DEPARTURE_LEAD_SECONDS,
+        now: Optional[float] = None,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max(min_interval, max_interval)
+        self.lead_seconds = lead_seconds
+        start = time.time() if now is None else now
+        self._active: Set[str] = set(station_ids)
+        self._heap: List[Tuple[float, str]] = [(start, sid) for sid in sorted(self._active)]
+        heapq.heapify(self._heap)
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def set_stations(self, station_ids: Iterable[str], now: float) -> None:
+        """Replace the station set: new stations are due immediately, removed ones are dropped."""
+        new_ids = set(station_ids)
+        for sid in sorted(new_ids - self._active):
+            heapq.heappush(self._heap, (now, sid))
+        self._active = new_ids
+        self._heap = [(t, sid) for t, sid in self._heap if sid in new_ids]
+        heapq.heapify(self._heap)
+
+    def next_due(self) -> Optional[float]:
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now: float, limit: int) -> List[str]:
+        """Pop up to ``limit`` stations due at ``now``, most overdue first."""
+        out: List[str] = []
+        while self._heap and len(out) < limit and self._heap[0][0] <= now:
+            out.append(heapq.heappop(self._heap)[1])
+        return out
+
+    def next_poll_time(self, departures: Optional[List[Departure]], now: float) -> float:
+        if departures is None:
+            return now + self.min_interval
+        upcoming = [
+            t
+            for t in (d.realtime_departure_time or d.planned_departure_time for d in departures)
+            if t is not None and t > now
+        ]
+        if not upcoming:
+            return now + self.max_interval
+        due = min(upcoming) - self.lead_seconds
+        return min(max(due, now + self.min_interval), now + self.max_interval)
+
+    def reschedule(self, station_id: str, departures: Optional[List[Departure]], now: float) -> None:
+        """Requeue a station; ``departures`` is None when the fetch failed."""
+        if station_id not in self._active:
+            return  # removed from the scope while in flight
+        heapq.heappush(self._heap, (self.next_poll_time(departures, now), station_id))
+
+
+class RequestBudget:
+    """Global token bucket of station requests per minute."""
+
+    def __init__(self, per_minute: int, now: Optional[float] = None):
+        self.per_minute = max(1, per_minute)
+        self._tokens = float(self.per_minute)
+        self._updated_at = time.time() if now is None else now
+
+    def available(self, now: float) -> int:
+        self._tokens = min(
+            float(self.per_minute), self._tokens + (now - self._updated_at) * self.per_minute / 60.0
+        )
+        self._updated_at = now
+        return int(self._tokens)
+
+    def consume(self, n: int) -> None:
+        self._tokens -= n
+
+    def seconds_until(self, n: int) -> float:
+        missing = n - self._tokens
+        return max(0.0, missing * 60.0 / self.per_minute)
+
+
 def run_poller(
     db_url: str,
     polling_interval_seconds: int,
     products: Set[str],
     cache_path: str = str(DEFAULT_CACHE),
+    labels: Optional[Set[str]] = None,
+    station_names: Optional[Set[str]] = None,
+    station_ids: Optional[Set[str]] = None,
+    max_workers: int = 8,
+    mode: str = "first",
+    record_history: bool = False,
+    engine: str = "threads",
+    queue_depth: int = DEFAULT_QUEUE_DEPTH,
+    batch_size: int = DEFAULT_BATCH_SIZE,
+    adaptive: bool = False,
+    min_interval: int = DEFAULT_MIN_INTERVAL_SECONDS,
+    max_interval: int = DEFAULT_MAX_INTERVAL_SECONDS,
+    budget_per_minute: int = DEFAULT_BUDGET_PER_MINUTE,
+    label_index_path: Optional[Path] = None,
+    metrics_port: Optional[int] = None,
+    metrics_host: str = DEFAULT_METRICS_HOST,
+    metrics_log: Optional[Path] = None,
 ):
+    """Poll until SIGINT/SIGTERM.
+
+    The scope (products, labels, station names/ids) is resolved to a station list at startup and
+    again only when the stations cache or, with ``label_index_path``, the label index (which then
+    expands ``labels`` to station ids) is rebuilt. By default every selected station is ingested
+    each ``polling_interval_seconds``. With ``adaptive`` each station is polled on its own
+    schedule (see StationScheduler) subject to a global ``budget_per_minute`` of station requests.
+
+    Every cycle is timed per stage and its request outcomes counted (see metrics.CycleStats). With
+    ``metrics_port`` the cumulative metrics are served at ``http://metrics_host:port/metrics`` in
+    the Prometheus text format; with ``metrics_log`` each cycle is appended as a JSON line.
+    """
     stop_flag = {"stop": False}
 
     def _handle_sig(signum, frame):
@@ -33,21 +167,82 @@ def run_poller(
     signal.signal(signal.SIGINT, _handle_sig)
     signal.signal(signal.SIGTERM, _handle_sig)
 
+    norm_labels = normalize_labels(labels)
+    label_index = LabelIndex(label_index_path) if label_index_path and labels else None
+    scope = PollScope(db_url, cache_path, products, station_names, station_ids, label_index, labels)
+    scope.refresh()
+    print(f"Polling {len(scope.station_ids)} stations")
+    metrics = PollerMetrics()
+    metrics.set_scope(len(scope.station_ids))
+    server = serve_metrics(metrics, metrics_port, metrics_host) if metrics_port is not None else None
+    if server is not None:
+        print(f"Serving metrics at http://{metrics_host}:{server.server_address[1]}/metrics")
+    log = open(metrics_log, "a", encoding="utf-8") if metrics_log else None
+    ingest_kwargs = dict(
+        labels=norm_labels,
+        max_workers=max_workers,
+        mode=mode,
+        record_history=record_history,
+        engine=engine,
+        queue_depth=queue_depth,
+        batch_size=batch_size,
+    )
+
+    try:
+        if adaptive:
+            _run_adaptive(
+                stop_flag,
+                db_url,
+                scope,
+                metrics,
+                log,
+                min_interval=min_interval,
+                max_interval=max_interval,
+                budget_per_minute=budget_per_minute,
+                **ingest_kwargs,
+            )
+        else:
+            _run_fixed(stop_flag, db_url, polling_interval_seconds, scope, metrics, log, **ingest_kwargs)
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        if log is not None:
+            log.close()
+
+
+def _run_fixed(
+    stop_flag: Dict[str, bool],
+    db_url: str,
+    polling_interval_seconds: int,
+    scope: PollScope,
+    metrics: PollerMetrics,
+    log: Optional[TextIO],
+    **ingest_kwargs,
+) -> None:
     backoff = 1
     while not stop_flag["stop"]:
         t0 = time.time()
+        stats = CycleStats(t0)
         try:
-            stations_processed, rows_inserted, rows_skipped = ingest_departures_for_products(
-                db_url=db_url, cache_path=cache_path, products=products
-            )
+            if scope.refresh(stats):
+                metrics.set_scope(len(scope.station_ids))
+                print(f"Poll scope changed: polling {len(scope.station_ids)} stations")
+            with stats.stage("ingest"):
+                result = ingest_station_ids(db_url, scope.station_ids, stats=stats, **ingest_kwargs)
+            stats.finish(result)
             print(
-                f"Ingest ok: stations={stations_processed}, inserted={rows_inserted}, skipped={rows_skipped}"
+                f"Ingest ok: stations={result.stations_processed}, inserted={result.rows_inserted}, "
+                f"updated={result.rows_updated}, skipped={result.rows_skipped}, "
+                f"errors={len(stats.station_errors)}, seconds={stats.seconds:.1f}"
             )
             backoff = 1  # reset on success
         except Exception as e:
+            stats.finish(error=e)
             print(f"Error during ingest: {e}")
             time.sleep(backoff)
             backoff = min(backoff * 2, 60)
+        metrics.record_cycle(stats, log)
 
         elapsed = time.time() - t0
         sleep_time = max(0.0, polling_interval_seconds - elapsed)
@@ -55,3 +250,117 @@ def run_poller(
         if stop_flag["stop"]:
             break
         time.sleep(sleep_time)
+
+
+class PollScope:
+    """Poll scope resolved against a warm station registry.
+
+    The stations cache is re-read, re-synced to the DB (one bulk upsert) and re-filtered only when
+    the file changed on disk; a mapped label index is re-resolved only when it was rebuilt with
+    different content. Otherwise ``refresh`` is one stat call per file.
+    """
+
+    def __init__(
+        self,
+        db_url: str,
+        cache_path: str,
+        products: Set[str],
+        station_names: Optional[Set[str]] = None,
+        station_ids: Optional[Set[str]] = None,
+        label_index: Optional[LabelIndex] = None,
+        labels: Optional[Set[str]] = None,
+    ):
+        self.db_url = db_url
+        self.products = products
+        self.station_names = station_names
+        self.requested_ids = station_ids
+        self.label_index = label_index
+        self.index_labels = {lab.upper() for lab in labels or ()}
+        self.registry = StationRegistry(Path(cache_path))
+        self.station_ids: List[str] = []
+
+    def _requested_ids(self) -> Optional[Set[str]]:
+        if self.label_index is None:
+            return self.requested_ids
+        resolved = self.label_index.stations_for(self.products or {"ALL"}, self.index_labels)
+        return resolved | (self.requested_ids or set())
+
+    def refresh(self, stats: Optional[CycleStats] = None) -> bool:
+        """Pick up a changed stations cache or label index. Returns True if the list was rebuilt.
+
+        ``stats`` times the ``cache`` and ``sync`` stages.
+        """
+        stats = stats if stats is not None else CycleStats()
+        with stats.stage("cache"):
+            stations_changed = self.registry.refresh()
+            index_changed = self.label_index is not None and self.label_index.reload_if_changed()
+        if not (stations_changed or index_changed):
+            return False
+        table = self.registry.table
+        if stations_changed:
+            with stats.stage("sync"):
+                sync_stations_to_db(self.db_url, table)
+        with stats.stage("cache"):
+            rows = table.select(self.products, self.station_names, self._requested_ids())
+            self.station_ids = [table.ids[i] for i in rows]
+        return True
+
+
+def _run_adaptive(
+    stop_flag: Dict[str, bool],
+    db_url: str,
+    scope: PollScope,
+    metrics: PollerMetrics,
+    log: Optional[TextIO],
+    min_interval: int,
+    max_interval: int,
+    budget_per_minute: int,
+    **ingest_kwargs,
+) -> None:
+    scheduler = StationScheduler(scope.station_ids, min_interval, max_interval)
+    budget = RequestBudget(budget_per_minute)
+
+    while not stop_flag["stop"]:
+        now = time.time()
+        stats = CycleStats(now)
+        if scope.refresh(stats):
+            scheduler.set_stations(scope.station_ids, now)
+            metrics.set_scope(len(scope.station_ids))
+            print(f"Poll scope changed: polling {len(scope.station_ids)} stations")
+        due = scheduler.pop_due(now, budget.available(now))
+        if due:
+            budget.consume(len(due))
+            pending = set(due)
+
+            def _on_result(res: FetchResult) -> None:
+                pending.discard(res.station_id)
+                deps = None if res.error is not None else res.departures
+                scheduler.reschedule(res.station_id, deps, time.time())
+
+            try:
+                with stats.stage("ingest"):
+                    result = ingest_station_ids(db_url, due, on_result=_on_result, stats=stats, **ingest_kwargs)
+                stats.finish(result)
+                print(
+                    f"Ingest ok: stations={result.stations_processed}/{len(due)}, "
+                    f"inserted={result.rows_inserted}, updated={result.rows_updated}, "
+                    f"skipped={result.rows_skipped}, errors={len(stats.station_errors)}, "
+                    f"scheduled={len(scheduler) + len(pending)}"
+                )
+            except Exception as e:
+                stats.finish(error=e)
+                print(f"Error during ingest: {e}")
+            finally:
+                # Stations whose results never arrived (e.g. writer failure) retry soon
+                for sid in pending:
+                    scheduler.reschedule(sid, None, time.time())
+            metrics.record_cycle(stats, log)
+            continue
+
+        # Sleep until the next station is due (or budget refills), in short steps to stay responsive
+        now = time.time()
+        next_due = scheduler.next_due()
+        wait = max_interval if next_due is None else max(0.0, next_due - now)
+        if next_due is not None and next_due <= now:
+            wait = budget.seconds_until(1)
+        time.sleep(min(max(wait, 0.05), 1.0))
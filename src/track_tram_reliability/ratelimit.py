@@ -0,0 +1,175 @@
+from __future__ import annotations
+
+import asyncio
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlsplit
+
+# Status codes signalling the server wants us to slow down
+THROTTLE_STATUSES = (429, 503)
+
+
+class AdaptiveRateLimiter:
+    """Token bucket with an AIMD-controlled rate and concurrency limit for one host.
+
+    Requests take a token and an in-flight slot. Throttling responses (429/503), transport errors
+    and Retry-After halve the rate and concurrency (at most once per ``decrease_cooldown``) and
+    may pause the host entirely; clean, fast responses raise both additively.
+
+    Thread-safe; ``acquire`` serves threads, ``acquire_async`` serves asyncio tasks.
+    """
+
+    def __init__(
+        self,
+        rate: float = 10.0,
+        min_rate: float = 0.5,
+        max_rate: float = 50.0,
+        burst: float = 10.0,
+        concurrency: float = 16.0,
+        min_concurrency: float = 1.0,
+        max_concurrency: float = 64.0,
+        latency_target: float = 2.0,
+        decrease_factor: float = 0.5,
+        decrease_cooldown: float = 1.0,
+    ):
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.concurrency = concurrency
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown
+
+        self.in_flight = 0
+        self.throttled = 0
+        self.latency_ewma: Optional[float] = None
+        self._tokens = burst
+        self._refilled_at = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = float("-inf")
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def try_acquire(self) -> float:
+        """Take a token and slot if available; otherwise return seconds to wait before retrying."""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            self._refill(now)
+            if self.in_flight >= int(self.concurrency):
+                return 0.01
+            if self._tokens < 1.0:
+                return (1.0 - self._tokens) / self.rate
+            self._tokens -= 1.0
+            self.in_flight += 1
+            return 0.0
+
+    def acquire(self) -> None:
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self) -> None:
+        while True:
+            wait = self.try_acquire()
+            if wait <= 0:
+                return
+            await asyncio.sleep(wait)
+
+    def release(
+        self,
+        status: Optional[int],
+        latency: Optional[float] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Return the in-flight slot and feed the outcome (status None = transport error)."""
+        with self._lock:
+            self.in_flight = max(0, self.in_flight - 1)
+        self.observe(status, latency, retry_after)
+
+    def observe(
+        self,
+        status: Optional[int],
+        latency: Optional[float] = None,
+        retry_after: Optional[float] = None,
+    ) -> None:
+        """Feed a response outcome without touching the in-flight count."""
+        with self._lock:
+            now = time.monotonic()
+            if latency is not None:
+                self.latency_ewma = (
+                    latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+                )
+            if retry_after:
+                self._blocked_until = max(self._blocked_until, now + retry_after)
+            if status is None or status in THROTTLE_STATUSES:
+                if status is not None:
+                    self.throttled += 1
+                if now - self._last_decrease >= self.decrease_cooldown:
+                    self._last_decrease = now
+                    self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                    self.concurrency = max(
+                        self.min_concurrency, self.concurrency * self.decrease_factor
+                    )
+                    self._tokens = min(self._tokens, 1.0)
+                return
+            if status >= 500:
+                return
+            if self.latency_ewma is not None and self.latency_ewma > self.latency_target:
+                return
+            # Additive increase: roughly +1 req/s per second and +1 slot per window of successes
+            self.rate = min(self.max_rate, self.rate + 1.0 / max(self.rate, 1.0))
+            self.concurrency = min(
+                self.max_concurrency, self.concurrency + 1.0 / max(self.concurrency, 1.0)
+            )
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "rate": round(self.rate, 3),
+                "concurrency": int(self.concurrency),
+                "in_flight": self.in_flight,
+                "throttled": self.throttled,
+                "latency_ewma": self.latency_ewma,
+            }
+
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(host: str) -> AdaptiveRateLimiter:
+    """Return the process-wide limiter for ``host`` (created on first use)."""
+    with _limiters_lock:
+        limiter = _limiters.get(host)
+        if limiter is None:
+            limiter = _limiters[host] = AdaptiveRateLimiter()
+        return limiter
+
+
+def limiter_for_url(url: str) -> AdaptiveRateLimiter:
+    return get_limiter((urlsplit(url).hostname or "").lower())
+
+
+def configure_limiter(host: str, **kwargs) -> AdaptiveRateLimiter:
+    """Replace the limiter for ``host`` with one built from ``kwargs``."""
+    with _limiters_lock:
+        limiter = _limiters[host] = AdaptiveRateLimiter(**kwargs)
+        return limiter
+
+
+def limiter_snapshots() -> Dict[str, dict]:
+    """``snapshot()`` of every host limiter created so far, keyed by host."""
+    with _limiters_lock:
+        limiters = dict(_limiters)
+    return {host: limiter.snapshot() for host, limiter in limiters.items()}
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+import json
+import math
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import Integer, and_, delete, func, insert, literal_column, or_, select
+
+from .db import (
+    DepartureOrm,
+    DepartureRawOrm,
+    RollupLineHourlyOrm,
+    RollupStateOrm,
+    RollupStationHourlyOrm,
+    create_session_maker,
+    init_db,
+)
+from .dims import load_dimension
+from .partitions import source_sessions
+
+HOUR = 3600
+ROLLUP_NAME = "hourly"
+# Hours before this bound lost departures (ttr export --prune, ttr retention): their rollups are
+# the only record left and are never recomputed, not even by a rebuild
+PRUNED_STATE = f"{ROLLUP_NAME}:pruned_until"
+# Hours recomputed per raw scan (one range query each)
+RANGE_HOURS = 24
+# Updated rows are found by fetched_at; rows fetched up to this long before the watermark are
+# looked at again, so an update committed late (a slow batch, a `ttr ingest` next to the poller)
+# is still rolled up. New rows are found by id and need no lag.
+WATERMARK_LAG_SECONDS = 900
+
+R = DepartureRawOrm
+# Rollups are computed from the compact table and translated through the dimensions
+D = DepartureOrm
+
+_HOUR_SQL = literal_column(str(HOUR), Integer)  # inlined so SELECT and GROUP BY render identically
+
+
+def hour_col(src=R):
+    """Bucket hour of a row of ``src`` (departures_raw view or departures table).
+
+    Rows are bucketed by planned departure time, which never changes for a departure, so
+    latest-observation updates only ever touch the hour a departure already belongs to.
+    Rows without a planned time fall back to their fetch time.
+    """
+    return (func.coalesce(src.planned_departure_time, src.fetched_at) // _HOUR_SQL) * _HOUR_SQL
+
+
+_LINE_KEYS = (D.line_id, D.destination_id)
+_STATION_KEYS = (D.station_id,)
+
+
+def encode_hist(hist: Dict[int, int]) -> str:
+    return json.dumps({str(k): v for k, v in sorted(hist.items())}, separators=(",", ":"))
+
+
+def decode_hist(text: Optional[str]) -> Dict[int, int]:
+    return {int(k): v for k, v in json.loads(text).items()} if text else {}
+
+
+def merge_hist(into: Dict[int, int], other: Dict[int, int]) -> Dict[int, int]:
+    """Add ``other`` into ``into`` (histograms are mergeable by summing counts)."""
+    for delay, n in other.items():
+        into[delay] = into.get(delay, 0) + n
+    return into
+
+
+def hist_quantile(hist: Dict[int, int], q: float) -> Optional[float]:
+    """Nearest-rank quantile (``q`` in 0..100) of a delay histogram; None if empty."""
+    total = sum(hist.values())
+    if not total:
+        return None
+    rank = max(1, math.ceil(q / 100.0 * total))
+    seen = 0
+    for delay in sorted(hist):
+        seen += hist[delay]
+        if seen >= rank:
+            return float(delay)
+    return float(max(hist))
+
+
+def in_time_range(lo: Optional[int], hi: Optional[int], src=R):
+    """Sargable predicate for rows whose bucket time lies in [lo, hi) (None = unbounded)."""
+    planned = [src.planned_departure_time.is_not(None)]
+    fetched = [src.planned_departure_time.is_(None)]
+    if lo is not None:
+        planned.append(src.planned_departure_time >= lo)
+        fetched.append(src.fetched_at >= lo)
+    if hi is not None:
+        planned.append(src.planned_departure_time < hi)
+        fetched.append(src.fetched_at < hi)
+    return or_(and_(*planned), and_(*fetched))
+
+
+def _hour_ranges(hours: Iterable[int], max_hours: int = RANGE_HOURS) -> List[Tuple[int, int]]:
+    """Group hour starts into [lo, hi) ranges of consecutive hours."""
+    ranges: List[Tuple[int, int]] = []
+    for h in sorted(set(hours)):
+        if ranges and ranges[-1][1] == h and (h - ranges[-1][0]) < max_hours * HOUR:
+            ranges[-1] = (ranges[-1][0], h + HOUR)
+        else:
+            ranges.append((h, h + HOUR))
+    return ranges
+
+
+def hourly_rows(session, src, keys: Sequence, *criteria) -> List[dict]:
+    """Aggregate rows of ``src`` matching ``criteria`` into one dict per (hour_start, *keys).
+
+    ``delay_hist`` is returned as a dict; callers storing it encode it with ``encode_hist``.
+    """
+    hour = hour_col(src)
+    stmt = (
+        select(hour, *keys, src.delay_in_minutes, src.cancelled, func.count())
+        .where(*criteria)
+        .group_by(hour, *keys, src.delay_in_minutes, src.cancelled)
+    )
+    names = [k.key for k in keys]
+    acc: Dict[tuple, dict] = {}
+    for hour, *rest in session.execute(stmt):
+        *key_vals, delay, cancelled, n = rest
+        k = (hour, *key_vals)
+        row = acc.get(k)
+        if row is None:
+            row = acc[k] = dict(
+                hour_start=hour,
+                **dict(zip(names, key_vals)),
+                count_total=0,
+                count_cancelled=0,
+                delay_sum=0,
+                delay_count=0,
+                delay_hist={},
+            )
+        row["count_total"] += n
+        if cancelled:
+            row["count_cancelled"] += n
+        if delay is not None:
+            row["delay_sum"] += delay * n
+            row["delay_count"] += n
+            row["delay_hist"][delay] = row["delay_hist"].get(delay, 0) + n
+    return list(acc.values())
+
+
+def _line_keys_to_names(rows: List[dict], lines: Dict[int, tuple], destinations: Dict[int, tuple]):
+    for row in rows:
+        row["transport_type"], row["label"] = lines[row.pop("line_id")]
+        (row["destination"],) = destinations[row.pop("destination_id")]
+
+
+def _recompute(session, src, lo: int, hi: int, dims: Tuple[dict, dict]) -> None:
+    """Replace the rollups of [lo, hi) in ``session`` with aggregates of ``src``'s departures."""
+    for orm, keys in ((RollupLineHourlyOrm, _LINE_KEYS), (RollupStationHourlyOrm, _STATION_KEYS)):
+        session.execute(delete(orm).where(orm.hour_start >= lo, orm.hour_start < hi))
+        rows = hourly_rows(src, D, keys, in_time_range(lo, hi, D))
+        if orm is RollupLineHourlyOrm:
+            _line_keys_to_names(rows, *dims)
+        for row in rows:
+            row["delay_hist"] = encode_hist(row["delay_hist"])
+        if rows:
+            session.execute(insert(orm.__table__), rows)  # Core executemany, no ORM bookkeeping
+
+
+def _id_state_name(url: str) -> str:
+    # Ids are per file when partitioned; the file name identifies the source
+    return f"{ROLLUP_NAME}:last_id:{url.rsplit('/', 1)[-1]}"
+
+
+def _state(session, name: str) -> RollupStateOrm:
+    state = session.get(RollupStateOrm, name)
+    if state is None:
+        state = RollupStateOrm(name=name, watermark=None)
+        session.add(state)
+    return state
+
+
+def mark_pruned(session, until: int) -> None:
+    """Freeze the rollups of hours before ``until`` before their departures go (caller commits)."""
+    state = _state(session, PRUNED_STATE)
+    state.watermark = until if state.watermark is None else max(state.watermark, until)
+
+
+def rolled_up_id(session, url: str) -> Optional[int]:
+    """Largest departures id of source ``url`` covered by the rollups (None: nothing yet)."""
+    state = session.get(RollupStateOrm, _id_state_name(url))
+    return None if state is None else state.watermark
+
+
+def refresh_rollups(db_url: str, rebuild: bool = False) -> int:
+    """Bring the hourly rollup tables up to date with the stored departures.
+
+    Only hours touched by new or updated rows are recomputed. New rows are those above the
+    largest id already rolled up (kept per source file), so a row committed after a refresh is
+    found whatever its fetched_at. Updated rows (latest-observation mode) are those fetched at or
+    after the fetched_at watermark minus WATERMARK_LAG_SECONDS (both indexed range scans). With
+    partitioning every partition file is scanned the same way (each hour lives in one file).
+
+    ``rebuild`` recomputes every hour from the stored departures, except hours before the pruned
+    bound (see mark_pruned), whose departures are gone.
+
+    Returns:
+        Number of hours recomputed.
+    """
+    init_db(db_url)
+    Session = create_session_maker(db_url)
+    with Session() as session:
+        state = _state(session, ROLLUP_NAME)
+        pruned = session.get(RollupStateOrm, PRUNED_STATE)
+        frozen = None if pruned is None else pruned.watermark
+        if rebuild:
+            for orm in (RollupLineHourlyOrm, RollupStationHourlyOrm):
+                stmt = delete(orm)
+                if frozen is not None:
+                    stmt = stmt.where(orm.hour_start >= frozen)
+                session.execute(stmt)
+        new_wm = state.watermark
+        recomputed = 0
+        for url, src in source_sessions(db_url, session, frozen):
+            id_state = _state(session, _id_state_name(url))
+            max_id, max_fetched = src.execute(select(func.max(D.id), func.max(D.fetched_at))).one()
+            if max_id is None:
+                continue
+            hours_stmt = select(hour_col(D)).distinct().where(D.id <= max_id)
+            if frozen is not None:
+                hours_stmt = hours_stmt.where(in_time_range(frozen, None, D))
+            if not rebuild and state.watermark is not None:
+                changed = D.fetched_at >= state.watermark - WATERMARK_LAG_SECONDS
+                if id_state.watermark is not None:
+                    changed = or_(D.id > id_state.watermark, changed)
+                hours_stmt = hours_stmt.where(changed)
+            hours = [h for (h,) in src.execute(hours_stmt)]
+            if hours:
+                # Dimension tables are small: translate ids in Python instead of joining per scan
+                dims = (load_dimension(src, "lines"), load_dimension(src, "destinations"))
+                for lo, hi in _hour_ranges(hours):
+                    _recompute(session, src, lo, hi, dims)
+                recomputed += len(hours)
+            id_state.watermark = max_id
+            new_wm = max_fetched if new_wm is None else max(new_wm, max_fetched)
+        state.watermark = new_wm
+        session.commit()
+    return recomputed
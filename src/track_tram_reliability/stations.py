@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import hashlib
 import json
 from pathlib import Path
-from typing import Iterable, List
+from typing import Dict, Iterable, List, Optional, Set, Tuple
 
+from .defaults import DEFAULT_CACHE
 from .http import create_session
 from .models import Station
 
@@ -33,20 +35,184 @@ def fetch_stations() -> List[Station]:
     return stations
 
 
+# Station fields stored as columns in the compact cache (products additionally as bitmasks)
+FIELDS = ("id", "name", "place", "latitude", "longitude", "diva_id", "tariff_zones", "products")
+TABLE_VERSION = 1
+
+
+class StationTable:
+    """Column-oriented stations with product bitmasks, queried without building models.
+
+    Bit ``i`` of a station's mask is set if it serves ``products[i]`` (upper-case), so a
+    product filter is one AND per station. ``Station`` models are built only on request.
+    """
+
+    def __init__(self, columns: Dict[str, list], products: List[str], masks: List[int]):
+        self.columns = columns
+        self.products = products
+        self.masks = masks
+        self._row_of: Optional[Dict[str, int]] = None
+
+    @classmethod
+    def from_records(cls, items: Iterable[dict]) -> "StationTable":
+        items = list(items)
+        columns = {f: [item.get(f) for item in items] for f in FIELDS}
+        bits: Dict[str, int] = {}
+        masks = []
+        for prods in columns["products"]:
+            mask = 0
+            for p in prods or ():
+                mask |= 1 << bits.setdefault(p.upper(), len(bits))
+            masks.append(mask)
+        return cls(columns, sorted(bits, key=bits.get), masks)
+
+    @classmethod
+    def from_stations(cls, stations: Iterable[Station]) -> "StationTable":
+        return cls.from_records(s.model_dump() for s in stations)
+
+    def __len__(self) -> int:
+        return len(self.masks)
+
+    @property
+    def ids(self) -> List[str]:
+        return self.columns["id"]
+
+    def row_of(self, station_id: str) -> Optional[int]:
+        if self._row_of is None:
+            self._row_of = {sid: i for i, sid in enumerate(self.columns["id"])}
+        return self._row_of.get(station_id)
+
+    def product_mask(self, products: Iterable[str]) -> int:
+        wanted = {p.upper() for p in products}
+        return sum(1 << i for i, p in enumerate(self.products) if p in wanted)
+
+    def select(
+        self,
+        products: Optional[Set[str]] = None,
+        station_names: Optional[Set[str]] = None,
+        station_ids: Optional[Set[str]] = None,
+    ) -> List[int]:
+        """Rows passing the filters of ingest.select_stations, in table order."""
+        rows: Iterable[int] = range(len(self))
+        if products and "ALL" not in products:
+            mask = self.product_mask(products)
+            masks = self.masks
+            rows = [i for i in rows if masks[i] & mask]
+        if station_names:
+            name_set = {str(x).strip().lower() for x in station_names}
+            names = self.columns["name"]
+            rows = [i for i in rows if names[i] is not None and str(names[i]).strip().lower() in name_set]
+        if station_ids is not None:
+            id_set = {x.strip() for x in station_ids}
+            ids = self.columns["id"]
+            rows = [i for i in rows if ids[i] in id_set]
+        return list(rows)
+
+    def station(self, row: int) -> Station:
+        # Values come from a validated cache, so the model is not validated again
+        return Station.model_construct(**{f: self.columns[f][row] for f in FIELDS})
+
+    def stations(self, rows: Optional[Iterable[int]] = None) -> List[Station]:
+        return [self.station(i) for i in (range(len(self)) if rows is None else rows)]
+
+    def db_rows(self) -> List[dict]:
+        """Rows for the stations table (see writer.bulk_upsert_stations)."""
+        cols = [self.columns[f] for f in FIELDS]
+        return [dict(zip(("station_id", *FIELDS[1:]), values)) for values in zip(*cols)]
+
+    def to_json(self, source: Optional[List[int]] = None) -> str:
+        return json.dumps(
+            {
+                "version": TABLE_VERSION,
+                "source": source,
+                "products": self.products,
+                "masks": self.masks,
+                "columns": self.columns,
+            },
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+
+
+def table_path(cache_path: Path) -> Path:
+    """Compact cache written next to the JSON cache, e.g. data/stations.table.json."""
+    return cache_path.with_name(f"{cache_path.stem}.table{cache_path.suffix}")
+
+
+def _stat_key(path: Path) -> List[int]:
+    st = path.stat()
+    return [st.st_mtime_ns, st.st_size]
+
+
 def write_cache(stations: Iterable[Station], cache_path: Path) -> None:
     cache_path.parent.mkdir(parents=True, exist_ok=True)
+    stations = list(stations)
     with cache_path.open("w", encoding="utf-8") as f:
         json.dump([s.model_dump() for s in stations], f, ensure_ascii=False, indent=2)
+    table = StationTable.from_stations(stations)
+    table_path(cache_path).write_text(table.to_json(_stat_key(cache_path)), encoding="utf-8")
 
 
-def read_cache(cache_path: Path) -> List[Station]:
+def load_station_table(cache_path: Path) -> StationTable:
+    """Load the compact cache if it was written for the current JSON cache, else the JSON."""
+    cache_path = Path(cache_path)
+    compact = table_path(cache_path)
+    if compact.exists():
+        obj = json.loads(compact.read_text(encoding="utf-8"))
+        if obj.get("version") == TABLE_VERSION and obj.get("source") == _stat_key(cache_path):
+            return StationTable(obj["columns"], obj["products"], obj["masks"])
+    # Missing or stale (e.g. the JSON was edited or copied): validate as before
     with cache_path.open("r", encoding="utf-8") as f:
-        raw = json.load(f)
-        return [Station(**item) for item in raw]
+        return StationTable.from_stations(Station(**item) for item in json.load(f))
+
+
+def read_cache(cache_path: Path) -> List[Station]:
+    return load_station_table(cache_path).stations()
+
+
+class StationRegistry:
+    """Warm in-memory copy of the stations cache that reloads only when the file changes.
+
+    ``refresh`` compares (mtime, size) first and the content hash second, so touching the file
+    without changing it does not count as a change. Stations are held as a StationTable;
+    ``stations`` and ``by_id`` build models on first use.
+    """
+
+    def __init__(self, cache_path: Path):
+        self.cache_path = Path(cache_path)
+        self.table = StationTable({f: [] for f in FIELDS}, [], [])
+        self.digest: Optional[str] = None
+        self._stat: Optional[Tuple[int, int]] = None
+        self._stations: Optional[List[Station]] = None
+        self._by_id: Optional[Dict[str, Station]] = None
+
+    def refresh(self) -> bool:
+        """Reload if the cache file changed since the last call. Returns True if contents changed."""
+        st = self.cache_path.stat()
+        sig = (st.st_mtime_ns, st.st_size)
+        if sig == self._stat:
+            return False
+        digest = hashlib.sha256(self.cache_path.read_bytes()).hexdigest()
+        self._stat = sig
+        if digest == self.digest:
+            return False
+        self.table = load_station_table(self.cache_path)
+        self._stations = None
+        self._by_id = None
+        self.digest = digest
+        return True
 
+    @property
+    def stations(self) -> List[Station]:
+        if self._stations is None:
+            self._stations = self.table.stations()
+        return self._stations
 
-# Default cache path at project root's data/ directory
-DEFAULT_CACHE = Path(__file__).resolve().parent.parent.parent / "data" / "stations.json"
+    @property
+    def by_id(self) -> Dict[str, Station]:
+        if self._by_id is None:
+            self._by_id = {s.id: s for s in self.stations}
+        return self._by_id
 
 
 def refresh_stations_cache(cache_path: Path | None = None) -> List[Station]:
@@ -0,0 +1,18 @@
+from __future__ import annotations
+
+from datetime import date, datetime
+from zoneinfo import ZoneInfo
+
+# Dates are service dates of the planned departure in local (Munich) time. Its UTC offset is
+# always a whole number of hours, so hourly rollups fold into local dates exactly.
+SERVICE_TZ = ZoneInfo("Europe/Berlin")
+
+
+def service_date(ts: int) -> str:
+    """Europe/Berlin date (YYYY-MM-DD) of an epoch timestamp."""
+    return datetime.fromtimestamp(ts, tz=SERVICE_TZ).strftime("%Y-%m-%d")
+
+
+def date_start(d: date) -> int:
+    """Epoch seconds of local midnight starting service date ``d``."""
+    return int(datetime(d.year, d.month, d.day, tzinfo=SERVICE_TZ).timestamp())
@@ -0,0 +1,356 @@
+from __future__ import annotations
+
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+from sqlalchemy import insert, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+
+from .defaults import DEFAULT_BATCH_SIZE
+from .db import DepartureObservationOrm, DepartureOrm, StationOrm, dialect_insert_for
+from .dims import COMPACT_COLUMNS, compact_rows
+from .models import Departure, Station
+from .stations import StationTable
+
+# Departure fields written (as wide rows, before interning into the dimensions)
+ROW_COLUMNS: Tuple[str, ...] = (
+    "station_id",
+    "transport_type",
+    "label",
+    "destination",
+    "planned_departure_time",
+    "realtime_departure_time",
+    "delay_in_minutes",
+    "cancelled",
+    "platform",
+    "realtime",
+    "fetched_at",
+)
+# Columns of the uq_departures_identity constraint on departures
+IDENTITY_COLUMNS: Tuple[str, ...] = (
+    "station_id",
+    "line_id",
+    "destination_id",
+    "planned_departure_time",
+)
+# Columns that change between observations of the same departure
+OBSERVATION_COLUMNS: Tuple[str, ...] = (
+    "realtime_departure_time",
+    "delay_in_minutes",
+    "cancelled",
+    "platform_id",
+    "realtime",
+    "fetched_at",
+)
+# Observation columns whose change is worth a history entry
+HISTORY_COLUMNS: Tuple[str, ...] = ("realtime_departure_time", "delay_in_minutes", "cancelled")
+
+UPSERT_CHUNK_SIZE = 500
+
+# Bound parameters allowed per statement (SQLite >= 3.32, PostgreSQL wire protocol)
+_MAX_PARAMS = {"sqlite": 32766, "postgresql": 65535}
+
+ON_CONFLICT_MODES = ("nothing", "update")
+
+
+@dataclass
+class UpsertCounts:
+    inserted: int = 0
+    updated: int = 0
+    skipped: int = 0
+
+    def __iadd__(self, other: "UpsertCounts") -> "UpsertCounts":
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.skipped += other.skipped
+        return self
+
+
+def departure_row(d: Departure) -> dict:
+    return {c: getattr(d, c) for c in ROW_COLUMNS}
+
+
+def _identity_key(row: dict) -> Optional[tuple]:
+    key = tuple(row[c] for c in IDENTITY_COLUMNS)
+    # NULLs (station or planned time) never conflict under the unique constraint
+    return None if any(v is None for v in key) else key
+
+
+def _dedupe(rows: Iterable[dict], on_conflict: str) -> Tuple[List[dict], int]:
+    """Collapse rows sharing an identity key within one batch.
+
+    "nothing" keeps the first observation (matching the database behaviour), "update" keeps the
+    most recently fetched one. Returns (rows, dropped_count).
+    """
+    keyed: Dict[tuple, dict] = {}
+    out: List[dict] = []
+    dropped = 0
+    for row in rows:
+        key = _identity_key(row)
+        if key is None:
+            out.append(row)
+            continue
+        prev = keyed.get(key)
+        if prev is None:
+            keyed[key] = row
+            continue
+        dropped += 1
+        if on_conflict == "update" and row["fetched_at"] >= prev["fetched_at"]:
+            keyed[key] = row
+    out.extend(keyed.values())
+    return out, dropped
+
+
+def _existing_states(session, chunk: Sequence[dict]) -> Dict[tuple, tuple]:
+    """Return identity key -> stored HISTORY_COLUMNS values for rows of the chunk already stored."""
+    keys = [k for k in (_identity_key(r) for r in chunk) if k is not None]
+    if not keys:
+        return {}
+    cols = [getattr(DepartureOrm, c) for c in IDENTITY_COLUMNS]
+    state = [getattr(DepartureOrm, c) for c in HISTORY_COLUMNS]
+    stmt = select(*cols, *state).where(tuple_(*cols).in_(keys))
+    n = len(IDENTITY_COLUMNS)
+    return {tuple(r[:n]): tuple(r[n:]) for r in session.execute(stmt)}
+
+
+def _history_entry(departure_id: int, row: dict) -> dict:
+    entry = {"departure_id": departure_id, "fetched_at": row["fetched_at"]}
+    entry.update((c, row[c]) for c in HISTORY_COLUMNS)
+    return entry
+
+
+def _write_history(session, dialect_insert, rows: List[dict]) -> None:
+    if not rows:
+        return
+    stmt = dialect_insert(DepartureObservationOrm.__table__).values(rows)
+    session.execute(stmt.on_conflict_do_nothing(index_elements=["departure_id", "fetched_at"]))
+
+
+def _upsert_chunk(
+    session, dialect_insert, chunk: List[dict], on_conflict: str, record_history: bool
+) -> UpsertCounts:
+    table = DepartureOrm.__table__
+    existing = _existing_states(session, chunk) if on_conflict == "update" else {}
+    stmt = dialect_insert(table).values(chunk)
+    if on_conflict == "update":
+        # Only a newer (or equally recent) observation may replace the stored one
+        stmt = stmt.on_conflict_do_update(
+            index_elements=list(IDENTITY_COLUMNS),
+            set_={c: stmt.excluded[c] for c in OBSERVATION_COLUMNS},
+            where=stmt.excluded.fetched_at >= table.c.fetched_at,
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(IDENTITY_COLUMNS))
+
+    if record_history:
+        key_cols = [table.c[c] for c in IDENTITY_COLUMNS]
+        written = session.execute(stmt.returning(table.c.id, *key_cols)).all()
+        affected = len(written)
+        by_key = {_identity_key(r): r for r in chunk}
+        history = []
+        for departure_id, *key in written:
+            row = by_key.get(tuple(key))
+            if row is None:
+                continue
+            state = tuple(row[c] for c in HISTORY_COLUMNS)
+            if existing.get(tuple(key)) == state:
+                continue  # unchanged observation, nothing new to record
+            history.append(_history_entry(departure_id, row))
+        _write_history(session, dialect_insert, history)
+    else:
+        affected = session.execute(stmt).rowcount
+
+    if on_conflict == "update":
+        inserted = sum(1 for r in chunk if _identity_key(r) not in existing)
+        return UpsertCounts(inserted, affected - inserted, len(chunk) - affected)
+    return UpsertCounts(affected, 0, len(chunk) - affected)
+
+
+def _upsert_rowwise(session, rows: List[dict], on_conflict: str, record_history: bool = False) -> UpsertCounts:
+    """Portable fallback for dialects without ON CONFLICT: one savepoint per row."""
+    table = DepartureOrm.__table__
+    counts = UpsertCounts()
+    history: List[dict] = []
+    for row in rows:
+        tracked = record_history and _identity_key(row) is not None
+        try:
+            with session.begin_nested():
+                res = session.execute(insert(table).values(**row))
+            counts.inserted += 1
+            if tracked:
+                history.append(_history_entry(res.inserted_primary_key[0], row))
+        except IntegrityError:
+            if on_conflict != "update":
+                counts.skipped += 1
+                continue
+            cond = [table.c[c] == row[c] for c in IDENTITY_COLUMNS]
+            cond.append(table.c.fetched_at <= row["fetched_at"])
+            prev = None
+            if tracked:
+                prev = session.execute(
+                    select(table.c.id, *(table.c[c] for c in HISTORY_COLUMNS)).where(*cond)
+                ).first()
+            res = session.execute(
+                update(table).where(*cond).values({c: row[c] for c in OBSERVATION_COLUMNS})
+            )
+            if not res.rowcount:
+                counts.skipped += 1
+                continue
+            counts.updated += 1
+            if prev is not None and tuple(prev[1:]) != tuple(row[c] for c in HISTORY_COLUMNS):
+                history.append(_history_entry(prev[0], row))
+    for entry in history:
+        try:
+            with session.begin_nested():
+                session.execute(insert(DepartureObservationOrm.__table__).values(**entry))
+        except IntegrityError:
+            pass  # observation already recorded
+    return counts
+
+
+def check_history_mode(on_conflict: str, record_history: bool) -> None:
+    """History tracks changed observations, which only the "update" mode writes."""
+    if record_history and on_conflict != "update":
+        raise ValueError("record_history needs on_conflict='update' (ingest mode 'latest')")
+
+
+def bulk_upsert_departures(
+    session,
+    departures: Iterable[Departure],
+    on_conflict: str = "nothing",
+    chunk_size: int = UPSERT_CHUNK_SIZE,
+    record_history: bool = False,
+) -> UpsertCounts:
+    """Write departures with multi-row INSERT ... ON CONFLICT statements.
+
+    Args:
+        session: Open SQLAlchemy session; the caller commits.
+        departures: Departures to write, typically one station batch or a whole poll cycle.
+        on_conflict: "nothing" keeps the stored row, "update" overwrites its observation columns
+            when the new observation was fetched no earlier than the stored one.
+        chunk_size: Maximum rows per statement (further capped by the dialect's parameter limit).
+        record_history: Also append new or changed observations to departure_observations.
+            Needs on_conflict "update": otherwise later observations are skipped and only the
+            first one would ever be recorded. Rows with NULL identity columns are never tracked.
+
+    Product/label, destination and platform strings are interned into the dimension tables
+    (cached in-process), and rows are stored in the compact departures table.
+
+    Returns:
+        Exact inserted/updated/skipped counts.
+    """
+    if on_conflict not in ON_CONFLICT_MODES:
+        raise ValueError(f"on_conflict must be one of {ON_CONFLICT_MODES}, got {on_conflict!r}")
+    check_history_mode(on_conflict, record_history)
+    wide = [departure_row(d) for d in departures]
+    if not wide:
+        return UpsertCounts()
+    rows, dropped = _dedupe(compact_rows(session, wide), on_conflict)
+    counts = UpsertCounts(skipped=dropped)
+
+    dialect_name = session.get_bind().dialect.name
+    dialect_insert = dialect_insert_for(dialect_name)
+    if dialect_insert is None:
+        counts += _upsert_rowwise(session, rows, on_conflict, record_history)
+        return counts
+
+    per_stmt = max(1, min(chunk_size, _MAX_PARAMS[dialect_name] // len(COMPACT_COLUMNS)))
+    for start in range(0, len(rows), per_stmt):
+        chunk = rows[start : start + per_stmt]
+        counts += _upsert_chunk(session, dialect_insert, chunk, on_conflict, record_history)
+    return counts
+
+
+def _station_row(s: Station) -> dict:
+    return {
+        "station_id": s.id,
+        "name": s.name,
+        "place": s.place,
+        "latitude": s.latitude,
+        "longitude": s.longitude,
+        "diva_id": s.diva_id,
+        "tariff_zones": s.tariff_zones,
+        "products": s.products,  # JSON column supports list
+    }
+
+
+def bulk_upsert_stations(
+    session, stations: Union[Iterable[Station], StationTable], chunk_size: int = UPSERT_CHUNK_SIZE
+) -> int:
+    """Insert or overwrite stations by station_id in multi-row statements. Returns rows written."""
+    source = stations.db_rows() if isinstance(stations, StationTable) else map(_station_row, stations)
+    rows = list({r["station_id"]: r for r in source}.values())
+    table = StationOrm.__table__
+    dialect_name = session.get_bind().dialect.name
+    dialect_insert = dialect_insert_for(dialect_name)
+    if dialect_insert is None:
+        for row in rows:
+            session.merge(StationOrm(**row))
+        return len(rows)
+    ncols = len(rows[0]) if rows else 1
+    per_stmt = max(1, min(chunk_size, _MAX_PARAMS[dialect_name] // ncols))
+    for start in range(0, len(rows), per_stmt):
+        stmt = dialect_insert(table).values(rows[start : start + per_stmt])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["station_id"],
+            set_={c: stmt.excluded[c] for c in rows[0] if c != "station_id"},
+        )
+        session.execute(stmt)
+    return len(rows)
+
+
+class BatchWriter:
+    """Buffer departures and commit them in batches of ``batch_size`` rows.
+
+    Each flush is its own transaction, so rows written before a crash mid-cycle are kept.
+    ``route`` (see partitions.partition_router) splits a flush across partition databases.
+    ``seconds`` adds up the time spent in flushes.
+    """
+
+    def __init__(
+        self,
+        Session,
+        on_conflict: str = "nothing",
+        record_history: bool = False,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        route: Optional[Callable[[Sequence[Departure]], List[Tuple[object, List[Departure]]]]] = None,
+    ):
+        check_history_mode(on_conflict, record_history)
+        self.Session = Session
+        self.route = route
+        self.on_conflict = on_conflict
+        self.record_history = record_history
+        self.batch_size = max(1, batch_size)
+        self.counts = UpsertCounts()
+        self.seconds = 0.0
+        self._buffer: List[Departure] = []
+
+    def add(self, departures: Iterable[Departure]) -> None:
+        self._buffer.extend(departures)
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        if not self._buffer:
+            return
+        t0 = time.perf_counter()
+        groups = self.route(self._buffer) if self.route else [(self.Session, self._buffer)]
+        for Session, departures in groups:
+            with Session() as session:
+                self.counts += bulk_upsert_departures(
+                    session,
+                    departures,
+                    on_conflict=self.on_conflict,
+                    record_history=self.record_history,
+                )
+                session.commit()
+        self._buffer = []
+        self.seconds += time.perf_counter() - t0
+
+    def __enter__(self) -> "BatchWriter":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.flush()
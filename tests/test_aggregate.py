@@ -7,8 +7,17 @@ SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
 if SYS_PATH_ADDED not in sys.path:
     sys.path.insert(0, SYS_PATH_ADDED)
 
-from track_tram_reliability.db import create_session_maker, init_db, DepartureRawOrm  # noqa: E402
-from track_tram_reliability.aggregate import compute_line_metrics, compute_station_metrics  # noqa: E402
+from track_tram_reliability.db import create_session_maker, dispose_engines, init_db, DepartureOrm  # noqa: E402
+from track_tram_reliability.models import Departure  # noqa: E402
+from track_tram_reliability.writer import bulk_upsert_departures  # noqa: E402
+from track_tram_reliability.aggregate import (  # noqa: E402
+    compute_line_metrics,
+    compute_station_metrics,
+    parse_time_bound,
+)
+from track_tram_reliability.rollup import WATERMARK_LAG_SECONDS, decode_hist, hist_quantile, refresh_rollups  # noqa: E402
+from track_tram_reliability.db import RollupLineHourlyOrm  # noqa: E402
+from sqlalchemy import select, update  # noqa: E402
 
 
 class AggregateTests(unittest.TestCase):
@@ -19,7 +28,7 @@ class AggregateTests(unittest.TestCase):
         with Session() as session:
             # Insert sample rows for two dates
             def add(station_id, transport_type, label, dest, planned, real, delay, cancelled, fetched_at):
-                r = DepartureRawOrm(
+                d = Departure(
                     station_id=station_id,
                     transport_type=transport_type,
                     label=label,
@@ -32,7 +41,7 @@ class AggregateTests(unittest.TestCase):
                     realtime=True,
                     fetched_at=fetched_at,
                 )
-                session.add(r)
+                bulk_upsert_departures(session, [d])
 
             # Day 1 (2023-11-14 UTC ~ 1700000000)
             add("s1", "TRAM", "T1", "A", 1700000000, 1700000300, 5, False, 1700000000)
@@ -43,6 +52,7 @@ class AggregateTests(unittest.TestCase):
             session.commit()
 
     def tearDown(self):
+        dispose_engines(self.tmp_db)
         db_path = Path(__file__).parent / 'tmp_rovodev_agg.db'
         if db_path.exists():
             db_path.unlink()
@@ -63,6 +73,106 @@ class AggregateTests(unittest.TestCase):
         s1_rows = [r for r in rows if r['station_id']=='s1']
         self.assertGreaterEqual(len(s1_rows), 2)
 
+    def test_rollups_refresh_incrementally(self):
+        self.assertEqual(refresh_rollups(self.tmp_db), 2)
+        # Nothing new: only the hour(s) at the inclusive watermark are looked at again
+        self.assertLessEqual(refresh_rollups(self.tmp_db), 1)
+
+        Session = create_session_maker(self.tmp_db)
+        with Session() as session:
+            # A later observation updates an existing departure in place
+            session.execute(
+                update(DepartureOrm)
+                .where(DepartureOrm.planned_departure_time == 1700000000)
+                .values(delay_in_minutes=9, cancelled=True, fetched_at=1700100000)
+            )
+            session.commit()
+        # The updated departure's hour plus the hour at the inclusive watermark
+        self.assertEqual(refresh_rollups(self.tmp_db), 2)
+
+        day1 = [
+            r for r in compute_line_metrics(self.tmp_db)
+            if r['label'] == 'T1' and r['date'] == '2023-11-14'
+        ][0]
+        self.assertEqual((day1['count_total'], day1['count_cancelled']), (2, 2))
+        self.assertAlmostEqual(day1['avg_delay'], 5.0)
+        with Session() as session:
+            hists = [
+                decode_hist(h)
+                for (h,) in session.execute(
+                    select(RollupLineHourlyOrm.delay_hist).where(RollupLineHourlyOrm.label == 'T1')
+                )
+            ]
+        self.assertEqual(sum(sum(h.values()) for h in hists), 3)
+        self.assertIn(9, {d for h in hists for d in h})
+
+    def test_late_commit_with_older_fetch_time_is_rolled_up(self):
+        refresh_rollups(self.tmp_db)
+        Session = create_session_maker(self.tmp_db)
+        with Session() as session:
+            # Fetched long before the watermark (e.g. a slow `ttr ingest` next to the poller)
+            late = 1700086400 - 2 * WATERMARK_LAG_SECONDS
+            bulk_upsert_departures(session, [Departure(
+                station_id="s3", transport_type="TRAM", label="T1", destination="A",
+                planned_departure_time=1700050000, realtime_departure_time=None, delay_in_minutes=2,
+                cancelled=False, platform=None, realtime=True, fetched_at=late,
+            )])
+            session.commit()
+        self.assertGreaterEqual(refresh_rollups(self.tmp_db), 1)
+        total = sum(r['count_total'] for r in compute_line_metrics(self.tmp_db) if r['label'] == 'T1')
+        self.assertEqual(total, 4)
+
+    def test_percentiles_merge_hourly_histograms(self):
+        rows = compute_line_metrics(self.tmp_db, percentiles=[50, 100])
+        day1 = [r for r in rows if r['label'] == 'T1' and r['date'] == '2023-11-14'][0]
+        self.assertEqual((day1['p50_delay'], day1['p100_delay']), (1.0, 5.0))
+        self.assertNotIn('p50_delay', compute_line_metrics(self.tmp_db)[0])
+
+    def test_hist_quantile(self):
+        hist = {0: 50, 2: 40, 10: 10}
+        self.assertEqual([hist_quantile(hist, q) for q in (50, 90, 95)], [0.0, 2.0, 10.0])
+        self.assertIsNone(hist_quantile({}, 50))
+
+    def test_dates_are_berlin_service_dates(self):
+        Session = create_session_maker(self.tmp_db)
+        with Session() as session:
+            # 2023-11-14 23:30 UTC is 2023-11-15 00:30 in Munich
+            bulk_upsert_departures(session, [Departure(
+                station_id="s3", transport_type="TRAM", label="T1", destination="A",
+                planned_departure_time=1700004600, realtime_departure_time=None,
+                delay_in_minutes=None, cancelled=False, platform=None, realtime=False,
+                fetched_at=1700004600,
+            )])
+            session.commit()
+        rows = compute_station_metrics(self.tmp_db, stations={"s3"})
+        self.assertEqual([r['date'] for r in rows], ['2023-11-15'])
+
+    def test_filters_from_rollups_and_raw(self):
+        since, until = parse_time_bound("2023-11-14"), parse_time_bound("2023-11-14", end=True)
+        self.assertEqual(until - since, 86400)
+        # Answered by the line rollup (aligned range, filter on a line key)
+        rows = compute_line_metrics(self.tmp_db, since=since, until=until, products={"tram"})
+        self.assertEqual([(r['label'], r['count_total']) for r in rows], [('T1', 2)])
+        # Station filter is not a line key: falls back to departures_raw
+        rows = compute_line_metrics(self.tmp_db, stations={"s2"})
+        self.assertEqual([r['label'] for r in rows], ['B2'])
+        # Label filter on station metrics, unaligned epoch bounds
+        rows = compute_station_metrics(self.tmp_db, labels={"t1"}, since=1700000001)
+        self.assertEqual(
+            [(r['date'], r['count_total']) for r in rows], [('2023-11-14', 1), ('2023-11-15', 1)]
+        )
+
+    def test_hour_and_weekday_breakdowns(self):
+        rows = compute_station_metrics(self.tmp_db, by="hour", stations={"s1"})
+        # All s1 departures are at 23:xx Munich time
+        self.assertEqual([(r['hour'], r['count_total']) for r in rows], [(23, 3)])
+        rows = compute_station_metrics(self.tmp_db, by="weekday", stations={"s1"})
+        self.assertEqual([(r['weekday'], r['count_total']) for r in rows], [(1, 2), (2, 1)])
+
+    def test_days_filter(self):
+        self.assertEqual(compute_line_metrics(self.tmp_db, days=7), [])
+        self.assertEqual(len(compute_station_metrics(self.tmp_db, days=None)), 3)
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,95 @@
+import random
+import shutil
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.db import create_session_maker, dispose_engines, init_db  # noqa: E402
+from track_tram_reliability.models import Departure  # noqa: E402
+from track_tram_reliability.writer import bulk_upsert_departures  # noqa: E402
+from track_tram_reliability.aggregate import compute_line_metrics, compute_station_metrics  # noqa: E402
+from track_tram_reliability.analytics import compute_metrics_columnar  # noqa: E402
+from track_tram_reliability.export import export_departures  # noqa: E402
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+try:
+    import duckdb  # noqa: F401
+except ImportError:  # pragma: no cover - optional dependency
+    duckdb = None
+
+
+@unittest.skipIf(pyarrow is None, "pyarrow not installed")
+class ColumnarEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_analytics.db'
+        self.out_dir = Path(__file__).parent / 'tmp_rovodev_analytics'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+        init_db(self.tmp_db)
+        Session = create_session_maker(self.tmp_db)
+        rnd = random.Random(7)
+        start = 1700000000  # spans a few days around 2023-11-15 in Munich
+        departures = []
+        with Session() as session:
+            for i in range(600):
+                planned = None if i % 97 == 0 else start + rnd.randrange(0, 4 * 86400)
+                delay = None if i % 11 == 0 else rnd.choice([-1, 0, 0, 1, 2, 3, 5, 8, 15])
+                departures.append(Departure(
+                    station_id=rnd.choice(["s1", "s2", "s3"]),
+                    transport_type=rnd.choice(["TRAM", "BUS"]),
+                    label=rnd.choice(["17", "27", "53"]),
+                    destination=rnd.choice(["A", "B", None]),
+                    planned_departure_time=planned,
+                    realtime_departure_time=None,
+                    delay_in_minutes=delay,
+                    cancelled=rnd.random() < 0.1,
+                    platform=None,
+                    realtime=True,
+                    fetched_at=start + i * 600,
+                ))
+            bulk_upsert_departures(session, departures)
+            session.commit()
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        if self.db_path.exists():
+            self.db_path.unlink()
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def _engines(self):
+        return ["arrow"] + (["duckdb"] if duckdb is not None else [])
+
+    def test_identical_to_sql_path(self):
+        export_departures(self.tmp_db, self.out_dir, now=1800000000)
+        sql = {"line": compute_line_metrics, "station": compute_station_metrics}
+        cases = [
+            dict(),
+            dict(percentiles=[50, 90, 95], by="hour"),
+            dict(by="weekday", products={"tram"}),
+            dict(since=1700100000, until=1700200000, stations={"s1", "s2"}, percentiles=[90]),
+        ]
+        for scope, compute in sql.items():
+            for kwargs in cases:
+                expected = compute(self.tmp_db, **kwargs)
+                self.assertTrue(expected)
+                for engine in self._engines():
+                    for source in (dict(db_url=self.tmp_db), dict(source=self.out_dir)):
+                        with self.subTest(scope=scope, engine=engine, source=list(source), **kwargs):
+                            got = compute_metrics_columnar(
+                                scope, engine, batch_rows=100, **source, **kwargs
+                            )
+                            self.assertEqual(got, expected)
+
+    def test_empty_result(self):
+        self.assertEqual(compute_metrics_columnar("line", db_url=self.tmp_db, labels={"X99"}), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,85 @@
+import unittest
+import sys
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+try:
+    import httpx  # noqa: F401
+except ImportError:  # pragma: no cover - optional dependency
+    httpx = None
+
+from track_tram_reliability.fetchers import AsyncFetcher  # noqa: E402
+from track_tram_reliability.ratelimit import configure_limiter  # noqa: E402
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Serve one departure per station; the first request for 'flaky' stations gets a 503."""
+
+    seen = set()
+    lock = threading.Lock()
+
+    def do_GET(self):
+        sid = parse_qs(urlparse(self.path).query)["globalId"][0]
+        with self.lock:
+            first = sid not in self.seen
+            self.seen.add(sid)
+        if sid == "missing":
+            self.send_response(404)
+            self.end_headers()
+            return
+        if sid.startswith("flaky") and first:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.end_headers()
+            return
+        body = json.dumps(
+            [{"plannedDepartureTime": 1700000000000, "realtimeDepartureTime": 1700000120000,
+              "transportType": "TRAM", "label": "27", "destination": "Petuelring"}]
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@unittest.skipIf(httpx is None, "httpx not installed")
+class AsyncFetcherTests(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/departures"
+        self.limiter = configure_limiter("127.0.0.1", rate=1000.0, burst=1000.0, max_rate=1000.0)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_fetch_many_against_stub_server(self):
+        fetcher = AsyncFetcher(concurrency=4, timeout=5.0, url=self.url)
+        ids = [f"s{i}" for i in range(20)] + ["flaky1", "missing"]
+        results = {r.station_id: r for r in fetcher.fetch_many(ids)}
+        self.assertEqual(set(results), set(ids))
+        ok = [r for r in results.values() if r.error is None]
+        self.assertEqual(len(ok), 21)  # flaky1 succeeds on retry
+        dep = results["flaky1"].departures[0]
+        self.assertEqual(dep.planned_departure_time, 1700000000)
+        self.assertEqual(dep.delay_in_minutes, 2)
+        self.assertIsNotNone(results["missing"].error)
+        # The 503 was reported to the shared limiter for the stub host
+        self.assertEqual(self.limiter.throttled, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
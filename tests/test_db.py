@@ -0,0 +1,156 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from sqlalchemy import func, select, text  # noqa: E402
+
+from track_tram_reliability.db import (  # noqa: E402
+    create_engine_for_url,
+    create_session_maker,
+    dispose_engines,
+    init_db,
+    DepartureObservationOrm,
+    DepartureRawOrm,
+    LegacyStorageError,
+    LineOrm,
+)
+from track_tram_reliability.dims import cache_for, resolve  # noqa: E402
+from track_tram_reliability.migrate import migrate_storage  # noqa: E402
+from track_tram_reliability.models import Departure  # noqa: E402
+from track_tram_reliability.writer import bulk_upsert_departures  # noqa: E402
+
+LEGACY_SCHEMA = (
+    """CREATE TABLE departures_raw (
+        id INTEGER PRIMARY KEY, station_id VARCHAR, transport_type VARCHAR(16), label VARCHAR(32),
+        destination VARCHAR, planned_departure_time INTEGER, realtime_departure_time INTEGER,
+        delay_in_minutes INTEGER, cancelled BOOLEAN, platform VARCHAR(32), realtime BOOLEAN,
+        fetched_at INTEGER,
+        CONSTRAINT uq_departure_identity UNIQUE (
+            station_id, transport_type, label, destination, planned_departure_time))""",
+    """CREATE TABLE departure_observations (
+        departure_id INTEGER REFERENCES departures_raw (id), fetched_at INTEGER,
+        realtime_departure_time INTEGER, delay_in_minutes INTEGER, cancelled BOOLEAN,
+        PRIMARY KEY (departure_id, fetched_at))""",
+    """INSERT INTO departures_raw VALUES
+        (5, 's1', 'TRAM', '17', 'Central', 1700000000, 1700000060, 1, 0, '2', 1, 1699999000),
+        (9, 's1', 'TRAM', '17', NULL, 1700000600, NULL, NULL, 1, NULL, 0, 1699999000),
+        (12, 's1', 'TRAM', '17', NULL, 1700000600, NULL, NULL, 1, NULL, 0, 1699999600)""",
+    """INSERT INTO departure_observations VALUES
+        (5, 1699999000, 1700000060, 1, 0), (12, 1699999600, NULL, NULL, 1)""",
+)
+
+
+class EngineRegistryTests(unittest.TestCase):
+    def setUp(self):
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_db.db'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        if self.db_path.exists():
+            self.db_path.unlink()
+
+    def test_engine_and_sessionmaker_are_cached_per_url(self):
+        self.assertIs(create_engine_for_url(self.tmp_db), create_engine_for_url(self.tmp_db))
+        self.assertIs(create_session_maker(self.tmp_db), create_session_maker(self.tmp_db))
+        engine = create_engine_for_url(self.tmp_db)
+        dispose_engines(self.tmp_db)
+        self.assertIsNot(create_engine_for_url(self.tmp_db), engine)
+
+    def test_sqlite_pragmas_applied(self):
+        init_db(self.tmp_db)
+        with create_engine_for_url(self.tmp_db).connect() as conn:
+            self.assertEqual(conn.execute(text("PRAGMA journal_mode")).scalar(), "wal")
+            self.assertEqual(conn.execute(text("PRAGMA synchronous")).scalar(), 1)  # NORMAL
+            self.assertEqual(conn.execute(text("PRAGMA busy_timeout")).scalar(), 30000)
+
+    def test_init_db_runs_schema_creation_once(self):
+        init_db(self.tmp_db)
+        with create_engine_for_url(self.tmp_db).begin() as conn:
+            conn.execute(text("DROP TABLE departure_observations"))
+        init_db(self.tmp_db)  # cached: no second create_all
+        with create_engine_for_url(self.tmp_db).connect() as conn:
+            tables = {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type='table'"))}
+        self.assertNotIn("departure_observations", tables)
+        self.assertIn("departures", tables)
+
+    def test_init_db_adds_missing_indexes_to_existing_tables(self):
+        init_db(self.tmp_db)
+        with create_engine_for_url(self.tmp_db).begin() as conn:
+            conn.execute(text("DROP INDEX ix_departures_line_planned"))
+        dispose_engines(self.tmp_db)
+        init_db(self.tmp_db)
+        with create_engine_for_url(self.tmp_db).connect() as conn:
+            indexes = {r[0] for r in conn.execute(text("SELECT name FROM sqlite_master WHERE type='index'"))}
+            plan = " ".join(
+                str(r[-1])
+                for r in conn.execute(text(
+                    "EXPLAIN QUERY PLAN SELECT count(*) FROM departures "
+                    "WHERE line_id IN (1, 2) AND planned_departure_time >= 1700000000"
+                ))
+            )
+        self.assertIn("ix_departures_line_planned", indexes)
+        self.assertIn("ix_departures_station_planned", indexes)
+        self.assertIn("ix_departures_line_planned", plan)
+
+
+class CompactStorageTests(unittest.TestCase):
+    def setUp(self):
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_storage.db'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        if self.db_path.exists():
+            self.db_path.unlink()
+
+    def test_migrate_legacy_departures_raw(self):
+        with create_engine_for_url(self.tmp_db).begin() as conn:
+            for stmt in LEGACY_SCHEMA:
+                conn.execute(text(stmt))
+        with self.assertRaises(LegacyStorageError):
+            init_db(self.tmp_db)
+
+        result = migrate_storage(self.tmp_db, batch_size=2)
+        # Row 12 repeats row 9 (NULL destination) and is merged away with its history
+        self.assertEqual(result[:3], (2, 1, 1))
+        init_db(self.tmp_db)
+        Session = create_session_maker(self.tmp_db)
+        with Session() as session:
+            rows = session.execute(
+                select(DepartureRawOrm.id, DepartureRawOrm.destination, DepartureRawOrm.platform)
+                .order_by(DepartureRawOrm.id)
+            ).all()
+            self.assertEqual([tuple(r) for r in rows], [(5, "Central", "2"), (9, None, None)])
+            self.assertEqual(session.execute(select(func.count(LineOrm.id))).scalar(), 1)
+            history = session.execute(select(DepartureObservationOrm.departure_id)).scalars().all()
+            self.assertEqual(history, [5])
+            # New writes continue after the copied ids
+            bulk_upsert_departures(session, [Departure(
+                station_id="s2", planned_departure_time=1700001200, realtime_departure_time=None,
+                delay_in_minutes=None, transport_type="TRAM", label="17", destination="Central",
+                platform=None, fetched_at=1700000000,
+            )])
+            session.commit()
+            self.assertEqual(session.execute(select(func.max(DepartureRawOrm.id))).scalar(), 10)
+        self.assertEqual(migrate_storage(self.tmp_db)[:3], (0, 0, 0))
+
+    def test_dimension_ids_cached_only_after_commit(self):
+        init_db(self.tmp_db)
+        Session = create_session_maker(self.tmp_db)
+        with Session() as session:
+            resolve(session, "lines", [("TRAM", "17")])
+            session.rollback()
+            self.assertEqual(cache_for(session).ids["lines"], {})
+            ids = resolve(session, "lines", [("TRAM", "17"), ("BUS", "")])
+            session.commit()
+            self.assertEqual(cache_for(session).ids["lines"], ids)
+
+
+if __name__ == "__main__":
+    unittest.main()
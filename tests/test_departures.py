@@ -73,6 +73,34 @@ class DeparturesTests(unittest.TestCase):
         self.assertEqual(d.label, "T17")
         self.assertEqual(d.destination, "Central")
 
+    def test_parse_departure_rows_matches_models(self):
+        payload = [
+            {"plannedDepartureTime": 1700000000000, "realtimeDepartureTime": 1700000120000,
+             "transportType": "TRAM", "label": "27", "destination": "Petuelring", "platform": 2,
+             "realtime": True},
+            {"plannedDepartureTime": "1700000600", "realtimeDepartureTime": None, "delayInMinutes": 3.0,
+             "transportType": "BUS", "label": "53", "destination": "Aidenbachstr.", "cancelled": True},
+            {"plannedDepartureTime": None, "transportType": "TRAM", "label": "27", "destination": "X"},
+        ]
+        rows = departures.parse_departure_rows("de:fake:1", payload, fetched_at=1700000000)
+        self.assertEqual([r.to_model() for r in rows], departures.parse_departures("de:fake:1", payload, 1700000000))
+        self.assertEqual(
+            [(r.planned_departure_time, r.delay_in_minutes, r.platform, r.cancelled) for r in rows],
+            [(1700000000, 2, "2", False), (1700000600, 3, None, True), (None, None, None, False)],
+        )
+        self.assertEqual(departures.parse_departure_rows("de:fake:1", []), [])
+
+    def test_snake_case_key_missing_in_first_item(self):
+        # Null fields are omitted: the first item has no delay, the second one does
+        payload = [
+            {"planned_departure_time": 1700000000, "transport_type": "TRAM", "label": "27"},
+            {"planned_departure_time": 1700000600, "realtime_departure_time": 1700000900,
+             "delay_in_minutes": 4, "transport_type": "TRAM", "label": "27"},
+        ]
+        rows = departures.parse_departure_rows("de:fake:1", payload, fetched_at=1700000000)
+        self.assertEqual([(r.realtime_departure_time, r.delay_in_minutes) for r in rows],
+                         [(None, None), (1700000900, 4)])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,105 @@
+import shutil
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from sqlalchemy import func, select  # noqa: E402
+
+from track_tram_reliability.db import (  # noqa: E402
+    create_session_maker,
+    dispose_engines,
+    init_db,
+    DepartureRawOrm,
+)
+from track_tram_reliability.models import Departure  # noqa: E402
+from track_tram_reliability.writer import bulk_upsert_departures  # noqa: E402
+from track_tram_reliability.aggregate import compute_line_metrics  # noqa: E402
+from track_tram_reliability.export import export_departures, read_state  # noqa: E402
+from track_tram_reliability.rollup import refresh_rollups  # noqa: E402
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:  # pragma: no cover - optional dependency
+    ds = None
+
+
+def make_row(planned, transport_type="TRAM", label="17", delay=1):
+    return Departure(
+        station_id="s1",
+        transport_type=transport_type,
+        label=label,
+        destination="Central",
+        planned_departure_time=planned,
+        realtime_departure_time=planned + delay * 60,
+        delay_in_minutes=delay,
+        cancelled=False,
+        platform=None,
+        realtime=True,
+        fetched_at=planned - 300,
+    )
+
+
+@unittest.skipIf(ds is None, "pyarrow not installed")
+class ExportTests(unittest.TestCase):
+    def setUp(self):
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_export.db'
+        self.out_dir = Path(__file__).parent / 'tmp_rovodev_export'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+        init_db(self.tmp_db)
+        self.Session = create_session_maker(self.tmp_db)
+        with self.Session() as session:
+            # 2023-11-14 ~23:13 Munich (TRAM, BUS) and 2023-11-15 ~10:00 Munich (TRAM)
+            bulk_upsert_departures(session, [
+                make_row(1700000000),
+                make_row(1700000600, transport_type="BUS", label="53", delay=4),
+                make_row(1700038800),
+            ])
+            session.commit()
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        if self.db_path.exists():
+            self.db_path.unlink()
+        shutil.rmtree(self.out_dir, ignore_errors=True)
+
+    def test_incremental_partitioned_export_with_prune(self):
+        # Only the first two departures are settled at this point
+        now = 1700000600 + 6 * 3600 + 3600
+        result = export_departures(self.tmp_db, self.out_dir, chunk_size=1, now=now)
+        self.assertEqual((result.rows_exported, result.files_written), (2, 2))
+        self.assertEqual(read_state(self.out_dir)["exported_until"], result.exported_until)
+        self.assertTrue((self.out_dir / "date=2023-11-14" / "transport_type=BUS").is_dir())
+
+        again = export_departures(self.tmp_db, self.out_dir, now=now)
+        self.assertEqual(again.rows_exported, 0)
+
+        later = export_departures(self.tmp_db, self.out_dir, prune=True, now=now + 86400)
+        self.assertEqual((later.rows_exported, later.rows_pruned), (1, 1))
+        with self.Session() as session:
+            remaining = session.execute(select(func.count(DepartureRawOrm.id))).scalar()
+        self.assertEqual(remaining, 2)
+
+        dataset = ds.dataset(self.out_dir, format="parquet", partitioning="hive")
+        table = dataset.to_table(filter=ds.field("transport_type") == "TRAM")
+        self.assertEqual(sorted(table.column("planned_departure_time").to_pylist()), [1700000000, 1700038800])
+        self.assertEqual(dataset.schema.field("label").type.value_type, "string")
+        self.assertEqual(dataset.count_rows(), 3)
+
+    def test_prune_keeps_rows_in_rollups(self):
+        # No `ttr aggregate` ran before: pruning must roll the rows up before deleting them
+        result = export_departures(self.tmp_db, self.out_dir, prune=True, now=1700038800 + 86400)
+        self.assertEqual(result.rows_pruned, 3)
+        rows = compute_line_metrics(self.tmp_db)
+        self.assertEqual(sum(r["count_total"] for r in rows), 3)
+        self.assertEqual({r["label"] for r in rows}, {"17", "53"})
+        refresh_rollups(self.tmp_db, rebuild=True)
+        self.assertEqual(sum(r["count_total"] for r in compute_line_metrics(self.tmp_db)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+import sys
+import random
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.geo import PointGrid, haversine_m  # noqa: E402
+
+
+class PointGridTests(unittest.TestCase):
+    def setUp(self):
+        rnd = random.Random(7)
+        self.points = [
+            (48.0 + rnd.random() * 0.3, 11.4 + rnd.random() * 0.4, f"s{i}") for i in range(2000)
+        ]
+        self.queries = [(48.0 + rnd.random() * 0.3, 11.4 + rnd.random() * 0.4) for _ in range(50)]
+        self.grid = PointGrid(self.points, cell_m=200)
+
+    def brute(self, lat, lon):
+        return sorted((haversine_m(lat, lon, plat, plon), item) for plat, plon, item in self.points)
+
+    def test_within_matches_brute_force(self):
+        for lat, lon in self.queries:
+            for radius in (50, 300, 1500):
+                expected = [(d, i) for d, i in self.brute(lat, lon) if d <= radius]
+                self.assertEqual(sorted(self.grid.within(lat, lon, radius)), expected)
+
+    def test_nearest_matches_brute_force(self):
+        for lat, lon in self.queries + [(47.0, 10.0)]:
+            expected = self.brute(lat, lon)
+            self.assertEqual(self.grid.nearest(lat, lon, 3), expected[:3])
+            limited = [x for x in expected[:1] if x[0] <= 100]
+            self.assertEqual(self.grid.nearest(lat, lon, 1, max_distance_m=100), limited)
+
+    def test_empty_grid(self):
+        grid = PointGrid([])
+        self.assertEqual(len(grid), 0)
+        self.assertEqual(grid.within(48.1, 11.5, 1000), [])
+        self.assertEqual(grid.nearest(48.1, 11.5), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
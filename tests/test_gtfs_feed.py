@@ -0,0 +1,91 @@
+import unittest
+import sys
+import hashlib
+import shutil
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.gtfs_feed import fetch_feed, read_meta  # noqa: E402
+
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serve ``body`` with an ETag derived from it; answer matching If-None-Match with 304."""
+
+    body = b"PK-feed-v1"
+    requests = []
+    lock = threading.Lock()
+
+    def do_GET(self):
+        etag = '"%s"' % hashlib.md5(self.body).hexdigest()
+        with self.lock:
+            self.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/zip")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FeedCacheTests(unittest.TestCase):
+    def setUp(self):
+        FeedHandler.body = b"PK-feed-v1"
+        FeedHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FeedHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/gtfs.zip"
+        self.cache_dir = Path(__file__).parent / 'tmp_rovodev_feeds'
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_conditional_download(self):
+        first = fetch_feed(self.url, self.cache_dir)
+        self.assertEqual(first.status, "downloaded")
+        self.assertEqual(first.path.read_bytes(), b"PK-feed-v1")
+        self.assertEqual(first.sha256, hashlib.sha256(b"PK-feed-v1").hexdigest())
+        self.assertEqual(first.path.name, f"{first.sha256}.zip")
+
+        # Recent copy: no request at all
+        self.assertEqual(fetch_feed(self.url, self.cache_dir).status, "cached")
+        self.assertEqual(len(FeedHandler.requests), 1)
+
+        # Revalidation of an unchanged feed sends the ETag and gets a 304
+        again = fetch_feed(self.url, self.cache_dir, refresh=True)
+        self.assertEqual((again.status, again.path), ("not-modified", first.path))
+        self.assertEqual(FeedHandler.requests[-1], read_meta(self.cache_dir, self.url)["etag"])
+
+        # Changed feed: new content-addressed file, previous version kept
+        FeedHandler.body = b"PK-feed-v2"
+        changed = fetch_feed(self.url, self.cache_dir, max_age=0)
+        self.assertEqual(changed.status, "downloaded")
+        self.assertEqual(changed.path.read_bytes(), b"PK-feed-v2")
+        self.assertTrue(first.path.exists())
+        self.assertEqual(read_meta(self.cache_dir, self.url)["versions"], [changed.sha256, first.sha256])
+        self.assertEqual(list(changed.path.parent.glob("*.part")), [])
+
+    def test_unreachable_server_uses_cached_copy(self):
+        first = fetch_feed(self.url, self.cache_dir)
+        self.server.shutdown()
+        self.server.server_close()
+        stale = fetch_feed(self.url, self.cache_dir, refresh=True)
+        self.assertEqual((stale.status, stale.path), ("stale", first.path))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import unittest
+import sys
+import zipfile
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.gtfs_index import _iter_csv_columns, build_label_index  # noqa: E402
+from track_tram_reliability.models import Station  # noqa: E402
+from track_tram_reliability.stations import table_path, write_cache  # noqa: E402
+
+FEED = {
+    # BOM and a padded header name, as seen in real feeds
+    "routes.txt": "﻿route_id, route_short_name ,route_type\nr1,17,900\nr2,53,3\nr3,17,0\n",
+    "trips.txt": "route_id,service_id,trip_id\nr1,w,t1\nr1,w,t2\nr2,w,t3\nr3,w,t4\n",
+    "stop_times.txt": (
+        "trip_id,arrival_time,departure_time,stop_id,stop_sequence\n"
+        "t1,08:00:00,08:00:00,a1,1\nt1,08:02:00,08:02:00,de:09162:2:1:1,2\n"
+        "t2,09:00:00,09:00:00,c,1\nt3,10:00:00,10:00:00,a2,1\nt4,11:00:00,11:00:00,d,1\n"
+    ),
+    "stops.txt": (
+        "stop_id,stop_name,stop_lat,stop_lon,location_type,parent_station\n"
+        "a1,Alpha,48.1,11.5,0,de:09162:1\na2,Alpha,48.1,11.5,0,de:09162:1\n"
+        "de:09162:2:1:1,Beta,48.2,11.6,0,\nc,Gamma,48.3,11.7,0,de:09162:3\n"
+        # No id match: only linked by distance
+        "d,Delta,48.4,11.8,0,\n"
+    ),
+}
+
+
+class GtfsIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.zip_path = Path(__file__).parent / 'tmp_rovodev_gtfs.zip'
+        self.cache_path = Path(__file__).parent / 'tmp_rovodev_gtfs_stations.json'
+        with zipfile.ZipFile(self.zip_path, "w", zipfile.ZIP_DEFLATED) as zf:
+            for name, text in FEED.items():
+                zf.writestr(name, text)
+        write_cache(
+            [Station(id=f"de:09162:{i}", name=f"S{i}") for i in (1, 2, 3, 4)], self.cache_path
+        )
+
+    def tearDown(self):
+        for p in (self.zip_path, self.cache_path, table_path(self.cache_path)):
+            if p.exists():
+                p.unlink()
+
+    def test_build_label_index(self):
+        index = build_label_index(self.zip_path, {"TRAM"}, None, self.cache_path)
+        expected = {"17": ["de:09162:1", "de:09162:2", "de:09162:3"]}
+        self.assertEqual(index.mapping, {"TRAM": expected, "ALL": expected})
+        index = build_label_index(self.zip_path, None, {"53"}, self.cache_path)
+        self.assertEqual(index.mapping["BUS"], {"53": ["de:09162:1"]})
+
+    def test_distance_fallback_for_unmatched_stops(self):
+        write_cache(
+            [Station(id="de:09162:3", name="S3"),
+             Station(id="de:09162:4", name="S4", latitude=48.4005, longitude=11.8),  # ~56 m
+             Station(id="de:09162:5", name="S5", latitude=48.41, longitude=11.8)],
+            self.cache_path,
+        )
+        index = build_label_index(self.zip_path, {"TRAM"}, None, self.cache_path)
+        self.assertEqual(index.mapping["TRAM"], {"17": ["de:09162:3", "de:09162:4"]})
+        index = build_label_index(self.zip_path, {"TRAM"}, None, self.cache_path, distance_threshold_m=50)
+        self.assertEqual(index.mapping["TRAM"], {"17": ["de:09162:3"]})
+
+    def test_iter_csv_columns_projects_and_pads(self):
+        with zipfile.ZipFile(self.zip_path) as zf:
+            rows = list(_iter_csv_columns(zf, "routes.txt", ("route_short_name", "agency_id")))
+        self.assertEqual(rows, [("17", ""), ("53", ""), ("17", "")])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import json
+import os
+import unittest
+import sys
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.cli import app  # noqa: E402
+from track_tram_reliability.db import dispose_engines, init_db  # noqa: E402
+from track_tram_reliability.gtfs_index import GtfsIndex, write_label_index  # noqa: E402
+from track_tram_reliability.label_index import LabelIndex, encode_label_index  # noqa: E402
+from track_tram_reliability.models import Station  # noqa: E402
+from track_tram_reliability.poller import PollScope  # noqa: E402
+from track_tram_reliability.print_label_stations import resolve_stations_for_labels  # noqa: E402
+from track_tram_reliability.stations import table_path, write_cache  # noqa: E402
+
+MAPPING = {
+    "TRAM": {"17": ["s2", "s1"], "27": ["s2", "s3"]},
+    "BUS": {"53": ["s4"]},
+    "ALL": {"17": ["s1", "s2"], "27": ["s2", "s3"], "53": ["s4"]},
+}
+
+
+class LabelIndexTests(unittest.TestCase):
+    def setUp(self):
+        self.path = Path(__file__).parent / 'tmp_rovodev_label_index.bin'
+        self.json_path = Path(__file__).parent / 'tmp_rovodev_label_index.json'
+        self.cache_path = Path(__file__).parent / 'tmp_rovodev_stations.json'
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_test.db'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        for p in (self.path, self.json_path, self.cache_path, table_path(self.cache_path), self.db_path):
+            if p.exists():
+                p.unlink()
+
+    def test_lookups_match_json_index(self):
+        write_label_index(GtfsIndex(MAPPING, "feed.zip"), self.path)
+        write_label_index(GtfsIndex(MAPPING, "feed.zip"), self.json_path)
+        for path in (self.path, self.json_path):
+            index = LabelIndex(path)
+            self.assertEqual(index.source, "feed.zip")
+            self.assertEqual(index.stations_for({"TRAM"}, {"17", "27", "99"}), {"s1", "s2", "s3"})
+            self.assertEqual(index.stations_for({"TRAM"}, {"53"}), set())
+            self.assertEqual(index.stations_for(None, {"53"}), {"s4"})
+            self.assertEqual(index.lines_for_station("s2"), [("TRAM", "17"), ("TRAM", "27")])
+            self.assertEqual(index.lines_for_station("nope"), [])
+            index.close()
+        self.assertEqual(resolve_stations_for_labels(self.path, ["tram"], ["53"]), ["s4"])
+
+    def test_cli_default_path_falls_back_to_shipped_json(self):
+        root = Path(__file__).resolve().parents[1]
+        shipped = json.loads((root / "data" / "label_index.json").read_text(encoding="utf-8"))
+        cwd = os.getcwd()
+        os.chdir(root)  # the default --label-index-path is relative to the working directory
+        try:
+            result = CliRunner().invoke(app, ["print-label-stations", "--labels", "27"])
+        finally:
+            os.chdir(cwd)
+        self.assertEqual(result.exit_code, 0, result.output)
+        expected = set(shipped["mapping"]["TRAM"]["27"]) | set(shipped["mapping"]["ALL"].get("27", []))
+        self.assertEqual(result.output.split(), sorted(expected))
+
+    def test_encoding_is_deterministic(self):
+        shuffled = {p: {lab: list(reversed(ids)) for lab, ids in reversed(m.items())} for p, m in MAPPING.items()}
+        self.assertEqual(encode_label_index(MAPPING, "x"), encode_label_index(shuffled, "x"))
+
+    def test_reload_only_on_content_change(self):
+        write_label_index(GtfsIndex(MAPPING, "feed.zip"), self.path)
+        index = LabelIndex(self.path)
+        self.assertFalse(index.reload_if_changed())
+        write_label_index(GtfsIndex(MAPPING, "feed.zip"), self.path)
+        self.assertFalse(index.reload_if_changed())
+        write_label_index(GtfsIndex({"TRAM": {"17": ["s9"]}}, "feed.zip"), self.path)
+        self.assertTrue(index.reload_if_changed())
+        self.assertEqual(index.stations_for({"TRAM"}, {"17"}), {"s9"})
+        index.close()
+
+    def test_poll_scope_follows_rebuilt_index(self):
+        init_db(self.tmp_db)
+        write_cache([Station(id=f"s{i}", name=f"S{i}", products=["TRAM"]) for i in range(1, 5)], self.cache_path)
+        write_label_index(GtfsIndex(MAPPING, "feed.zip"), self.path)
+        scope = PollScope(self.tmp_db, str(self.cache_path), {"TRAM"}, None, None, LabelIndex(self.path), {"17"})
+        self.assertTrue(scope.refresh())
+        self.assertEqual(scope.station_ids, ["s1", "s2"])
+        self.assertFalse(scope.refresh())
+        write_label_index(GtfsIndex({"TRAM": {"17": ["s3"]}}, "feed.zip"), self.path)
+        self.assertTrue(scope.refresh())
+        self.assertEqual(scope.station_ids, ["s3"])
+        scope.label_index.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import io
+import json
+import unittest
+import sys
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability import fetchers  # noqa: E402
+from track_tram_reliability.db import dispose_engines  # noqa: E402
+from track_tram_reliability.fetchers import FetchResult  # noqa: E402
+from track_tram_reliability.ingest import IngestResult, ingest_station_ids, sync_stations_to_db  # noqa: E402
+from track_tram_reliability.metrics import CONTENT_TYPE, CycleStats, PollerMetrics, serve_metrics  # noqa: E402
+from track_tram_reliability.models import Station  # noqa: E402
+
+
+class _HTTPError(Exception):
+    def __init__(self, status):
+        super().__init__(f"HTTP {status}")
+        self.response = type("Response", (), {"status_code": status})()
+
+
+def fake_payload(station_id):
+    if station_id == "s3":
+        raise _HTTPError(503)
+    if station_id == "s4":
+        raise ConnectionError("reset")
+    items = [{"plannedDepartureTime": 1700000000000 + i * 600_000, "label": "27"} for i in range(2)]
+    return 200, json.dumps(items).encode()
+
+
+class MetricsTests(unittest.TestCase):
+    def setUp(self):
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_test.db'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        if self.db_path.exists():
+            self.db_path.unlink()
+
+    def test_cycle_summary_and_prometheus_text(self):
+        stats = CycleStats(now=1700000000.0)
+        with stats.stage("cache"):
+            pass
+        stats.record_fetch(FetchResult("s1", [], None, 200, 0.2, 0.01))
+        stats.record_fetch(FetchResult("s2", [], _HTTPError(503), 503, 1.5))
+        stats.record_fetch(FetchResult("s3", [], ConnectionError("reset"), None, 20.0))
+        stats.finish(IngestResult(1, 5, 2, 1))
+
+        metrics = PollerMetrics()
+        log = io.StringIO()
+        metrics.record_cycle(stats, log)
+        metrics.record_cycle(stats)
+        summary = json.loads(log.getvalue())
+        self.assertEqual(log.getvalue().count("\n"), 1)
+        self.assertEqual(summary["rows"], {"inserted": 5, "updated": 1, "skipped": 2})
+        self.assertEqual(summary["http_status"], {"200": 1, "503": 1, "transport": 1})
+        self.assertEqual(summary["errors"], {"ConnectionError": 1, "http_503": 1})
+        self.assertEqual(summary["failed_stations"], ["s2", "s3"])
+        self.assertEqual(summary["fetch_latency"], {"p50": 1.5, "p95": 20.0, "max": 20.0})
+        self.assertEqual(set(summary["stages"]), {"cache", "fetch", "parse"})
+        self.assertAlmostEqual(summary["stages"]["fetch"], 21.7)
+
+        text = metrics.render()
+        self.assertIn("ttr_poll_cycles_total 2\n", text)
+        self.assertIn('ttr_http_responses_total{status="503"} 2\n', text)
+        self.assertIn('ttr_station_errors_total{reason="http_503",station="s2"} 2\n', text)
+        self.assertIn('ttr_fetch_latency_seconds_bucket{le="0.25"} 2\n', text)
+        self.assertIn('ttr_fetch_latency_seconds_bucket{le="+Inf"} 6\n', text)
+        self.assertIn('ttr_departures_total{outcome="inserted"} 10\n', text)
+        self.assertIn("# TYPE ttr_poll_cycle_seconds histogram\n", text)
+
+    def test_ingest_records_fetch_outcomes_and_write_stage(self):
+        sync_stations_to_db(self.tmp_db, [Station(id=f"s{i}", name=f"S{i}", products=["TRAM"]) for i in range(5)])
+        stats = CycleStats()
+        orig = fetchers.fetch_departures_payload
+        try:
+            fetchers.fetch_departures_payload = fake_payload
+            result = ingest_station_ids(self.tmp_db, [f"s{i}" for i in range(5)], max_workers=2, stats=stats)
+        finally:
+            fetchers.fetch_departures_payload = orig
+        self.assertEqual((result.stations_processed, result.rows_inserted), (3, 6))
+        self.assertEqual(stats.statuses, {"200": 3, "503": 1, "transport": 1})
+        self.assertEqual(stats.station_errors, {"s3": "http_503", "s4": "ConnectionError"})
+        self.assertEqual(len(stats.latencies), 5)
+        self.assertGreater(stats.stages["write"], 0.0)
+        self.assertIn("parse", stats.stages)
+
+    def test_metrics_endpoint(self):
+        metrics = PollerMetrics()
+        metrics.set_scope(42)
+        server = serve_metrics(metrics, 0)
+        base = f"http://127.0.0.1:{server.server_address[1]}"
+        try:
+            with urllib.request.urlopen(f"{base}/metrics", timeout=5) as resp:
+                self.assertEqual(resp.headers["Content-Type"], CONTENT_TYPE)
+                self.assertIn("ttr_stations_in_scope 42\n", resp.read().decode())
+            with self.assertRaises(urllib.error.HTTPError) as ctx:
+                urllib.request.urlopen(f"{base}/other", timeout=5)
+            self.assertEqual(ctx.exception.code, 404)
+            ctx.exception.close()
+        finally:
+            server.shutdown()
+            server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
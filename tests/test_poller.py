@@ -0,0 +1,73 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.models import Departure  # noqa: E402
+from track_tram_reliability.poller import RequestBudget, StationScheduler  # noqa: E402
+
+NOW = 1_700_000_000
+
+
+def dep(planned, realtime=None):
+    return Departure(
+        station_id="s1",
+        planned_departure_time=planned,
+        realtime_departure_time=realtime,
+        delay_in_minutes=None,
+        transport_type="TRAM",
+        label="27",
+        destination="Petuelring",
+        platform=None,
+        fetched_at=NOW,
+    )
+
+
+class StationSchedulerTests(unittest.TestCase):
+    def test_next_poll_time_follows_earliest_upcoming_departure(self):
+        sched = StationScheduler([], min_interval=60, max_interval=1800, lead_seconds=60)
+        # Departed vehicles are ignored; realtime wins over planned
+        deps = [dep(NOW - 120), dep(NOW + 300, realtime=NOW + 600), dep(NOW + 900)]
+        self.assertEqual(sched.next_poll_time(deps, NOW), NOW + 540)
+        # Clamped to the min/max interval
+        self.assertEqual(sched.next_poll_time([dep(NOW + 30)], NOW), NOW + 60)
+        self.assertEqual(sched.next_poll_time([dep(NOW + 7200)], NOW), NOW + 1800)
+        # Quiet station and failed fetch
+        self.assertEqual(sched.next_poll_time([], NOW), NOW + 1800)
+        self.assertEqual(sched.next_poll_time(None, NOW), NOW + 60)
+
+    def test_pop_due_respects_time_and_limit(self):
+        sched = StationScheduler(["a", "b", "c"], now=NOW)
+        self.assertEqual(sched.pop_due(NOW, 2), ["a", "b"])
+        sched.reschedule("a", [], NOW)
+        sched.reschedule("b", None, NOW)
+        self.assertEqual(sched.pop_due(NOW, 10), ["c"])
+        self.assertEqual(sched.next_due(), NOW + 60)
+        self.assertEqual(sched.pop_due(NOW + 60, 10), ["b"])
+        self.assertEqual(len(sched), 1)
+
+    def test_set_stations_adds_and_drops(self):
+        sched = StationScheduler(["a", "b"], now=NOW)
+        sched.pop_due(NOW, 1)  # "a" in flight
+        sched.set_stations(["b", "c"], NOW + 5)
+        sched.reschedule("a", [], NOW + 5)  # removed while in flight: not requeued
+        self.assertEqual(sched.pop_due(NOW + 5, 10), ["b", "c"])
+        self.assertEqual(len(sched), 0)
+
+
+class RequestBudgetTests(unittest.TestCase):
+    def test_budget_refills_per_minute(self):
+        budget = RequestBudget(120, now=NOW)
+        self.assertEqual(budget.available(NOW), 120)
+        budget.consume(120)
+        self.assertEqual(budget.available(NOW + 15), 30)
+        self.assertAlmostEqual(budget.seconds_until(31), 0.5)
+        self.assertEqual(budget.available(NOW + 600), 120)
+
+
+if __name__ == "__main__":
+    unittest.main()
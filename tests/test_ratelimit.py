@@ -0,0 +1,93 @@
+import threading
+import unittest
+import sys
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability.http import create_session  # noqa: E402
+from track_tram_reliability.ratelimit import (  # noqa: E402
+    AdaptiveRateLimiter,
+    configure_limiter,
+    get_limiter,
+    limiter_for_url,
+)
+
+
+class ThrottlingHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(429)
+        self.send_header("Retry-After", "0")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AdaptiveRateLimiterTests(unittest.TestCase):
+    def test_token_bucket_and_concurrency_cap(self):
+        limiter = AdaptiveRateLimiter(rate=1.0, burst=2.0, concurrency=5.0)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+        self.assertGreater(limiter.try_acquire(), 0.0)  # bucket empty
+        limiter = AdaptiveRateLimiter(rate=100.0, burst=100.0, concurrency=2.0)
+        limiter.try_acquire()
+        limiter.try_acquire()
+        self.assertGreater(limiter.try_acquire(), 0.0)  # no free slot
+        limiter.release(200, 0.1)
+        self.assertEqual(limiter.try_acquire(), 0.0)
+
+    def test_throttle_decreases_once_per_cooldown(self):
+        limiter = AdaptiveRateLimiter(rate=20.0, concurrency=16.0, decrease_cooldown=60.0)
+        limiter.observe(429)
+        limiter.observe(429)  # same burst of throttles, within cooldown
+        self.assertAlmostEqual(limiter.rate, 10.0)
+        self.assertAlmostEqual(limiter.concurrency, 8.0)
+        self.assertEqual(limiter.throttled, 2)
+
+    def test_retry_after_blocks_host(self):
+        limiter = AdaptiveRateLimiter()
+        limiter.observe(429, retry_after=30)
+        self.assertGreater(limiter.try_acquire(), 25.0)
+
+    def test_success_increases_additively_up_to_max(self):
+        limiter = AdaptiveRateLimiter(rate=4.0, max_rate=5.0, concurrency=2.0)
+        for _ in range(8):
+            limiter.observe(200, latency=0.05)
+        self.assertAlmostEqual(limiter.rate, 5.0, places=3)
+        self.assertGreater(limiter.concurrency, 2.0)
+        slow = AdaptiveRateLimiter(rate=4.0, latency_target=0.5)
+        slow.observe(200, latency=3.0)
+        self.assertEqual(slow.rate, 4.0)
+
+    def test_limiters_are_shared_per_host(self):
+        self.assertIs(limiter_for_url("https://www.mvg.de/api/x"), get_limiter("www.mvg.de"))
+        self.assertIs(limiter_for_url("https://WWW.MVG.DE:443/static/gtfs.zip"), get_limiter("www.mvg.de"))
+
+    def test_sync_retries_take_a_token_and_count_each_response_once(self):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ThrottlingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        limiter = configure_limiter("127.0.0.1", rate=1000.0, burst=1000.0, max_rate=1000.0)
+        acquired = []
+        acquire = limiter.acquire
+        limiter.acquire = lambda: (acquired.append(1), acquire())
+        try:
+            session = create_session(total_retries=2, backoff_factor=0.0)
+            resp = session.get(f"http://127.0.0.1:{server.server_address[1]}/departures", timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+        self.assertEqual(resp.status_code, 429)
+        # First attempt plus two retries: one token and one throttle count each
+        self.assertEqual(len(acquired), 3)
+        self.assertEqual(limiter.throttled, 3)
+        self.assertEqual(limiter.in_flight, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,45 @@
+import os
+import subprocess
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from track_tram_reliability import aggregate, analytics, defaults, export, fetchers, ingest, poller  # noqa: E402
+from track_tram_reliability.cli import import_times  # noqa: E402
+
+# Heavy dependencies only the commands themselves may import
+HEAVY = ("sqlalchemy", "pydantic", "requests", "yaml", "httpx", "pyarrow", "duckdb", "orjson")
+
+
+class StartupTests(unittest.TestCase):
+    def test_cli_import_stays_light(self):
+        env = dict(os.environ, PYTHONPATH=SYS_PATH_ADDED)
+        code = (
+            "import sys, track_tram_reliability.cli; "
+            f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))"
+        )
+        out = subprocess.run([sys.executable, "-c", code], env=env, capture_output=True, text=True, check=True)
+        self.assertEqual(out.stdout.strip(), "")
+
+    def test_import_times_cover_cli(self):
+        names = [name.strip() for _, _, name in import_times()]
+        self.assertIn("track_tram_reliability.cli", names)
+        self.assertIn("track_tram_reliability.defaults", names)
+        self.assertNotIn("sqlalchemy", names)
+
+    def test_defaults_match_owning_modules(self):
+        self.assertEqual(tuple(aggregate.BREAKDOWNS), defaults.BREAKDOWN_NAMES)
+        self.assertEqual(set(analytics.SCOPE_KEYS), set(defaults.SCOPES))
+        self.assertIs(ingest.INGEST_MODES, defaults.INGEST_MODES)
+        self.assertIs(fetchers.FETCH_ENGINES, defaults.FETCH_ENGINES)
+        self.assertEqual(poller.DEFAULT_MIN_INTERVAL_SECONDS, defaults.DEFAULT_MIN_INTERVAL_SECONDS)
+        self.assertEqual(export.DEFAULT_SETTLE_SECONDS, defaults.DEFAULT_SETTLE_SECONDS)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -8,10 +8,24 @@ SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
 if SYS_PATH_ADDED not in sys.path:
     sys.path.insert(0, SYS_PATH_ADDED)
 
-from track_tram_reliability.stations import write_cache, read_cache  # noqa: E402
-from track_tram_reliability.ingest import filter_stations_by_products, insert_departures  # noqa: E402
+from track_tram_reliability.stations import (  # noqa: E402
+    StationRegistry,
+    StationTable,
+    load_station_table,
+    read_cache,
+    table_path,
+    write_cache,
+)
+from track_tram_reliability import fetchers  # noqa: E402
+from track_tram_reliability.ingest import (  # noqa: E402
+    filter_stations_by_products,
+    ingest_departures_for_products,
+    insert_departures,
+    select_stations,
+    sync_stations_to_db,
+)
 from track_tram_reliability.models import Station, Departure  # noqa: E402
-from track_tram_reliability.db import create_session_maker, init_db  # noqa: E402
+from track_tram_reliability.db import create_session_maker, dispose_engines, init_db, StationOrm  # noqa: E402
 
 
 class StationsAndIngestTests(unittest.TestCase):
@@ -21,6 +35,7 @@ class StationsAndIngestTests(unittest.TestCase):
         init_db(self.tmp_db)
 
     def tearDown(self):
+        dispose_engines(self.tmp_db)
         # Clean up DB file
         db_path = Path(__file__).parent / 'tmp_rovodev_test.db'
         if db_path.exists():
@@ -39,8 +54,63 @@ class StationsAndIngestTests(unittest.TestCase):
             self.assertEqual(loaded[0].id, "s1")
             self.assertEqual(loaded[1].products, ["BUS", "TRAM"])
         finally:
-            if cache_path.exists():
-                cache_path.unlink()
+            for p in (cache_path, table_path(cache_path)):
+                if p.exists():
+                    p.unlink()
+
+    def test_station_registry_reloads_only_on_change(self):
+        cache_path = Path(__file__).parent / 'tmp_rovodev_stations.json'
+        try:
+            write_cache([Station(id="s1", name="Alpha", products=["TRAM"])], cache_path)
+            registry = StationRegistry(cache_path)
+            self.assertTrue(registry.refresh())
+            self.assertFalse(registry.refresh())
+            # Rewritten with identical content: stat changes, hash does not
+            write_cache([Station(id="s1", name="Alpha", products=["TRAM"])], cache_path)
+            self.assertFalse(registry.refresh())
+            write_cache([Station(id="s1", name="Alpha"), Station(id="s2", name="Beta")], cache_path)
+            self.assertTrue(registry.refresh())
+            self.assertEqual(sorted(registry.by_id), ["s1", "s2"])
+            self.assertIs(registry.by_id, registry.by_id)  # built once per reload
+        finally:
+            for p in (cache_path, table_path(cache_path)):
+                if p.exists():
+                    p.unlink()
+
+    def test_compact_table_cache(self):
+        cache_path = Path(__file__).parent / 'tmp_rovodev_stations.json'
+        stations = [
+            Station(id="s1", name="Alpha", latitude=48.1, products=["TRAM", "BUS"]),
+            Station(id="s2", name="Beta", products=["ubahn"]),
+            Station(id="s3", name="Gamma"),
+        ]
+        try:
+            write_cache(stations, cache_path)
+            table = load_station_table(cache_path)
+            self.assertEqual(table.stations(), stations)
+            self.assertEqual(table.select({"bus", "UBAHN"}), [0, 1])
+            self.assertEqual(table.select({"ALL"}, {" gamma"}), [2])
+            self.assertEqual(table.db_rows()[0]["station_id"], "s1")
+            # A JSON cache edited after the table was written wins over the stale table
+            cache_path.write_text(json.dumps([stations[2].model_dump()]), encoding="utf-8")
+            self.assertEqual(load_station_table(cache_path).ids, ["s3"])
+        finally:
+            for p in (cache_path, table_path(cache_path)):
+                if p.exists():
+                    p.unlink()
+        self.assertEqual(StationTable.from_stations(stations).select({"TRAM"}), [0])
+
+    def test_sync_stations_bulk_upsert(self):
+        sync_stations_to_db(self.tmp_db, [Station(id="s1", name="Alpha", products=["TRAM"])])
+        sync_stations_to_db(
+            self.tmp_db,
+            [Station(id="s1", name="Alpha Nord", products=["TRAM", "BUS"]), Station(id="s2", name="Beta")],
+        )
+        Session = create_session_maker(self.tmp_db)
+        with Session() as session:
+            s1 = session.get(StationOrm, "s1")
+            self.assertEqual((s1.name, s1.products), ("Alpha Nord", ["TRAM", "BUS"]))
+            self.assertIsNotNone(session.get(StationOrm, "s2"))
 
     def test_filter_stations_by_products(self):
         stations = [
@@ -59,6 +129,22 @@ class StationsAndIngestTests(unittest.TestCase):
         filtered = filter_stations_by_products(stations, {"ALL"})
         self.assertEqual({s.id for s in filtered}, {"s1", "s2", "s3", "s4"})
 
+    def test_select_stations_scope(self):
+        stations = [
+            Station(id="s1", name="Alpha", products=["TRAM"]),
+            Station(id="s2", name="Beta", products=["BUS", "TRAM"]),
+            Station(id="s3", name="Gamma", products=["UBAHN"]),
+        ]
+        self.assertEqual([s.id for s in select_stations(stations, {"TRAM"}, {" beta "})], ["s2"])
+        self.assertEqual([s.id for s in select_stations(stations, {"ALL"}, None, {"s3"})], ["s3"])
+        # A label index lookup that matched nothing must not widen to every station
+        self.assertEqual(select_stations(stations, {"TRAM"}, None, set()), [])
+        # Same rules as the compact table the cached path filters
+        table = StationTable.from_stations(stations)
+        for args in (({"tram"},), ({"BUS", "UBAHN"}, {"alpha", "GAMMA"}), (None, None, {"s1", "s3"})):
+            self.assertEqual([s.id for s in select_stations(stations, *args)],
+                             [stations[i].id for i in table.select(*args)])
+
     def test_insert_departures_dedup(self):
         Session = create_session_maker(self.tmp_db)
         deps = [
@@ -96,6 +182,39 @@ class StationsAndIngestTests(unittest.TestCase):
         self.assertEqual(ins, 1)
         self.assertEqual(skip, 1)
 
+    def test_ingest_streams_results_into_batches(self):
+        stations = [Station(id=f"s{i}", name=f"S{i}", products=["TRAM"]) for i in range(5)]
+        cache_path = Path(__file__).parent / 'tmp_rovodev_stations.json'
+        write_cache(stations, cache_path)
+
+        def fake_fetch(station_id):
+            if station_id == "s4":
+                raise RuntimeError("boom")
+            items = [
+                {
+                    "plannedDepartureTime": (1700000000 + i * 600) * 1000,
+                    "delayInMinutes": 0,
+                    "transportType": "TRAM",
+                    "label": "27" if i else "28",
+                    "destination": "Petuelring",
+                }
+                for i in range(3)
+            ]
+            return 200, json.dumps(items).encode()
+
+        orig = fetchers.fetch_departures_payload
+        try:
+            fetchers.fetch_departures_payload = fake_fetch
+            result = ingest_departures_for_products(
+                self.tmp_db, cache_path, {"TRAM"}, labels={"27"}, max_workers=2, queue_depth=1, batch_size=3
+            )
+        finally:
+            fetchers.fetch_departures_payload = orig
+            cache_path.unlink()
+            table_path(cache_path).unlink()
+        self.assertEqual(result.stations_processed, 4)
+        self.assertEqual((result.rows_inserted, result.rows_skipped), (8, 0))
+
 
 if __name__ == "__main__":
     unittest.main()
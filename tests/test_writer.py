@@ -0,0 +1,153 @@
+import unittest
+import sys
+from pathlib import Path
+
+# Ensure src/ is importable
+SYS_PATH_ADDED = str(Path(__file__).resolve().parents[1] / "src")
+if SYS_PATH_ADDED not in sys.path:
+    sys.path.insert(0, SYS_PATH_ADDED)
+
+from sqlalchemy import select  # noqa: E402
+
+from track_tram_reliability.db import (  # noqa: E402
+    create_session_maker,
+    dispose_engines,
+    init_db,
+    DepartureObservationOrm,
+    DepartureRawOrm,
+)
+from track_tram_reliability.models import Departure  # noqa: E402
+from track_tram_reliability import writer  # noqa: E402
+from track_tram_reliability.writer import bulk_upsert_departures  # noqa: E402
+
+
+def make_dep(planned, delay=0, fetched_at=1700000000, label="T17", cancelled=False):
+    return Departure(
+        station_id="s1",
+        planned_departure_time=planned,
+        realtime_departure_time=planned + delay * 60,
+        delay_in_minutes=delay,
+        transport_type="TRAM",
+        label=label,
+        destination="Central",
+        cancelled=cancelled,
+        platform=None,
+        realtime=True,
+        fetched_at=fetched_at,
+    )
+
+
+class BulkUpsertTests(unittest.TestCase):
+    def setUp(self):
+        self.db_path = Path(__file__).parent / 'tmp_rovodev_writer.db'
+        self.tmp_db = f"sqlite:///{self.db_path}"
+        init_db(self.tmp_db)
+        self.Session = create_session_maker(self.tmp_db)
+
+    def tearDown(self):
+        dispose_engines(self.tmp_db)
+        if self.db_path.exists():
+            self.db_path.unlink()
+
+    def test_counts_across_chunks_and_batches(self):
+        with self.Session() as session:
+            counts = bulk_upsert_departures(
+                session, [make_dep(1700000000 + i * 60) for i in range(25)], chunk_size=10
+            )
+            session.commit()
+        self.assertEqual((counts.inserted, counts.updated, counts.skipped), (25, 0, 0))
+
+        # Second batch overlaps the first: duplicates must not discard the new rows
+        with self.Session() as session:
+            counts = bulk_upsert_departures(
+                session, [make_dep(1700000000 + i * 60) for i in range(20, 30)], chunk_size=4
+            )
+            session.commit()
+            total = len(session.execute(select(DepartureRawOrm.id)).all())
+        self.assertEqual((counts.inserted, counts.updated, counts.skipped), (5, 0, 5))
+        self.assertEqual(total, 30)
+
+    def test_update_mode_overwrites_observation(self):
+        with self.Session() as session:
+            bulk_upsert_departures(session, [make_dep(1700000000, delay=0)])
+            session.commit()
+        with self.Session() as session:
+            counts = bulk_upsert_departures(
+                session,
+                [make_dep(1700000000, delay=3, fetched_at=1700000100), make_dep(1700000600)],
+                on_conflict="update",
+            )
+            session.commit()
+            row = session.execute(
+                select(DepartureRawOrm).where(DepartureRawOrm.planned_departure_time == 1700000000)
+            ).scalar_one()
+        self.assertEqual((counts.inserted, counts.updated, counts.skipped), (1, 1, 0))
+        self.assertEqual(row.delay_in_minutes, 3)
+        self.assertEqual(row.fetched_at, 1700000100)
+
+    def test_update_mode_ignores_stale_and_records_changes(self):
+        observations = [
+            make_dep(1700000000, delay=0, fetched_at=1700000000),
+            make_dep(1700000000, delay=0, fetched_at=1700000060),  # unchanged
+            make_dep(1700000000, delay=2, fetched_at=1700000120),
+            make_dep(1700000000, delay=1, fetched_at=1700000030),  # stale, arrives late
+        ]
+        outcomes = []
+        for dep in observations:
+            with self.Session() as session:
+                c = bulk_upsert_departures(session, [dep], on_conflict="update", record_history=True)
+                session.commit()
+            outcomes.append((c.inserted, c.updated, c.skipped))
+        self.assertEqual(outcomes, [(1, 0, 0), (0, 1, 0), (0, 1, 0), (0, 0, 1)])
+        with self.Session() as session:
+            row = session.execute(select(DepartureRawOrm)).scalar_one()
+            history = session.execute(
+                select(DepartureObservationOrm.fetched_at, DepartureObservationOrm.delay_in_minutes)
+                .order_by(DepartureObservationOrm.fetched_at)
+            ).all()
+        self.assertEqual((row.delay_in_minutes, row.fetched_at), (2, 1700000120))
+        self.assertEqual([tuple(h) for h in history], [(1700000000, 0), (1700000120, 2)])
+
+    def test_rowwise_fallback_records_history(self):
+        orig = writer.dialect_insert_for
+        writer.dialect_insert_for = lambda name: None
+        try:
+            for delay, fetched_at in ((0, 1700000000), (0, 1700000060), (2, 1700000120)):
+                with self.Session() as session:
+                    bulk_upsert_departures(
+                        session, [make_dep(1700000000, delay, fetched_at)], on_conflict="update", record_history=True
+                    )
+                    session.commit()
+        finally:
+            writer.dialect_insert_for = orig
+        with self.Session() as session:
+            history = session.execute(
+                select(DepartureObservationOrm.fetched_at, DepartureObservationOrm.delay_in_minutes)
+                .order_by(DepartureObservationOrm.fetched_at)
+            ).all()
+        self.assertEqual([tuple(h) for h in history], [(1700000000, 0), (1700000120, 2)])
+
+    def test_history_needs_update_mode(self):
+        with self.Session() as session:
+            with self.assertRaises(ValueError):
+                bulk_upsert_departures(session, [make_dep(1700000000)], record_history=True)
+
+    def test_missing_label_is_interned_and_deduplicated(self):
+        # NULL label/destination are interned as '' so such departures keep their identity
+        with self.Session() as session:
+            counts = bulk_upsert_departures(session, [make_dep(1700000000, label=None)] * 2)
+            session.commit()
+            labels = session.execute(select(DepartureRawOrm.label)).scalars().all()
+        self.assertEqual((counts.inserted, counts.skipped), (1, 1))
+        self.assertEqual(labels, [None])
+
+    def test_null_planned_time_never_conflicts(self):
+        with self.Session() as session:
+            dep = make_dep(1700000000).model_copy(update={"planned_departure_time": None})
+            counts = bulk_upsert_departures(session, [dep] * 2)
+            session.commit()
+        self.assertEqual(counts.inserted, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()